@@ -10,6 +10,9 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+from time import time
+from types import GeneratorType
+
 import flask
 from active_data import record_request, cors_wrapper
 from flask import Response
@@ -18,15 +21,19 @@ from mo_logs import Log
 from mo_math import Math
 from pyLibrary import convert
 
-from active_data.actions import save_query, replace_vars, send_error, test_mode_wait
+from active_data.actions import save_query, query_cache, replace_vars, send_error, test_mode_wait
+from mo_json import quote
+from mo_json.encoder import utf8_json_encoder
 from mo_logs.exceptions import Except
 from mo_logs.profiles import CProfiler
 from mo_times.timer import Timer
 from jx_python import jx, wrap_from
 from jx_python.containers import Container
+from jx_python.query import QueryOp
 
 BLANK = convert.unicode2utf8(File("active_data/public/error.html").read())
 QUERY_SIZE_LIMIT = 10*1024*1024
+STREAM_CHUNK_SIZE = 64*1024  # BYTES COLLECTED BEFORE SENDING A CHUNK
 
 
 @cors_wrapper
@@ -59,26 +66,56 @@ def jx_query(path):
                 translate_timer = Timer("translate")
                 with translate_timer:
                     frum = wrap_from(data['from'])
-                    result = jx.run(data, frum=frum)
+                    query, cache_key, cached = data, None, None
+                    if query_cache.result_cache and isinstance(frum, Container) and data.meta.cache != False and not data.meta.save and not data.meta.stream:
+                        query = QueryOp.wrap(data, frum.schema)
+                        cache_key = query_cache.result_cache.key(query, frum)
+                        if cache_key:
+                            cached = query_cache.result_cache.get(cache_key)
+
+                    if cached is None:
+                        result = jx.run(query, frum=frum)
 
-                    if isinstance(result, Container):  #TODO: REMOVE THIS CHECK, jx SHOULD ALWAYS RETURN Containers
-                        result = result.format(data.format)
+                        if isinstance(result, Container):  #TODO: REMOVE THIS CHECK, jx SHOULD ALWAYS RETURN Containers
+                            result = result.format(data.format)
 
-                save_timer = Timer("save")
-                with save_timer:
-                    if data.meta.save:
-                        try:
-                            result.meta.saved_as = save_query.query_finder.save(data)
-                        except Exception, e:
-                            Log.warning("Unexpected save problem", cause=e)
+                if cached is None:
+                    save_timer = Timer("save")
+                    with save_timer:
+                        if data.meta.save:
+                            try:
+                                result.meta.saved_as = save_query.query_finder.save(data)
+                            except Exception, e:
+                                Log.warning("Unexpected save problem", cause=e)
 
-                result.meta.timing.preamble = Math.round(preamble_timer.duration.seconds, digits=4)
-                result.meta.timing.translate = Math.round(translate_timer.duration.seconds, digits=4)
-                result.meta.timing.save = Math.round(save_timer.duration.seconds, digits=4)
-                result.meta.timing.total = "{{TOTAL_TIME}}"  # TIMING PLACEHOLDER
+                    result.meta.timing.preamble = Math.round(preamble_timer.duration.seconds, digits=4)
+                    result.meta.timing.translate = Math.round(translate_timer.duration.seconds, digits=4)
+                    result.meta.timing.save = Math.round(save_timer.duration.seconds, digits=4)
 
-                with Timer("jsonification") as json_timer:
-                    response_data = convert.unicode2utf8(convert.value2json(result))
+                    if isinstance(result.data, GeneratorType):
+                        # ROWS ARE SERIALIZED AS THEY ARE SENT, WITH meta AT THE END
+                        return Response(
+                            _stream(result, query_timer),
+                            status=200,
+                            headers={
+                                "Content-Type": result.meta.content_type
+                            }
+                        )
+
+                    result.meta.timing.total = "{{TOTAL_TIME}}"  # TIMING PLACEHOLDER
+                    if cache_key:
+                        result.meta.timing.cache = "{{CACHE}}"  # CACHE STATS PLACEHOLDER
+
+                    with Timer("jsonification") as json_timer:
+                        response_data = utf8_json_encoder(result)
+                    content_type = result.meta.content_type
+
+                    if cache_key:
+                        query_cache.result_cache.add(cache_key, response_data, content_type)
+                else:
+                    # CACHED RESPONSES ARE ALREADY SERIALIZED, WITH PLACEHOLDERS INTACT
+                    with Timer("jsonification") as json_timer:
+                        response_data, content_type = cached
 
             with Timer("post timer"):
                 # IMPORTANT: WE WANT TO TIME OF THE JSON SERIALIZATION, AND HAVE IT IN THE JSON ITSELF.
@@ -86,13 +123,15 @@ def jx_query(path):
                 timing_replacement = b'"total": ' + str(Math.round(query_timer.duration.seconds, digits=4)) +\
                                      b', "jsonification": ' + str(Math.round(json_timer.duration.seconds, digits=4))
                 response_data = response_data.replace(b'"total": "{{TOTAL_TIME}}"', timing_replacement)
+                if cache_key:
+                    response_data = response_data.replace(query_cache.CACHE_PLACEHOLDER, query_cache.result_cache.timing(cached is not None))
                 Log.note("Response is {{num}} bytes in {{duration}}", num=len(response_data), duration=query_timer.duration)
 
                 return Response(
                     response_data,
                     status=200,
                     headers={
-                        "Content-Type": result.meta.content_type
+                        "Content-Type": content_type
                     }
                 )
         except Exception, e:
@@ -100,3 +139,45 @@ def jx_query(path):
             return send_error(query_timer, request_body, e)
 
 
+def _stream(result, query_timer):
+    """
+    GENERATE THE RESPONSE BYTES IN CHUNKS OF ABOUT STREAM_CHUNK_SIZE
+    THE data ROWS ARE SERIALIZED ONE AT A TIME; meta IS SENT LAST, AS A
+    TRAILER, SO IT CAN HOLD THE TIMING OF THE WHOLE RESPONSE
+    """
+    rows = result.data
+    meta = result.meta
+    result.data = None
+    result.meta = None
+
+    json_start = time()
+    acc = [b"{"]
+    for k, v in result.items():
+        value_bytes = utf8_json_encoder(v)
+        if value_bytes == b"null":
+            continue  # LIKE value2json(), null PROPERTIES ARE DROPPED
+        acc.append(convert.unicode2utf8(quote(k)) + b": " + value_bytes + b", ")
+    acc.append(b'"data": [')
+    size = 0
+    try:
+        for i, row in enumerate(rows):
+            row_bytes = utf8_json_encoder(row)
+            if i:
+                acc.append(b", ")
+            acc.append(row_bytes)
+            size += len(row_bytes)
+            if size >= STREAM_CHUNK_SIZE:
+                yield b"".join(acc)
+                acc = []
+                size = 0
+    except Exception as e:
+        e = Except.wrap(e)
+        Log.warning("Problem streaming response", cause=e)
+        meta.error = e
+    acc.append(b"]")
+
+    meta.timing.jsonification = Math.round(time() - json_start, digits=4)
+    meta.timing.total = Math.round(time() - query_timer.start, digits=4)
+    acc.append(b', "meta": ' + utf8_json_encoder(meta) + b"}")
+    Log.note("Streamed response in {{duration}} seconds", duration=meta.timing.total)
+    yield b"".join(acc)
@@ -0,0 +1,85 @@
+# encoding: utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_collections.lru_cache import LruCache
+from mo_json.encoder import cPythonJSONEncoder
+from mo_kwargs import override
+from mo_logs import Log
+
+CACHE_PLACEHOLDER = b'"cache": "{{CACHE}}"'
+
+result_cache = None  # SET BY app.setup() WHEN config.query_cache IS PROVIDED
+
+_canonical_json = cPythonJSONEncoder(sort_keys=True).encode
+
+
+class ResultCache(object):
+    """
+    SERIALIZED /query RESPONSES, KEYED ON THE NORMALIZED QUERY AND THE
+    GENERATION OF THE CONTAINER IT WAS RUN AGAINST
+    """
+
+    @override
+    def __init__(
+        self,
+        max_size=1000,  # NUMBER OF RESPONSES KEPT
+        timeout=60,  # SECONDS A RESPONSE IS GOOD FOR, EVEN IF THE INDEX DOES NOT CHANGE
+        kwargs=None
+    ):
+        self.cache = LruCache(max_size=max_size, timeout=timeout, name="query results")
+
+    def key(self, query, frum):
+        """
+        :param query: QueryOp, ALREADY NORMALIZED
+        :param frum: THE CONTAINER THE QUERY WILL BE RUN AGAINST
+        :return: CACHE KEY, OR None IF THE RESULT CAN NOT BE CACHED
+        """
+        try:
+            generation = frum.get_generation()
+            if generation == None:
+                return None
+
+            canonical = _canonical_json({
+                "select": query.select,
+                "edges": query.edges,
+                "groupby": query.groupby,
+                "where": query.where,
+                "window": query.window,
+                "sort": query.sort,
+                "limit": query.limit,
+                "format": query.format,
+                "isLean": query.isLean
+            })
+            return frum.name, generation, canonical
+        except Exception as e:
+            Log.warning("Can not make cache key, result will not be cached", cause=e)
+            return None
+
+    def get(self, key):
+        """
+        :return: (response_bytes, content_type) OR None
+        """
+        return self.cache.get(key)
+
+    def add(self, key, response_data, content_type):
+        self.cache[key] = (response_data, content_type)
+
+    def timing(self, hit):
+        """
+        :return: JSON BYTES TO REPLACE CACHE_PLACEHOLDER IN THE RESPONSE
+        """
+        stats = self.cache.stats
+        return (
+            b'"cache": {"hit": ' + (b"true" if hit else b"false") +
+            b', "hits": ' + str(stats.hits) +
+            b', "misses": ' + str(stats.misses) + b'}'
+        )
@@ -16,8 +16,10 @@ import flask
 import moz_sql_parser
 from active_data import record_request, cors_wrapper
 from flask import Response
+from mo_collections.lru_cache import LruCache
 from mo_dots import wrap, listwrap
-from mo_json import utf82unicode, json2value, value2json
+from mo_json import utf82unicode, json2value
+from mo_json.encoder import utf8_json_encoder
 from mo_logs import Log
 from mo_math import Math
 
@@ -26,7 +28,6 @@ from active_data.actions.jx import BLANK, QUERY_SIZE_LIMIT
 from mo_logs.exceptions import Except
 from mo_testing.fuzzytestcase import assertAlmostEqual
 from mo_times.timer import Timer
-from pyLibrary.convert import unicode2utf8
 from jx_python import jx, wrap_from
 from jx_python.containers import Container
 
@@ -83,7 +84,7 @@ def sql_query(path):
             result.meta.timing.total = "{{TOTAL_TIME}}"  # TIMING PLACEHOLDER
 
             with Timer("jsonification") as json_timer:
-                response_data = unicode2utf8(value2json(result))
+                response_data = utf8_json_encoder(result)
 
         with Timer("post timer"):
             # IMPORTANT: WE WANT TO TIME OF THE JSON SERIALIZATION, AND HAVE IT IN THE JSON ITSELF.
@@ -106,10 +107,12 @@ def sql_query(path):
 
 
 KNOWN_SQL_AGGREGATES = {"sum", "count", "avg"}
+MAX_PARSED = 1000  # NUMBER OF SQL TEMPLATES KEPT
+parsed = LruCache(max_size=MAX_PARSED, name="parsed sql")  # MAP FROM SQL TEMPLATE TO PARSE
 
 
 def parse_sql(sql):
-    query = wrap(moz_sql_parser.parse(sql))
+    query = wrap(_parse(sql))
     # PULL OUT THE AGGREGATES
     for s in listwrap(query.select):
         val = s.value
@@ -131,3 +134,19 @@ def parse_sql(sql):
     query.select = [s for s in listwrap(query.select) if s.value != None]
     query.format = "table"
     return query
+
+
+def _parse(sql):
+    """
+    STATEMENTS THAT DIFFER ONLY BY LITERALS SHARE ONE pyparsing PASS
+    """
+    template, literals = moz_sql_parser.parameterize(sql)
+    tree = parsed.get(template)
+    if tree is None:
+        try:
+            tree = moz_sql_parser.parse(template)
+        except Exception:
+            # THE ERROR SHOULD MENTION THE ORIGINAL sql
+            return moz_sql_parser.parse(sql)
+        parsed[template] = tree
+    return moz_sql_parser.bind(tree, literals)
@@ -29,9 +29,10 @@ from werkzeug.contrib.fixers import HeaderRewriterFix
 from werkzeug.wrappers import Response
 
 import active_data
-from active_data.actions import save_query
+from active_data.actions import save_query, query_cache
 from active_data.actions.json import get_raw_json
 from active_data.actions.jx import jx_query
+from active_data.actions.query_cache import ResultCache
 from active_data.actions.save_query import SaveQueries, find_query
 from active_data.actions.sql import sql_query
 from active_data.actions.static import download
@@ -74,6 +75,23 @@ def _default(path):
     )
 
 
+@app.route('/status', methods=['GET'])
+@cors_wrapper
+def _status():
+    """
+    CONNECTION POOL STATS, FOR MONITORING
+    """
+    return Response(
+        convert.unicode2utf8(convert.value2json({
+            "elasticsearch": [c.pool.stats for c in elasticsearch.known_clusters.values()]
+        })),
+        status=200,
+        headers={
+            "Content-Type": "application/json"
+        }
+    )
+
+
 def setup(settings=None):
     global config
 
@@ -116,6 +134,8 @@ def setup(settings=None):
         FromESMetadata(config.elasticsearch)
         if config.saved_queries:
             setattr(save_query, "query_finder", SaveQueries(config.saved_queries))
+        if config.query_cache:
+            setattr(query_cache, "result_cache", ResultCache(config.query_cache))
         HeaderRewriterFix(app, remove_headers=['Date', 'Server'])
 
         if config.flask.ssl_context:
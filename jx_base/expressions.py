@@ -12,13 +12,15 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import itertools
+import json
 from collections import Mapping
 from decimal import Decimal
 
 import operator
 from mo_dots import coalesce, wrap, set_default, literal_field, Null, split_field, startswith_field
 from mo_dots import Data, join_field, unwraplist, ROOT_PATH, relative_field, unwrap
-from mo_json import json2value, quote
+from mo_collections.lru_cache import LruCache
+from mo_json import json2value, quote, scrub
 from mo_logs import Log
 from mo_logs.exceptions import suppress_exception
 from mo_math import Math, OR, MAX
@@ -27,7 +29,7 @@ from mo_times.dates import Date
 from pyLibrary import convert
 from jx_python.containers import STRUCT, OBJECT
 from jx_base.queries import is_variable_name
-from jx_python.expression_compiler import compile_expression
+from jx_python.expression_compiler import compile_expression, MAX_COMPILED
 from pyLibrary.sql.sqlite import quote_column, quote_value
 
 ALLOW_SCRIPTING = False
@@ -35,6 +37,10 @@ TRUE_FILTER = True
 FALSE_FILTER = False
 EMPTY_DICT = {}
 
+# MAP FROM CANONICAL EXPRESSION JSON TO FUNCTION, SO REPEATED QUERIES SKIP
+# THE PARSE, to_python() AND exec
+expression_functions = LruCache(max_size=MAX_COMPILED, name="expression functions")
+
 _Query = None
 
 
@@ -122,11 +128,32 @@ def jx_expression_to_function(expr):
     if isinstance(expr, Expression):
         if isinstance(expr, ScriptOp) and not isinstance(expr.script, unicode):
             return expr.script
-        else:
-            return compile_expression(expr.to_python())
-    if expr != None and not isinstance(expr, (Mapping, list)) and hasattr(expr, "__call__"):
+        key = _expression_key(expr.__data__())
+    elif expr != None and not isinstance(expr, (Mapping, list)) and hasattr(expr, "__call__"):
         return expr
-    return compile_expression(jx_expression(expr).to_python())
+    else:
+        key = _expression_key(expr)
+
+    output = None
+    if key is not None:
+        output = expression_functions.get(key)
+    if output is None:
+        if not isinstance(expr, Expression):
+            expr = jx_expression(expr)
+        output = compile_expression(expr.to_python())
+        if key is not None:
+            expression_functions[key] = output
+    return output
+
+
+def _expression_key(json_expr):
+    """
+    :return: CANONICAL JSON FOR THE EXPRESSION, OR None IF IT CAN NOT BE MADE
+    """
+    try:
+        return json.dumps(scrub(json_expr), sort_keys=True)
+    except Exception:
+        return None
 
 
 class Expression(object):
@@ -11,23 +11,33 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+from array import array
+from copy import deepcopy
+
 from jx_elasticsearch import es09
 from jx_python import jx
 from mo_dots import listwrap, Data, wrap, literal_field, set_default, coalesce, Null, split_field, FlatList, unwrap, \
     unwraplist
+from mo_json import quote
 from mo_logs import Log
 from mo_math import Math, MAX
 
 from jx_elasticsearch.es14.decoders import DefaultDecoder, AggsDecoder, ObjectDecoder
 from jx_elasticsearch.es14.decoders import DimFieldListDecoder
 from jx_elasticsearch.es14.util import aggregates1_4, NON_STATISTICAL_AGGS
+from jx_elasticsearch.scheduler import Scheduler
 from jx_elasticsearch.es14.expressions import simplify_esfilter, split_expression_by_depth, AndOp, Variable, NullOp, TupleOp
 from jx_python.query import MAX_LIMIT
 from mo_times.timer import Timer
 
+PAGE_CARDINALITY = 10000  # GROUPBY ON COLUMNS WITH MORE DISTINCT VALUES THAN THIS ARE SENT TO ES IN PAGES
+TERMS_PER_PAGE = 10000  # APPROXIMATE NUMBER OF DISTINCT TERMS ES WILL BUCKET FOR EACH PAGE
+MAX_PAGES = 100
+CELLS_PER_SLICE = 10000  # EDGES QUERIES WITH MORE CELLS THAN THIS ARE SPLIT INTO SLICES OF THE OUTER EDGE
+MAX_SLICES = 8
+
 
 def is_aggsop(es, query):
-    es.cluster.get_metadata()
     if any(map(es.cluster.version.startswith, ["1.4.", "1.5.", "1.6.", "1.7."])) and (query.edges or query.groupby or any(a != None and a != "none" for a in listwrap(query.select).aggregate)):
         return True
     return False
@@ -342,8 +352,16 @@ def es_aggsop(es, frum, query):
 
     es_query.size = 0
 
+    num_pages = get_num_pages(frum, query, decoders)
+    num_slices = get_num_slices(query, decoders)
+    requests = Scheduler("aggs requests")
     with Timer("ES query time") as es_duration:
-        result = es09.util.post(es, es_query, query.limit)
+        if num_pages > 1:
+            result = paged_post(requests, es, es_query, query, decoders[0][0], num_pages)
+        elif num_slices > 1:
+            result = sliced_post(requests, es, es_query, query, num_slices)
+        else:
+            result = es09.util.post(es, es_query, query.limit)
 
     try:
         format_time = Timer("formatting")
@@ -361,6 +379,8 @@ def es_aggsop(es, frum, query):
 
         output.meta.timing.formatting = format_time.duration
         output.meta.timing.es_search = es_duration.duration
+        if requests.timing:
+            output.meta.timing.requests = requests.timing
         output.meta.content_type = mime_type
         output.meta.es_query = es_query
         return output
@@ -370,6 +390,181 @@ def es_aggsop(es, frum, query):
         Log.error("Some problem", e)
 
 
+def get_num_pages(frum, query, decoders):
+    """
+    RETURN NUMBER OF PAGES TO SPLIT THE groupby INTO, SO ES (AND US) NEVER
+    HOLD ALL THE TERMS OF A HIGH-CARDINALITY COLUMN AT ONCE
+    """
+    if not query.groupby or len(split_field(frum.name)) > 1 or not decoders or not decoders[0]:
+        return 1
+    decoder = decoders[0][0]
+    if not isinstance(decoder, DefaultDecoder) or not isinstance(decoder.edge.value, Variable):
+        return 1
+
+    es_column = decoder.edge.value.var
+    cardinality = MAX(c.cardinality for c in frum.schema.columns if c.es_column == es_column)
+    if cardinality == None or cardinality <= PAGE_CARDINALITY:
+        return 1
+    return Math.min(int(Math.ceiling(cardinality / TERMS_PER_PAGE)), MAX_PAGES)
+
+
+def paged_post(requests, es, es_query, query, decoder, num_pages):
+    """
+    ES1.7 HAS NO composite, NOR PARTITIONED terms, AGGREGATION, SO WE SPLIT THE
+    TERMS OF THE OUTER groupby BY HASH, ONE REQUEST PER PAGE, AND MERGE THE BUCKETS.
+    A DOCUMENT IS IN EVERY PAGE ONE OF ITS VALUES HASHES TO, AND EACH PAGE ONLY
+    BUCKETS THE VALUES THAT HASH TO IT, SO EVERY TERM IS IN EXACTLY ONE PAGE
+    (WITH ITS FULL doc_count), EVEN FOR MULTI-VALUED COLUMNS
+
+    :param requests: Scheduler TO RUN THE PAGES
+    """
+    field = quote(decoder.edge.value.var)
+    for i in range(num_pages):
+        in_page = "{ Math.abs(it.hashCode() % " + unicode(num_pages) + ") == " + unicode(i) + " }"
+        aggs = wrap(deepcopy(unwrap(es_query.aggs)))
+        outer = aggs
+        while outer._filter:
+            outer = outer._filter.aggs
+        outer._match.terms.field = None
+        outer._match.terms.script = "doc[" + field + "].values.findAll" + in_page
+
+        page_query = wrap({
+            "aggs": {"_filter": set_default(
+                {"filter": {"script": {"script": (
+                    "doc[" + field + "].empty ? " + ("true" if i == 0 else "false") +
+                    " : doc[" + field + "].values.any" + in_page
+                )}}},
+                {"aggs": aggs}
+            )},
+            "size": 0
+        })
+        requests.add("page " + unicode(i), es09.util.post, es, page_query, query.limit)
+
+    buckets = []
+    missing = None
+    total = None
+    for i, page in enumerate(requests.run()):
+        total = page.hits.total
+        agg = wrap(drill(page.aggregations))
+        buckets.extend(agg._match.buckets)
+        if i == 0:
+            # DOCUMENTS WITH NO VALUE ARE ONLY IN THE FIRST PAGE
+            missing = agg._missing
+
+    # EACH PAGE IS IN ORDER, BUT THE CONCATENATION IS NOT
+    if decoder.sorted:
+        buckets = jx.sort(buckets, {"key": decoder.sorted})
+    else:
+        buckets = jx.sort(buckets, {"doc_count": "desc"})
+
+    return wrap({
+        "hits": {"total": total},
+        "aggregations": {
+            "_match": {"buckets": unwrap(buckets)[:decoder.domain.limit]},
+            "_missing": unwrap(missing)
+        }
+    })
+
+
+def get_num_slices(query, decoders):
+    """
+    RETURN NUMBER OF REQUESTS TO SPLIT AN edges QUERY INTO, SO THE CELLS OF
+    A WIDE CUBE ARE COUNTED BY ES IN PARALLEL
+    """
+    if not query.edges or not decoders or not decoders[0]:
+        return 1
+    num_cells = 1
+    for d in (d for ds in decoders for d in ds):
+        num_cells *= Math.max(_num_parts(d.edge.domain), 1)
+    return Math.min(int(Math.ceiling(num_cells / CELLS_PER_SLICE)), MAX_SLICES, _num_parts(decoders[0][0].edge.domain))
+
+
+def _num_parts(domain):
+    parts = getattr(domain, "partitions", None)
+    if parts:
+        return len(parts)
+    return coalesce(getattr(domain, "limit", None), 1)
+
+
+def sliced_post(requests, es, es_query, query, num_slices):
+    """
+    SPLIT THE PARTITIONS OF THE OUTER EDGE INTO CONTIGUOUS SLICES, ONE REQUEST
+    PER SLICE, AND JOIN THE BUCKETS. THE INNER EDGES ARE UNCHANGED, SO EACH
+    CELL IS COUNTED IN EXACTLY ONE SLICE. THE _missing PART IS ONLY ASKED OF
+    THE FIRST SLICE, BECAUSE IT IS DEFINED BY ALL THE PARTITIONS.
+
+    ONLY THE OUTER EDGE IS SLICED: THE DEEPER EDGES (INCLUDING THE NESTED
+    ONES) ARE AGGREGATED INSIDE EACH OUTER BUCKET, AND THE CUBE NEEDS THEIR
+    JOINT COUNTS, SO THEY CAN NOT BE SENT AS SEPARATE REQUESTS
+
+    :param requests: Scheduler TO RUN THE SLICES
+    """
+    for i, slice_query in enumerate(_slice_queries(es_query, num_slices)):
+        requests.add("slice " + unicode(i), es09.util.post, es, slice_query, query.limit)
+    responses = requests.run()
+
+    result = responses[0]
+    outer = drill(unwrap(result.aggregations))
+    for r in responses[1:]:
+        for k, v in drill(unwrap(r.aggregations)).items():
+            if k == "_match":
+                # SLICES ARE CONTIGUOUS, SO BUCKET POSITIONS ARE KEPT
+                outer.setdefault("_match", {}).setdefault("buckets", []).extend(v.get("buckets", EMPTY_LIST))
+            elif k.startswith("_join_"):
+                outer[k] = v
+    return result
+
+
+def _slice_queries(es_query, num_slices):
+    """
+    RETURN LIST OF COPIES OF es_query, EACH WITH A SLICE OF THE OUTER EDGE'S PARTITIONS
+    ONLY ONE IF THE OUTER EDGE CAN NOT BE SLICED (LIKE A terms WITH NO include)
+    """
+    template = unwrap(es_query)
+    outer = _outer_aggs(template)
+    match = outer.get("_match", EMPTY)
+    if isinstance(match.get("terms", EMPTY).get("include"), list):
+        path = ("_match", "terms", "include")
+    elif match.get("range", EMPTY).get("ranges"):
+        path = ("_match", "range", "ranges")
+    elif match.get("filters", EMPTY).get("filters"):
+        path = ("_match", "filters", "filters")
+    elif any(k.startswith("_join_") for k in outer.keys()):
+        path = None
+    else:
+        return [es_query]
+
+    if path:
+        parts = outer[path[0]][path[1]][path[2]]
+    else:
+        parts = sorted((k for k in outer.keys() if k.startswith("_join_")), key=lambda k: int(k[6:]))
+    num_slices = Math.min(num_slices, len(parts))
+    if num_slices <= 1:
+        return [es_query]
+
+    output = []
+    for i in range(num_slices):
+        sliced = parts[i * len(parts) // num_slices:(i + 1) * len(parts) // num_slices]
+        q = deepcopy(template)
+        o = _outer_aggs(q)
+        if i:
+            o.pop("_missing", None)
+        if path:
+            o[path[0]][path[1]][path[2]] = sliced
+        else:
+            for k in parts:
+                if k not in sliced:
+                    del o[k]
+        output.append(wrap(q))
+    return output
+
+
+def _outer_aggs(es_query):
+    outer = es_query.get("aggs", EMPTY)
+    while "_filter" in outer:
+        outer = outer["_filter"].get("aggs", EMPTY)
+    return outer
+
 
 EMPTY = {}
 EMPTY_LIST = []
@@ -456,6 +651,97 @@ def aggs_iterator(aggs, decoders, coord=True):
             yield parts, None, a
 
 
+def aggs_columns(aggs, decoders, pulls):
+    """
+    ONE PASS OVER THE ES aggs, RETURNING COLUMNS INSTEAD OF ROWS
+    THE BUCKETS ARE NOT CHANGED, AND EACH DECODER IS ASKED FOR THE INDEX OF
+    EACH DISTINCT PART ONCE, NOT ONCE PER BUCKET
+
+    :param aggs: ES AGGREGATE OBJECT
+    :param decoders:
+    :param pulls: LIST OF FUNCTIONS, EACH PULLS ONE VALUE OUT OF A BUCKET
+    :return: (coords, values) - ONE array OF INDEXES PER DECODER, AND ONE list OF VALUES PER pull
+    """
+    depth = max(d.start + d.num_columns for d in decoders)
+    parts = [None] * depth  # (POSITION, key, from, to) OF THE BUCKET AT EACH DEPTH, None FOR MISSING
+    covers = [[] for _ in range(depth)]  # MAP FROM DEPTH TO THE DECODERS USING THAT DEPTH
+    for i, d in enumerate(decoders):
+        for c in range(d.start, d.start + d.num_columns):
+            covers[c].append(i)
+    memos = [{} for _ in decoders]  # MAP FROM PARTS TO INDEX, ONE PER DECODER
+    current = [None] * len(decoders)  # INDEX OF EACH DECODER, None IF ITS PARTS CHANGED
+
+    coords = [array(b"l") for _ in decoders]
+    values = [[] for _ in pulls]
+    appends = [c.append for c in coords]
+    pushes = [(v.append, p) for v, p in zip(values, pulls)]
+
+    def get_index(i):
+        d = decoders[i]
+        key = tuple(parts[d.start:d.start + d.num_columns])
+        memo = memos[i]
+        if key in memo:
+            return memo[key]
+        row = [None] * depth
+        for c in range(d.start, d.start + d.num_columns):
+            part = parts[c]
+            row[c] = Null if part is None else wrap({"_index": part[0], "key": part[1], "from": part[2], "to": part[3]})
+        index = memo[key] = d.get_index(row)
+        return index
+
+    def set_part(d, part):
+        parts[d] = part
+        for i in covers[d]:
+            current[i] = None
+
+    def emit(agg):
+        for i, append in enumerate(appends):
+            index = current[i]
+            if index is None:
+                index = current[i] = get_index(i)
+            append(index)
+        for push, pull in pushes:
+            push(pull(agg))
+
+    def walk(agg, d):
+        agg = drill(agg)
+        for k, v in agg.items():
+            if k == "_match":
+                for i, b in enumerate(v.get("buckets", EMPTY_LIST)):
+                    set_part(d, (i, b.get("key"), b.get("from"), b.get("to")))
+                    if d > 0:
+                        walk(b, d - 1)
+                    elif b.get("doc_count"):
+                        emit(drill(b))
+            elif k == "_other":
+                set_part(d, None)
+                for b in v.get("buckets", EMPTY_LIST):
+                    if d > 0:
+                        walk(b, d - 1)
+                    else:
+                        b = drill(b)
+                        if b.get("doc_count"):
+                            emit(b)
+            elif k == "_missing":
+                set_part(d, None)
+                b = drill(v)
+                if b.get("doc_count"):
+                    if d > 0:
+                        walk(b, d - 1)
+                    else:
+                        emit(b)
+            elif k.startswith("_join_"):
+                i = int(k[6:])
+                set_part(d, (i, i, None, None))
+                if d > 0:
+                    walk(v, d - 1)
+                else:
+                    emit(v)
+
+    walk(unwrap(aggs), depth - 1)
+    return coords, values
+
+
 def count_dim(aggs, decoders):
     if any(isinstance(d, (DefaultDecoder, DimFieldListDecoder, ObjectDecoder)) for d in decoders):
         # ENUMERATE THE DOMAINS, IF UNKNOWN AT QUERY TIME
@@ -14,13 +14,13 @@ from __future__ import unicode_literals
 from jx_elasticsearch import es09, es14
 from mo_dots import split_field, FlatList, listwrap, literal_field, coalesce, Data, unwrap, concat_field, join_field
 from mo_logs import Log
-from mo_threads import Thread
 from pyLibrary import convert
 
-from jx_base.expressions import compile_expression
+from jx_base.expressions import jx_expression_to_function
 from jx_elasticsearch.es14.expressions import split_expression_by_depth, simplify_esfilter, AndOp, Variable, LeavesOp
 from jx_elasticsearch.es14.setop import format_dispatch
 from jx_elasticsearch.es14.util import jx_sort_to_es_sort
+from jx_elasticsearch.scheduler import Scheduler
 from jx_python.containers import STRUCT
 from jx_python.query import DEFAULT_LIMIT
 from mo_times.timer import Timer
@@ -205,7 +205,7 @@ def es_deepop(es, query):
                     #     Log.error("deep field not expected")
 
             pull = EXPRESSION_PREFIX + s.name
-            post_expressions[pull] = compile_expression(expr.map(map_to_local).to_python())
+            post_expressions[pull] = jx_expression_to_function(expr.map(map_to_local))
 
             new_select.append({
                 "name": s.name if is_list else ".",
@@ -216,21 +216,23 @@ def es_deepop(es, query):
             i += 1
 
     # <COMPLICATED> ES needs two calls to get all documents
-    more = []
-    def get_more(please_stop):
-        more.append(es09.util.post(
+    requests = Scheduler("deep")
+    requests.add("inner hits", es09.util.post, es, es_query, query.limit)
+    if more_filter:
+        requests.add(
+            "more",
+            es09.util.post,
             es,
             Data(
                 filter=more_filter,
                 fields=es_query.fields
             ),
             query.limit
-        ))
-    if more_filter:
-        need_more = Thread.run("get more", target=get_more)
+        )
 
     with Timer("call to ES") as call_timer:
-        data = es09.util.post(es, es_query, query.limit)
+        responses = requests.run()
+    data = responses[0]
 
     # EACH A HIT IS RETURNED MULTIPLE TIMES FOR EACH INNER HIT, WITH INNER HIT INCLUDED
     def inners():
@@ -241,8 +243,7 @@ def es_deepop(es, query):
                     t[k] = e(t)
                 yield t
         if more_filter:
-            Thread.join(need_more)
-            for t in more[0].hits.hits:
+            for t in responses[1].hits.hits:
                 yield t
     #</COMPLICATED>
 
@@ -251,6 +252,7 @@ def es_deepop(es, query):
 
         output = formatter(inners(), new_select, query)
         output.meta.timing.es = call_timer.duration
+        output.meta.timing.requests = requests.timing
         output.meta.content_type = mime_type
         output.meta.es_query = es_query
         return output
@@ -11,11 +11,12 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
-import itertools
+from collections import Mapping
 
-from mo_dots import coalesce, wrap, Null, unwraplist, literal_field, set_default
+from mo_collections.lru_cache import LruCache
+from mo_dots import wrap, Null, unwraplist, set_default, unwrap, Data, FlatList
 from mo_json import json2value, quote
-from mo_logs import Log, suppress_exception
+from mo_logs import Log
 from mo_math import OR, MAX
 from pyLibrary import convert
 
@@ -23,7 +24,7 @@ from jx_base.expressions import Variable, DateOp, TupleOp, LeavesOp, BinaryOp, O
     WhenOp, InequalityOp, extend, RowsOp, Literal, NullOp, TrueOp, FalseOp, DivOp, FloorOp, \
     EqOp, NeOp, NotOp, LengthOp, NumberOp, StringOp, CountOp, MultiOp, RegExpOp, CoalesceOp, MissingOp, ExistsOp, \
     PrefixOp, UnixOp, NotLeftOp, RightOp, NotRightOp, FindOp, BetweenOp, InOp, RangeOp, CaseOp, AndOp, \
-    ConcatOp, TRUE_FILTER, FALSE_FILTER, LeftOp
+    ConcatOp, TRUE_FILTER, FALSE_FILTER, LeftOp, Expression
 
 
 @extend(BetweenOp)
@@ -737,148 +738,241 @@ def removeOr(esfilter):
 def normalize_esfilter(esfilter):
     """
     SIMPLFY THE LOGIC EXPRESSION
+    :param esfilter: ES FILTER (dict OR Data), OR AN Expression
     """
-    return wrap(_normalize(wrap(esfilter)))
+    if isinstance(esfilter, Expression):
+        esfilter = esfilter.to_esfilter()
+    output = _normalize(unwrap(esfilter), {})
+    if output is TRUE_FILTER or output is FALSE_FILTER:
+        return output
+    return wrap(_copy(output))
 
 
-def _normalize(esfilter):
+def _normalize(esfilter, keys):
     """
-    TODO: DO NOT USE Data, WE ARE SPENDING TOO MUCH TIME WRAPPING/UNWRAPPING
     REALLY, WE JUST COLLAPSE CASCADING `and` AND `or` FILTERS
+    WORKS ON PLAIN dicts, AND NEVER CHANGES esfilter; RETURNS esfilter IF
+    ALREADY NORMAL.  THE RESULT MAY SHARE PARTS WITH esfilter AND normalized
+    :param keys: MAP FROM id() TO _key(), FOR THIS ONE normalize_esfilter()
     """
-    if esfilter is TRUE_FILTER or esfilter is FALSE_FILTER or esfilter.isNormal:
+    if esfilter is TRUE_FILTER or esfilter is FALSE_FILTER:
         return esfilter
+    if not any(esfilter.get(k) is not None for k in _COMPOSITE):
+        return _normalize_leaf(esfilter)
+
+    try:
+        key = _key(esfilter, keys)
+        found = normalized.get(key)
+    except TypeError:
+        # UNHASHABLE VALUE IN THE FILTER
+        return _normalize_composite(esfilter, keys)
+    if found is None:
+        output = _normalize_composite(esfilter, keys)
+        if output is esfilter:
+            normalized[key] = (False, None)
+        else:
+            normalized[key] = (True, _copy(output))
+        return output
+    is_diff, output = found
+    if is_diff:
+        return output
+    return esfilter
+
 
-    # Log.note("from: " + convert.value2json(esfilter))
-    isDiff = True
-
-    while isDiff:
-        isDiff = False
-
-        if coalesce(esfilter["and"], esfilter.bool.must):
-            terms = coalesce(esfilter["and"], esfilter.bool.must)
-            # MERGE range FILTER WITH SAME FIELD
-            for (i0, t0), (i1, t1) in itertools.product(enumerate(terms), enumerate(terms)):
-                if i0 >= i1:
-                    continue  # SAME, IGNORE
-                with suppress_exception:
-                    f0, tt0 = t0.range.items()[0]
-                    f1, tt1 = t1.range.items()[0]
-                    if f0 == f1:
-                        set_default(terms[i0].range[literal_field(f1)], tt1)
-                        terms[i1] = True
+def _normalize_composite(esfilter, keys):
+    is_diff = True
+    while is_diff:
+        is_diff = False
 
+        terms = _and_terms(esfilter)
+        if terms:
+            terms = _merge_ranges(terms)
             output = []
             for a in terms:
                 if isinstance(a, (list, set)):
-                    from mo_logs import Log
-
                     Log.error("and clause is not allowed a list inside a list")
-                a_ = normalize_esfilter(a)
+                a_ = _normalize(a, keys)
                 if a_ is not a:
-                    isDiff = True
+                    is_diff = True
                 a = a_
                 if a == TRUE_FILTER:
-                    isDiff = True
+                    is_diff = True
                     continue
                 if a == FALSE_FILTER:
                     return FALSE_FILTER
-                if coalesce(a.get("and"), a.bool.must):
-                    isDiff = True
-                    a.isNormal = None
-                    output.extend(coalesce(a.get("and"), a.bool.must))
+                sub = _and_terms(a)
+                if sub:
+                    is_diff = True
+                    output.extend(sub)
                 else:
-                    a.isNormal = None
                     output.append(a)
             if not output:
                 return TRUE_FILTER
             elif len(output) == 1:
-                # output[0].isNormal = True
-                esfilter = output[0]
-                break
-            elif isDiff:
+                return output[0]
+            elif is_diff:
                 if USE_BOOL_MUST:
-                    esfilter = wrap({"bool": {"must": output}})
+                    esfilter = {"bool": {"must": output}}
                 else:
-                    esfilter = wrap({"and": output})
+                    esfilter = {"and": output}
             continue
 
-        if esfilter["or"] != None:
+        if esfilter.get("or") is not None:
             output = []
             for a in esfilter["or"]:
-                a_ = _normalize(a)
+                a_ = _normalize(a, keys)
                 if a_ is not a:
-                    isDiff = True
+                    is_diff = True
                 a = a_
 
                 if a == TRUE_FILTER:
                     return TRUE_FILTER
                 if a == FALSE_FILTER:
-                    isDiff = True
+                    is_diff = True
                     continue
                 if a.get("or"):
-                    a.isNormal = None
-                    isDiff = True
+                    is_diff = True
                     output.extend(a["or"])
                 else:
-                    a.isNormal = None
                     output.append(a)
             if not output:
                 return FALSE_FILTER
             elif len(output) == 1:
-                esfilter = output[0]
-                break
-            elif isDiff:
-                esfilter = wrap({"or": output})
+                return output[0]
+            elif is_diff:
+                esfilter = {"or": output}
             continue
 
-        if esfilter.term != None:
-            if esfilter.term.keys():
-                esfilter.isNormal = True
-                return esfilter
-            else:
-                return TRUE_FILTER
+        if _exists(esfilter.get("term")) or _exists(esfilter.get("terms")):
+            return _normalize_leaf(esfilter)
 
-        if esfilter.terms != None:
-            for k, v in esfilter.terms.items():
-                if len(v) > 0:
-                    if OR(vv == None for vv in v):
-                        rest = [vv for vv in v if vv != None]
-                        if len(rest) > 0:
-                            return {
-                                "or": [
-                                    {"missing": {"field": k}},
-                                    {"terms": {k: rest}}
-                                ],
-                                "isNormal": True
-                            }
-                        else:
-                            return {
-                                "missing": {"field": k},
-                                "isNormal": True
-                            }
-                    else:
-                        esfilter.isNormal = True
-                        return esfilter
-            return FALSE_FILTER
-
-        if esfilter["not"] != None:
-            _sub = esfilter["not"]
-            sub = _normalize(_sub)
+        _sub = esfilter.get("not")
+        if _exists(_sub):
+            sub = _normalize(_sub, keys)
             if sub is FALSE_FILTER:
                 return TRUE_FILTER
             elif sub is TRUE_FILTER:
                 return FALSE_FILTER
             elif sub is not _sub:
-                sub.isNormal = None
-                return wrap({"not": sub, "isNormal": True})
-            else:
-                sub.isNormal = None
+                return {"not": sub}
 
-    esfilter.isNormal = True
     return esfilter
 
 
+def _normalize_leaf(esfilter):
+    term = esfilter.get("term")
+    if _exists(term):
+        if term.keys():
+            return esfilter
+        else:
+            return TRUE_FILTER
+
+    terms = esfilter.get("terms")
+    if _exists(terms):
+        for k, v in terms.items():
+            if len(v) > 0:
+                if OR(vv == None for vv in v):
+                    rest = [vv for vv in v if vv != None]
+                    if len(rest) > 0:
+                        return {"or": [
+                            {"missing": {"field": k}},
+                            {"terms": {k: rest}}
+                        ]}
+                    else:
+                        return {"missing": {"field": k}}
+                else:
+                    return esfilter
+        return FALSE_FILTER
+
+    return esfilter
+
+
+_COMPOSITE = ["and", "bool", "or", "not"]
+normalized = LruCache(max_size=10000, name="normalized esfilters")  # MAP FROM _key() TO (is_diff, NORMAL FORM)
+
+
+def _exists(value):
+    """
+    SAME AS `!= None` ON THE Data PROPERTY: EMPTY dicts ARE NULL
+    """
+    if value is None:
+        return False
+    if isinstance(value, Mapping) and not value:
+        return False
+    return True
+
+
+def _and_terms(esfilter):
+    terms = esfilter.get("and")
+    if terms is None:
+        bool_ = esfilter.get("bool")
+        if isinstance(bool_, Mapping):
+            terms = bool_.get("must")
+    return terms
+
+
+def _merge_ranges(terms):
+    """
+    MERGE range FILTERS ON THE SAME FIELD INTO THE FIRST, THE OTHERS BECOME True
+    :return: terms, OR A COPY IF SOMETHING WAS MERGED
+    """
+    fields = []
+    for t in terms:
+        try:
+            fields.append(iter(t.get("range").items()).next())
+        except Exception:
+            fields.append(None)
+    if sum(1 for f in fields if f is not None) < 2:
+        return terms
+
+    output = list(terms)
+    for i0, f0 in enumerate(fields):
+        if f0 is None:
+            continue
+        for i1 in range(i0 + 1, len(fields)):
+            f1 = fields[i1]
+            if f1 is None or f0[0] != f1[0] or output[i0] is True:
+                continue
+            if output[i0] is terms[i0]:
+                t0 = output[i0] = dict(terms[i0])
+                t0["range"] = dict(t0["range"])
+                t0["range"][f0[0]] = dict(f0[1])
+            set_default(output[i0]["range"][f0[0]], f1[1])
+            output[i1] = True
+    return output
+
+
+def _key(value, keys):
+    """
+    HASHABLE, STRUCTURAL, VERSION OF value
+    """
+    _type = value.__class__
+    if _type in (dict, Data, list, FlatList):
+        found = keys.get(id(value))
+        if found is not None:
+            return found[1]
+        if _type is list or _type is FlatList:
+            output = list, tuple([_key(v, keys) for v in value])
+        else:
+            output = dict, tuple(sorted([(k, _key(v, keys)) for k, v in value.items()]))
+        keys[id(value)] = (value, output)  # KEEP value, SO ITS id() IS NOT REUSED
+        return output
+    elif isinstance(value, Mapping):
+        return dict, tuple(sorted([(k, _key(v, keys)) for k, v in value.items()]))
+    else:
+        return _type, value
+
+
+def _copy(value):
+    _type = value.__class__
+    if _type is dict or _type is Data or (_type is not list and isinstance(value, Mapping)):
+        return {k: _copy(v) for k, v in value.items()}
+    elif _type is list or _type is FlatList:
+        return [_copy(v) for v in value]
+    else:
+        return value
+
+
 def split_expression_by_depth(where, schema, map_=None, output=None, var_to_depth=None):
     """
     :param where: EXPRESSION TO INSPECT
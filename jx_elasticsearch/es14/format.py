@@ -22,9 +22,14 @@ from mo_logs.strings import quote
 
 from pyLibrary import convert
 from jx_python.containers.cube import Cube
-from jx_elasticsearch.es14.aggs import count_dim, aggs_iterator, format_dispatch, drill
+from jx_elasticsearch.es14.aggs import count_dim, aggs_iterator, format_dispatch, drill, aggs_columns
 from jx_elasticsearch.es14.expressions import TupleOp
 
+try:
+    import numpy
+except Exception:
+    numpy = None
+
 
 def format_cube(decoders, aggs, start, query, select):
     # decoders = sorted(decoders, key=lambda d: -d.edge.dim)  # REVERSE DECODER ORDER, BECAUSE ES QUERY WAS BUILT IN REVERSE ORDER
@@ -39,14 +44,26 @@ def format_cube(decoders, aggs, start, query, select):
         dims.append(len(e.domain.partitions) + extra)
 
     dims = tuple(dims)
-    matricies = [(s, Matrix(dims=dims, zeros=s.default)) for s in select]
-    for row, coord, agg in aggs_iterator(aggs, decoders):
-        for s, m in matricies:
-            try:
-                v = _pull(s, agg)
-                m[coord] = v
-            except Exception as e:
-                Log.error("", e)
+    if not dims or any(d == 0 for d in dims):
+        matricies = [(s, Matrix(dims=dims, zeros=s.default)) for s in select]
+    else:
+        # DECODE ALL BUCKETS INTO COLUMNS, THEN FILL EACH MATRIX IN BULK
+        try:
+            coords, values = aggs_columns(aggs, decoders, [_puller(s) for s in select])
+            offsets = _offsets(coords, dims)
+        except Exception as e:
+            Log.error("Problem decoding aggregates", cause=e)
+
+        size = _product(dims)
+        matricies = []
+        for s, column in zip(select, values):
+            if hasattr(s.default, "__call__"):
+                cells = [s.default() for _ in range(size)]
+            else:
+                cells = [s.default] * size
+            for o, v in zip(offsets, column):
+                cells[o] = v
+            matricies.append((s, Matrix.from_flat(dims, cells)))
 
     cube = Cube(
         query.select,
@@ -97,7 +114,7 @@ def format_table(decoders, aggs, start, query, select):
     return Data(
         meta={"format": "table"},
         header=header,
-        data=list(data())
+        data=_rows(data(), query)
     )
 
 
@@ -114,7 +131,7 @@ def format_table_from_groupby(decoders, aggs, start, query, select):
     return Data(
         meta={"format": "table"},
         header=header,
-        data=list(data())
+        data=_rows(data(), query)
     )
 
 
@@ -167,7 +184,7 @@ def format_list_from_groupby(decoders, aggs, start, query, select):
 
     output = Data(
         meta={"format": "list"},
-        data=list(data())
+        data=_rows(data(), query)
     )
     return output
 
@@ -204,7 +221,7 @@ def format_list(decoders, aggs, start, query, select):
 
     output = Data(
         meta={"format": "list"},
-        data=list(data())
+        data=_rows(data(), query)
     )
     return output
 
@@ -258,6 +275,57 @@ set_default(format_dispatch, {
 })
 
 
+def _rows(rows, query):
+    """
+    :param rows: GENERATOR OF FORMATTED ROWS
+    :return: THE GENERATOR, IF THE CALLER CAN CONSUME A STREAM, ELSE A list
+    """
+    if query.stream:
+        return rows
+    return list(rows)
+
+
+def _offsets(coords, dims):
+    """
+    :param coords: ONE array OF INDEXES PER DIMENSION
+    :param dims: THE SHAPE OF THE MATRIX
+    :return: ROW-MAJOR OFFSET OF EACH CELL
+    """
+    if not coords or not coords[0]:
+        return []
+    if numpy is not None:
+        return numpy.ravel_multi_index([numpy.frombuffer(c, dtype=c.typecode) for c in coords], dims).tolist()
+
+    offsets = [0] * len(coords[0])
+    for c, d in zip(coords, dims):
+        offsets = [o * d + i for o, i in zip(offsets, c)]
+    return offsets
+
+
+def _product(values):
+    output = 1
+    for v in values:
+        output *= v
+    return output
+
+
+def _puller(s):
+    """
+    SAME AS _pull, BUT WITH THE PATHS SPLIT ONCE, NOT ONCE PER BUCKET
+    :return: FUNCTION THAT TAKES AN ES AGGREGATE OBJECT AND RETURNS THE VALUE
+    """
+    p = s.pull
+    if not p:
+        Log.error("programmer error")
+    elif isinstance(p, Mapping):
+        paths = [(k, split_field(v)) for k, v in p.items()]
+        return lambda agg: {k: _get_path(agg, path, None) for k, path in paths}
+    else:
+        path = split_field(p)
+        default = s.default
+        return lambda agg: _get_path(agg, path, default)
+
+
 def _pull(s, agg):
     """
     USE s.pull TO GET VALUE OUT OF agg
@@ -275,7 +343,11 @@ def _pull(s, agg):
 
 
 def _get(v, k, d):
-    for p in split_field(k):
+    return _get_path(v, split_field(k), d)
+
+
+def _get_path(v, path, d):
+    for p in path:
         try:
             v = v.get(p)
             if v is None:
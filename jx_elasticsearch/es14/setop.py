@@ -11,6 +11,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+from itertools import islice
+
 from jx_elasticsearch import es14, es09
 from mo_dots import coalesce, split_field, set_default, Data, unwraplist, literal_field, unwrap, wrap, \
     concat_field
@@ -31,6 +33,7 @@ from mo_json.typed_encoder import encode_property
 from mo_times.timer import Timer
 
 format_dispatch = {}
+SCROLL_SIZE = 1000  # HITS PER ES REQUEST WHEN STREAMING
 
 
 def is_setop(es, query):
@@ -189,16 +192,22 @@ def extract_rows(es, es_query, query):
         else:
             Log.error("Do not know what to do")
 
-    with Timer("call to ES") as call_timer:
-        data = es09.util.post(es, es_query, query.limit)
+    if query.stream:
+        # EXPORT: PAGE THROUGH ES, FORMATTING ROWS AS THEY ARRIVE
+        T = islice(es.scroll(es_query, size=SCROLL_SIZE), query.limit)
+        call_timer = None
+    else:
+        with Timer("call to ES") as call_timer:
+            data = es09.util.post(es, es_query, query.limit)
 
-    T = data.hits.hits
+        T = data.hits.hits
 
     try:
         formatter, groupby_formatter, mime_type = format_dispatch[query.format]
 
         output = formatter(T, new_select, query)
-        output.meta.timing.es = call_timer.duration
+        if call_timer:
+            output.meta.timing.es = call_timer.duration
         output.meta.content_type = mime_type
         output.meta.es_query = es_query
         return output
@@ -207,58 +216,59 @@ def extract_rows(es, es_query, query):
 
 
 def format_list(T, select, query=None):
-    data = []
-    if isinstance(query.select, list):
-        for row in T:
-            r = Data()
-            for s in select:
-                r[s.put.name][s.put.child] = unwraplist(row[s.pull])
-            data.append(r if r else None)
-    elif isinstance(query.select.value, LeavesOp):
-        for row in T:
-            r = Data()
-            for s in select:
-                r[s.put.name][s.put.child] = unwraplist(row[s.pull])
-            data.append(r if r else None)
-    else:
-        for row in T:
-            r = None
-            for s in select:
-                if s.put.child == ".":
-                    r = unwraplist(row[s.pull])
-                else:
-                    if r is None:
-                        r = Data()
-                    r[s.put.child] = unwraplist(row[s.pull])
-
-            data.append(r)
+    def data():
+        if isinstance(query.select, list):
+            for row in T:
+                r = Data()
+                for s in select:
+                    r[s.put.name][s.put.child] = unwraplist(row[s.pull])
+                yield r if r else None
+        elif isinstance(query.select.value, LeavesOp):
+            for row in T:
+                r = Data()
+                for s in select:
+                    r[s.put.name][s.put.child] = unwraplist(row[s.pull])
+                yield r if r else None
+        else:
+            for row in T:
+                r = None
+                for s in select:
+                    if s.put.child == ".":
+                        r = unwraplist(row[s.pull])
+                    else:
+                        if r is None:
+                            r = Data()
+                        r[s.put.child] = unwraplist(row[s.pull])
+
+                yield r
 
     return Data(
         meta={"format": "list"},
-        data=data
+        data=data() if query.stream else list(data())
     )
 
 
 def format_table(T, select, query=None):
-    data = []
     num_columns = (MAX(select.put.index) + 1)
-    for row in T:
-        r = [None] * num_columns
-        for s in select:
-            value = unwraplist(row[s.pull])
 
-            if value == None:
-                continue
+    def data():
+        for row in T:
+            r = [None] * num_columns
+            for s in select:
+                value = unwraplist(row[s.pull])
+
+                if value == None:
+                    continue
 
-            index, child = s.put.index, s.put.child
-            if child == ".":
-                r[index] = value
-            else:
-                if r[index] is None:
-                    r[index] = Data()
-                r[index][child] = value
+                index, child = s.put.index, s.put.child
+                if child == ".":
+                    r[index] = value
+                else:
+                    if r[index] is None:
+                        r[index] = Data()
+                    r[index][child] = value
 
-        data.append(r)
+            yield r
 
     header = [None] * num_columns
     for s in select:
@@ -269,11 +279,13 @@ def format_table(T, select, query=None):
     return Data(
         meta={"format": "table"},
         header=header,
-        data=data
+        data=data() if query.stream else list(data())
     )
 
 
 def format_cube(T, select, query=None):
+    query = query.copy()
+    query.stream = False  # CUBES ARE BUILT FROM THE WHOLE TABLE
     table = format_table(T, select, query)
 
     if len(table.data) == 0:
@@ -33,11 +33,26 @@ from jx_python.containers import Container
 from jx_python.dimensions import Dimension
 from jx_elasticsearch.meta import FromESMetadata
 from jx_python.namespace.typed import Typed
-from jx_python.query import QueryOp
+from jx_python.query import QueryOp, MAX_LIMIT
+from mo_collections.lru_cache import LruCache
 from mo_dots.lists import FlatList
 from mo_logs.exceptions import Except
 from pyLibrary.env import elasticsearch, http
 
+GENERATION_TIMEOUT = 1  # SECONDS A GENERATION IS TRUSTED; ABOUT THE ES refresh_interval
+generations = LruCache(max_size=1000, timeout=GENERATION_TIMEOUT, name="index generations")  # MAP FROM INDEX TO REFRESH COUNT
+
+
+def _capped(query):
+    """
+    RETURN query WITH NO MORE THAN MAX_LIMIT ROWS, FOR WHEN THEY COME IN ONE REQUEST
+    """
+    if query.limit <= MAX_LIMIT:
+        return query
+    output = query.copy()
+    output.limit = MAX_LIMIT
+    return output
+
 
 class FromES(Container):
     """
@@ -120,6 +135,19 @@ class FromES(Container):
         else:
             self.worker.join()
 
+    def get_generation(self):
+        """
+        THE NUMBER OF REFRESHES ON THE INDEX (OR ALIAS); ONLY A REFRESH CAN
+        CHANGE WHAT A QUERY SEES.  ASKED OF ES AT MOST ONCE PER
+        GENERATION_TIMEOUT, SO A CACHE HIT IS NOT A ROUND TRIP
+        """
+        index = self._es.settings.index
+        generation = generations.get(index)
+        if generation is None:
+            stats = self._es.cluster.get("/" + index + "/_stats/refresh", timeout=3)
+            generation = generations[index] = stats._all.total.refresh.total
+        return generation
+
     @property
     def query_path(self):
         return join_field(split_field(self.name)[1:])
@@ -153,20 +181,21 @@ class FromES(Container):
                 return jx.run(q2)
 
             if is_deepop(self._es, query):
-                return es_deepop(self._es, query)
+                return es_deepop(self._es, _capped(query))
             if is_aggsop(self._es, query):
-                return es_aggsop(self._es, frum, query)
+                return es_aggsop(self._es, frum, _capped(query))
             if is_setop(self._es, query):
+                # THE ONLY ONE THAT PAGES THROUGH THE scroll API, SO A STREAMED QUERY MAY ASK FOR MORE THAN MAX_LIMIT
                 return es_setop(self._es, query)
             if es09_setop.is_setop(query):
-                return es09_setop.es_setop(self._es, None, query)
+                return es09_setop.es_setop(self._es, None, _capped(query))
             if es09_aggop.is_aggop(query):
-                return es09_aggop.es_aggop(self._es, None, query)
+                return es09_aggop.es_aggop(self._es, None, _capped(query))
             Log.error("Can not handle")
         except Exception as e:
             e = Except.wrap(e)
             if "Data too large, data for" in e:
-                http.post(self._es.cluster.path+"/_cache/clear")
+                http.post(self._es.cluster.path+"/_cache/clear", pool=self._es.cluster.pool)
                 Log.error("Problem (Tried to clear Elasticsearch cache)", e)
             Log.error("problem", e)
 
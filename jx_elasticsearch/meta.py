@@ -12,18 +12,22 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import itertools
+import os
 from copy import copy
 from itertools import product
 
 from jx_python import jx, Schema
 from mo_dots import Data, relative_field, concat_field
 from mo_dots import coalesce, set_default, Null, literal_field, split_field, join_field, ROOT_PATH
-from mo_dots import wrap
+from mo_dots import wrap, unwrap
+from mo_files import File
+from mo_json import json2value, value2json
 from mo_kwargs import override
 from mo_logs import Log
 from mo_threads import Queue
 from mo_threads import THREAD_STOP
 from mo_threads import Thread
+from mo_threads import ThreadPool
 from mo_threads import Till
 
 from jx_python import meta as jx_base_meta
@@ -38,11 +42,15 @@ from mo_times.timer import Timer
 _elasticsearch = None
 
 MAX_COLUMN_METADATA_AGE = 12 * HOUR
-ENABLE_META_SCAN = False
+ENABLE_META_SCAN = False  # REFRESH EVERY COLUMN, NOT ONLY THE ONES QUERIES ASK FOR
 DEBUG = False
 TOO_OLD = 2*HOUR
 OLD_METADATA = MINUTE
+SAVE_INTERVAL = MINUTE  # HOW OFTEN THE COLUMN CACHE IS WRITTEN TO DISK
+SNAPSHOT_FORMAT = 1  # CHANGE WHEN THE CACHE FILE LAYOUT CHANGES, SO OLD FILES ARE IGNORED
 TEST_TABLE_PREFIX = "testing"  # USED TO TURN OFF COMPLAINING ABOUT TEST INDEXES
+HOT = 0  # todo PRIORITY OF COLUMNS A QUERY HAS ASKED FOR
+COLD = 1  # todo PRIORITY OF EVERYTHING ELSE
 
 
 class FromESMetadata(Schema):
@@ -58,7 +66,18 @@ class FromESMetadata(Schema):
             return jx_base_meta.singlton
 
     @override
-    def __init__(self, host, index, alias=None, name=None, port=9200, kwargs=None):
+    def __init__(
+        self,
+        host,
+        index,
+        alias=None,
+        name=None,
+        port=9200,
+        refresh_threads=1,  # NUMBER OF THREADS UPDATING COLUMN CARDINALITY
+        refresh_batch=100,  # MOST COLUMNS UPDATED WITH ONE ES REQUEST
+        cache=None,  # FILE TO PERSIST COLUMN METADATA, SO A RESTART DOES NOT START COLD
+        kwargs=None
+    ):
         global _elasticsearch
         if hasattr(self, "settings"):
             return
@@ -69,10 +88,13 @@ class FromESMetadata(Schema):
         self.settings = kwargs
         self.default_name = coalesce(name, alias, index)
         self.default_es = _elasticsearch.Cluster(kwargs=kwargs)
-        self.todo = Queue("refresh metadata", max=100000, unique=True)
+        self.todo = Queue("refresh metadata", max=100000, unique=True, priority=True)
 
         self.es_metadata = Null
+        self.es_metadata_version = None
         self.last_es_metadata = Date.now()-OLD_METADATA
+        self.table_versions = {}  # MAP FROM es_index TO CLUSTER STATE VERSION ITS COLUMNS CAME FROM
+        self.unvalidated = set()  # TABLES LOADED FROM THE CACHE, NOT YET CHECKED AGAINST THE CLUSTER
 
         self.meta=Data()
         table_columns = metadata_tables()
@@ -81,13 +103,88 @@ class FromESMetadata(Schema):
         self.meta.columns = ColumnList()
         self.meta.columns.insert(column_columns)
         self.meta.columns.insert(table_columns)
-        # TODO: fix monitor so it does not bring down ES
-        if ENABLE_META_SCAN:
-            self.worker = Thread.run("refresh metadata", self.monitor)
+
+        self.refresh_batch = refresh_batch
+        self.dirty = False
+        if cache:
+            self.cache = File(cache)
+            self._load_cache()
+            self.saver = Thread.run("save metadata", self._save_loop)
         else:
-            self.worker = Thread.run("refresh metadata", self.not_monitor)
+            self.cache = None
+
+        # WITHOUT ENABLE_META_SCAN, ONLY THE COLUMNS QUERIES ASK FOR ARE REFRESHED, SO ES IS NOT BROUGHT DOWN
+        self.workers = [
+            Thread.run("refresh metadata " + unicode(i), self.monitor)
+            for i in range(refresh_threads)
+        ]
+        self.worker = self.workers[0]
+        self.refresher = ThreadPool("refresh columns", num_workers=2)  # FOR REFRESHES OF WHOLE TABLES
         return
 
+    def _load_cache(self):
+        """
+        FILL meta.tables AND meta.columns FROM THE LAST SAVED COPY
+        THE TABLES ARE CHECKED AGAINST THE CLUSTER STATE WHEN FIRST USED
+        """
+        if not self.cache.exists:
+            return
+        try:
+            content = json2value(self.cache.read())
+            if content.format != SNAPSHOT_FORMAT:
+                Log.note("Ignoring {{file}}, it is an old format", file=self.cache.abspath)
+                return
+            self.table_versions = unwrap(content.versions) or {}
+            self.unvalidated = set(content.tables.name)
+            with self.meta.tables.locker:
+                for t in unwrap(content.tables):
+                    self.meta.tables.add(Table(
+                        name=t["name"],
+                        url=t.get("url"),
+                        query_path=t.get("query_path"),
+                        timestamp=Date(t["timestamp"]) if t.get("timestamp") != None else None
+                    ))
+            with self.meta.columns.locker:
+                for c in unwrap(content.columns):
+                    if c.get("last_updated") != None:
+                        c["last_updated"] = Date(c["last_updated"])
+                    self.meta.columns.add(Column(**c))
+            Log.note("Loaded {{num}} columns from {{file}}", num=len(content.columns), file=self.cache.abspath)
+        except Exception as e:
+            Log.warning("Can not load column metadata from {{file}}", file=self.cache.abspath, cause=e)
+
+    def _save_cache(self):
+        with self.meta.tables.locker:
+            tables = [dict(t.items()) for t in self.meta.tables.data]
+        with self.meta.columns.locker:
+            self.dirty = False
+            columns = [dict(c.items()) for c in self.meta.columns if not c.es_index.startswith("meta.")]
+        content = value2json({
+            "format": SNAPSHOT_FORMAT,
+            "versions": self.table_versions,
+            "tables": tables,
+            "columns": columns
+        })
+
+        # WRITE, THEN RENAME, SO OTHER PROCESSES NEVER SEE A PARTIAL FILE
+        temp = File(self.cache.abspath + "." + unicode(os.getpid()) + ".tmp")
+        temp.write(content)
+        try:
+            os.rename(temp.abspath, self.cache.abspath)
+        except Exception:
+            # WINDOWS WILL NOT RENAME OVER AN EXISTING FILE
+            self.cache.write(content)
+            temp.delete()
+
+    def _save_loop(self, please_stop):
+        while not please_stop:
+            (Till(seconds=SAVE_INTERVAL.seconds) | please_stop).wait()
+            if self.dirty:
+                try:
+                    self._save_cache()
+                except Exception as e:
+                    Log.warning("Can not save column metadata to {{file}}", file=self.cache.abspath, cause=e)
+
     @property
     def query_path(self):
         return None
@@ -105,9 +202,9 @@ class FromESMetadata(Schema):
         existing_columns = self.meta.columns.find(c.es_index, c.names["."])
         if not existing_columns:
             self.meta.columns.add(c)
-            self.todo.add(c)
 
             if ENABLE_META_SCAN:
+                self.todo.add(c, priority=COLD)
                 if DEBUG:
                     Log.note("todo: {{table}}::{{column}}", table=c.es_index, column=c.es_column)
                 # MARK meta.columns AS DIRTY TOO
@@ -115,16 +212,17 @@ class FromESMetadata(Schema):
                 for cc in cols:
                     cc.partitions = cc.cardinality = None
                     cc.last_updated = Date.now()
-                self.todo.extend(cols)
+                self.todo.extend(cols, priority=COLD)
         else:
             canonical = existing_columns[0]
             if canonical is not c:
                 set_default(c.names, canonical.names)
                 for key in Column.__slots__:
                     canonical[key] = c[key]
-            if DEBUG:
-                Log.note("todo: {{table}}::{{column}}", table=canonical.es_index, column=canonical.es_column)
-            self.todo.add(canonical)
+            if ENABLE_META_SCAN:
+                if DEBUG:
+                    Log.note("todo: {{table}}::{{column}}", table=canonical.es_index, column=canonical.es_column)
+                self.todo.add(canonical, priority=COLD)
 
     def _get_columns(self, table=None):
         # TODO: HANDLE MORE THEN ONE ES, MAP TABLE SHORT_NAME TO ES INSTANCE
@@ -134,7 +232,10 @@ class FromESMetadata(Schema):
         meta = self.es_metadata.indices[es_index]
         if not meta or self.last_es_metadata < Date.now() - OLD_METADATA:
             self.es_metadata = self.default_es.get_metadata(force=True)
+            self.es_metadata_version = self.default_es.state_version
+            self.last_es_metadata = Date.now()
             meta = self.es_metadata.indices[es_index]
+        self.table_versions[es_index] = self.es_metadata_version
 
         for _, properties in meta.mappings.items():
             properties.properties["_id"] = {"type": "string", "index": "not_analyzed"}
@@ -165,6 +266,7 @@ class FromESMetadata(Schema):
                     c.type = es_type_to_json_type[c.type]
                     self._upsert_column(c)
 
+        self.dirty = True
         with Timer("upserting {{num}} columns", {"num": len(abs_columns)}, debug=DEBUG):
             # LIST OF EVERY NESTED PATH
             query_paths = [[c.es_column] for c in abs_columns if c.type == "nested"]
@@ -219,20 +321,26 @@ class FromESMetadata(Schema):
                 with self.meta.tables.locker:
                     self.meta.tables.add(table)
                 self._get_columns(table=es_index_name)
-            elif force or table.timestamp == None or table.timestamp < Date.now() - MAX_COLUMN_METADATA_AGE:
+            elif force:
                 table.timestamp = Date.now()
                 self._get_columns(table=es_index_name)
+            elif self._first_use(es_index_name):
+                # COLUMNS FROM THE CACHE ARE USABLE NOW, CONFIRM THEY ARE CURRENT WITHOUT MAKING THE CALLER WAIT
+                self.refresher.submit("validate columns of " + es_index_name, self._validate_columns, es_index_name)
+            elif table.timestamp == None or table.timestamp < Date.now() - MAX_COLUMN_METADATA_AGE:
+                # STALE COLUMNS ARE STILL USABLE, REFRESH THEM WITHOUT MAKING THE CALLER WAIT
+                table.timestamp = Date.now()
+                self.refresher.submit("refresh columns of " + es_index_name, self._refresh_columns, es_index_name)
 
             with self.meta.columns.locker:
                 columns = self.meta.columns.find(es_index_name, column_name)
             if columns:
-                columns = jx.sort(columns, "names.\.")
-                # AT LEAST WAIT FOR THE COLUMNS TO UPDATE
-                while len(self.todo) and not all(columns.get("last_updated")):
-                    if DEBUG:
-                        Log.note("waiting for columns to update {{columns|json}}", columns=[c.es_index+"."+c.es_column for c in columns if not c.last_updated])
-                    Till(seconds=1).wait()
-                return columns
+                # STALE COLUMNS SOMEONE IS USING ARE REFRESHED BEFORE THE REST
+                too_old = Date.now() - TOO_OLD
+                for c in columns:
+                    if c.type not in STRUCT and (c.last_updated == None or c.last_updated < too_old):
+                        self.todo.add(c, priority=HOT)
+                return jx.sort(columns, "names.\.")
         except Exception as e:
             Log.error("Not expected", cause=e)
 
@@ -242,6 +350,119 @@ class FromESMetadata(Schema):
             self._get_columns(table=table_name)  # TO TEST WHAT HAPPENED
             Log.error("no columns for {{table}}?!", table=table_name)
 
+    def _first_use(self, table):
+        """
+        RETURN True ONLY THE FIRST TIME A TABLE LOADED FROM THE CACHE IS USED
+        """
+        with self.meta.tables.locker:
+            if table in self.unvalidated:
+                self.unvalidated.discard(table)
+                return True
+            return False
+
+    def _validate_columns(self, table, please_stop):
+        """
+        REFRESH THE CACHED COLUMNS OF table IF THE CLUSTER STATE CHANGED SINCE THEY WERE PARSED
+        """
+        try:
+            version = self.default_es.get_state_version()
+            if version != None and version == self.table_versions.get(table):
+                if DEBUG:
+                    Log.note("cached columns of {{table}} are current", table=table)
+                return
+            self._get_columns(table=table)
+        except Exception as e:
+            Log.warning("Could not validate cached columns of {{table}}", table=table, cause=e)
+
+    def _refresh_columns(self, table, please_stop):
+        try:
+            self._get_columns(table=table)
+        except Exception as e:
+            Log.warning("Could not refresh columns of {{table}}", table=table, cause=e)
+
+    def _update_cardinalities(self, columns):
+        """
+        QUERY ES TO FIND CARDINALITY AND PARTITIONS FOR MANY SIMPLE COLUMNS,
+        WITH ONE REQUEST PER INDEX (AND ONE MORE FOR THE PARTITIONS)
+        """
+        by_index = {}
+        for c in columns:
+            if c.type in STRUCT:
+                with self.meta.columns.locker:
+                    c.last_updated = Date.now()
+            elif c.last_updated >= Date.now() - TOO_OLD:
+                continue
+            elif c.es_index.startswith("meta."):
+                self._update_cardinality(c)
+            else:
+                by_index.setdefault(c.es_index.split(".")[0], []).append(c)
+
+        for es_index, cs in by_index.items():
+            try:
+                self._update_index_cardinalities(es_index, cs)
+            except Exception as e:
+                Log.warning("Could not update {{num}} columns of {{index}} at once, trying one at a time", num=len(cs), index=es_index, cause=e)
+                for c in cs:
+                    self._update_cardinality(c)
+        self.dirty = True
+
+    def _update_index_cardinalities(self, es_index, columns):
+        result = self.default_es.post("/" + es_index + "/_search", data={
+            "aggs": {"_" + unicode(i): _counting_query(c) for i, c in enumerate(columns)},
+            "size": 0
+        })
+        count = result.hits.total
+
+        query = Data(size=0)
+        cardinalities = {}
+        for i, c in enumerate(columns):
+            r = result.aggregations["_" + unicode(i)]
+            cardinality = coalesce(r.value, r._nested.value, 0 if r.doc_count == 0 else None)
+            if cardinality == None:
+                Log.error("logic error")
+
+            if _too_many_partitions(c, count, cardinality):
+                if DEBUG:
+                    Log.note("{{table}}.{{field}} has {{num}} parts", table=c.es_index, field=c.es_column, num=cardinality)
+                with self.meta.columns.locker:
+                    self.meta.columns.update({
+                        "set": {
+                            "count": count,
+                            "cardinality": cardinality,
+                            "last_updated": Date.now()
+                        },
+                        "clear": ["partitions"],
+                        "where": {"eq": {"es_index": c.es_index, "es_column": c.es_column}}
+                    })
+            else:
+                cardinalities[i] = cardinality
+                query.aggs["_" + unicode(i)] = _partitions_query(c)
+
+        if not cardinalities:
+            return
+
+        result = self.default_es.post("/" + es_index + "/_search", data=query)
+        for i, cardinality in cardinalities.items():
+            c = columns[i]
+            aggs = result.aggregations["_" + unicode(i)]
+            if aggs._nested:
+                parts = jx.sort(aggs._nested.buckets.key)
+            else:
+                parts = jx.sort(aggs.buckets.key)
+
+            if DEBUG:
+                Log.note("{{field}} has {{parts}}", field=c.names["."], parts=parts)
+            with self.meta.columns.locker:
+                self.meta.columns.update({
+                    "set": {
+                        "count": count,
+                        "cardinality": cardinality,
+                        "partitions": parts,
+                        "last_updated": Date.now()
+                    },
+                    "where": {"eq": {"es_index": c.es_index, "es_column": c.es_column}}
+                })
+
     def _update_cardinality(self, c):
         """
         QUERY ES TO FIND CARDINALITY AND PARTITIONS FOR A SIMPLE COLUMN
@@ -288,7 +509,7 @@ class FromESMetadata(Schema):
                 Log.error("logic error")
 
             query = Data(size=0)
-            if cardinality > 1000 or (count >= 30 and cardinality == count) or (count >= 1000 and cardinality / count > 0.99):
+            if _too_many_partitions(c, count, cardinality):
                 if DEBUG:
                     Log.note("{{table}}.{{field}} has {{num}} parts", table=c.es_index, field=c.es_column, num=cardinality)
                 with self.meta.columns.locker:
@@ -302,27 +523,8 @@ class FromESMetadata(Schema):
                         "where": {"eq": {"es_index": c.es_index, "es_column": c.es_column}}
                     })
                 return
-            elif c.type in _elasticsearch.ES_NUMERIC_TYPES and cardinality > 30:
-                if DEBUG:
-                    Log.note("{{field}} has {{num}} parts", field=c.name, num=cardinality)
-                with self.meta.columns.locker:
-                    self.meta.columns.update({
-                        "set": {
-                            "count": count,
-                            "cardinality": cardinality,
-                            "last_updated": Date.now()
-                        },
-                        "clear": ["partitions"],
-                        "where": {"eq": {"es_index": c.es_index, "es_column": c.es_column}}
-                    })
-                return
-            elif len(c.nested_path) != 1:
-                query.aggs[literal_field(c.names["."])] = {
-                    "nested": {"path": c.nested_path[0]},
-                    "aggs": {"_nested": {"terms": {"field": c.es_column, "size": 0}}}
-                }
             else:
-                query.aggs[literal_field(c.names["."])] = {"terms": {"field": c.es_column, "size": 0}}
+                query.aggs[literal_field(c.names["."])] = _partitions_query(c)
 
             result = self.default_es.post("/" + es_index + "/_search", data=query)
 
@@ -376,7 +578,7 @@ class FromESMetadata(Schema):
         please_stop.on_go(lambda: self.todo.add(THREAD_STOP))
         while not please_stop:
             try:
-                if not self.todo:
+                if ENABLE_META_SCAN and not self.todo:
                     with self.meta.columns.locker:
                         old_columns = [
                             c
@@ -386,59 +588,57 @@ class FromESMetadata(Schema):
                         if old_columns:
                             if DEBUG:
                                 Log.note("Old columns wth dates {{dates|json}}", dates=wrap(old_columns).last_updated)
-                            self.todo.extend(old_columns)
-                            # TEST CONSISTENCY
-                            for c, d in product(list(self.todo.queue), list(self.todo.queue)):
-                                if c.es_column == d.es_column and c.es_index == d.es_index and c != d:
-                                    Log.error("")
+                            self.todo.extend(old_columns, priority=COLD)
+                            if DEBUG:
+                                # TEST CONSISTENCY, QUADRATIC, SO ONLY WHEN DEBUGGING
+                                for c, d in product(list(self.todo.queue), list(self.todo.queue)):
+                                    if c.es_column == d.es_column and c.es_index == d.es_index and c != d:
+                                        Log.error("")
                         else:
                             if DEBUG:
                                 Log.note("no more metatdata to update")
 
                 column = self.todo.pop(Till(seconds=(10*MINUTE).seconds))
+                if column is THREAD_STOP:
+                    break
                 if column:
+                    # TAKE MORE, SO MANY COLUMNS ARE UPDATED WITH ONE REQUEST
+                    columns = [column] + self.todo.pop_all(max=self.refresh_batch - 1)
+                    done = THREAD_STOP in columns
+                    columns = [c for c in columns if c is not THREAD_STOP]
                     if DEBUG:
-                        Log.note("update {{table}}.{{column}}", table=column.es_index, column=column.es_column)
-                    if column.type in STRUCT:
-                        with self.meta.columns.locker:
-                            column.last_updated = Date.now()
-                        continue
-                    elif column.last_updated >= Date.now()-TOO_OLD:
-                        continue
+                        Log.note("update {{columns}}", columns=[c.es_index + "." + c.es_column for c in columns])
                     try:
-                        self._update_cardinality(column)
-                        if DEBUG and not column.es_index.startswith(TEST_TABLE_PREFIX):
-                            Log.note("updated {{column.name}}", column=column)
+                        self._update_cardinalities(columns)
                     except Exception as e:
-                        Log.warning("problem getting cardinality for {{column.name}}", column=column, cause=e)
+                        Log.warning("problem getting cardinality for {{num}} columns", num=len(columns), cause=e)
+                    if done:
+                        break
             except Exception as e:
                 Log.warning("problem in cardinality monitor", cause=e)
 
-    def not_monitor(self, please_stop):
-        Log.alert("metadata scan has been disabled")
-        please_stop.on_go(lambda: self.todo.add(THREAD_STOP))
-        while not please_stop:
-            c = self.todo.pop()
-            if c == THREAD_STOP:
-                break
 
-            if not c.last_updated or c.last_updated >= Date.now()-TOO_OLD:
-                continue
+def _too_many_partitions(c, count, cardinality):
+    """
+    RETURN True IF THE COLUMN HAS TOO MANY DISTINCT VALUES TO BOTHER LISTING THEM
+    """
+    return (
+        cardinality > 1000 or
+        (count >= 30 and cardinality == count) or
+        (count >= 1000 and cardinality / count > 0.99) or
+        (c.type in _elasticsearch.ES_NUMERIC_TYPES and cardinality > 30)
+    )
+
+
+def _partitions_query(c):
+    if len(c.nested_path) != 1:
+        return {
+            "nested": {"path": c.nested_path[0]},
+            "aggs": {"_nested": {"terms": {"field": c.es_column, "size": 0}}}
+        }
+    else:
+        return {"terms": {"field": c.es_column, "size": 0}}
 
-            with self.meta.columns.locker:
-                self.meta.columns.update({
-                    "set": {
-                        "last_updated": Date.now()
-                    },
-                    "clear":[
-                        "count",
-                        "cardinality",
-                        "partitions",
-                    ],
-                    "where": {"eq": {"es_index": c.es_index, "es_column": c.es_column}}
-                })
-            if DEBUG:
-                Log.note("Could not get {{col.es_index}}.{{col.es_column}} info", col=c)
 
 def _counting_query(c):
     if len(c.nested_path) != 1:
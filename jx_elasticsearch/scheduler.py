@@ -0,0 +1,118 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http:# mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_dots import Data, literal_field
+from mo_logs import Log
+from mo_logs.exceptions import Except
+from mo_threads import Lock, Signal, ThreadPool
+from mo_times.timer import Timer
+
+MAX_WORKERS = 4  # MOST ES REQUESTS ONE QUERY WILL HAVE IN FLIGHT AT ONCE
+POOL_SIZE = 16  # MOST ES REQUESTS ALL QUERIES WILL HAVE IN FLIGHT AT ONCE, BEYOND THE QUERY THREADS THEMSELVES
+
+_pool = None
+_pool_locker = Lock("scheduler pool")
+
+
+def _get_pool():
+    global _pool
+    with _pool_locker:
+        if _pool is None or _pool.please_stop:
+            _pool = ThreadPool("scheduler", num_workers=POOL_SIZE)
+        return _pool
+
+
+class Scheduler(object):
+    """
+    RUN INDEPENDENT ES REQUESTS CONCURRENTLY, ON NO MORE THAN max_workers THREADS:
+    THE CALLING THREAD, AND THE REST BORROWED FROM A SHARED ThreadPool
+
+    USAGE:
+        requests = Scheduler("aggs pages")
+        requests.add("page 0", es09.util.post, es, query0, limit)
+        requests.add("page 1", es09.util.post, es, query1, limit)
+        page0, page1 = requests.run()
+        output.meta.timing.requests = requests.timing
+    """
+
+    def __init__(self, name, max_workers=MAX_WORKERS):
+        self.name = name
+        self.max_workers = max_workers
+        self.requests = []
+        self.timing = Data()  # MAP FROM REQUEST NAME TO DURATION
+
+    def add(self, name, target, *args, **kwargs):
+        """
+        :param name: NAME OF THE REQUEST, FOR timing
+        :param target: FUNCTION THAT MAKES THE REQUEST, CALLED WITH args AND kwargs
+        :return: INDEX OF THE RESPONSE IN run()
+        """
+        self.requests.append((name, target, args, kwargs))
+        return len(self.requests) - 1
+
+    def run(self):
+        """
+        :return: LIST OF RESPONSES, IN THE ORDER THE REQUESTS WERE ADDED
+        """
+        num = len(self.requests)
+        responses = [None] * num
+        errors = []
+        locker = Lock("scheduler " + self.name)
+        todo = list(reversed(range(num)))
+        in_flight = [0]
+        done = Signal("scheduler " + self.name + " done")
+
+        def worker(please_stop):
+            while not please_stop:
+                with locker:
+                    if not todo or errors:
+                        return
+                    i = todo.pop()
+                    in_flight[0] += 1
+                name, target, args, kwargs = self.requests[i]
+                try:
+                    with Timer(name, silent=True) as timer:
+                        responses[i] = target(*args, **kwargs)
+                    self.timing[literal_field(name)] = timer.duration
+                except Exception as e:
+                    with locker:
+                        errors.append(Except.wrap(e))
+                finally:
+                    with locker:
+                        in_flight[0] -= 1
+                        if not in_flight[0] and (not todo or errors):
+                            done.go()
+
+        num_workers = min(self.max_workers, num)
+        if num_workers <= 1:
+            # NO NEED FOR THREADS
+            worker(please_stop=False)
+        else:
+            pool = _get_pool()
+            helpers = [
+                pool.submit(self.name + " worker " + unicode(i), worker)
+                for i in range(1, num_workers)
+            ]
+            worker(please_stop=False)
+            # todo IS EMPTY (OR THERE IS AN ERROR); WAIT FOR THE REQUESTS
+            # STILL IN FLIGHT, NOT FOR HELPERS STILL QUEUED IN THE POOL
+            with locker:
+                if not in_flight[0]:
+                    done.go()
+            done.wait()
+            for h in helpers:
+                h.cancel()
+
+        if errors:
+            Log.error("Problem with {{name|quote}} requests", name=self.name, cause=errors)
+        return responses
@@ -31,6 +31,7 @@ def _delayed_imports():
     from jx_python import meta as _meta
     from jx_python.containers.list_usingPythonList import ListContainer as _ListContainer
     from jx_python import containers as _containers
+    from jx_python.containers.columnar import ColumnarContainer
 
     _ = _ListContainer
     _ = _meta
@@ -52,6 +53,7 @@ def _delayed_imports():
         "elasticsearch": FromES,
         "mysql": MySQL,
         "memory": None,
+        "columnar": ColumnarContainer,
         "meta": FromESMetadata
     })
 
@@ -147,6 +147,13 @@ class Container(object):
         """
         Log.error("Not implemented")
 
+    def get_generation(self):
+        """
+        RETURN A VALUE THAT CHANGES WHENEVER THE CONTENT OF THIS CONTAINER
+        CHANGES, OR None IF THERE IS NO SUCH VALUE (RESULTS CAN NOT BE CACHED)
+        """
+        return None
+
     @property
     def schema(self):
         Log.error("Not implemented")
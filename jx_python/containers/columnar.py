@@ -0,0 +1,454 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import operator
+from array import array
+from collections import Mapping
+from itertools import izip
+
+from mo_dots import Data, wrap, listwrap, unwrap, Null, split_field
+from mo_json import json2value
+from mo_kwargs import override
+from mo_logs import Log
+
+from jx_base.expressions import TRUE_FILTER, jx_expression, Expression, TrueOp, FalseOp, jx_expression_to_function, Variable, Literal, AndOp, OrOp, NotOp, EqOp, NeOp, InOp, InequalityOp, MissingOp, ExistsOp
+from jx_python.containers import Container
+from jx_python.containers.list_usingPythonList import ListContainer
+from jx_python.lists.aggs import is_aggs, list_aggs
+from jx_python.meta import get_schema_from_list
+
+# TYPED ARRAY FOR EACH COLUMN TYPE, AND THE PYTHON TYPES ALLOWED IN IT
+# (MIXED COLUMNS ARE KEPT AS list SO VALUES COME BACK AS THEY WENT IN)
+_typecodes = {
+    "boolean": (b"b", (bool,)),
+    "integer": (b"l", (int,)),
+    "long": (b"l", (int, long)),
+    "float": (b"d", (float,)),
+    "double": (b"d", (float,))
+}
+_decoders = {
+    "boolean": bool,
+    "integer": int,
+    "long": int
+}
+
+_inequality = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le
+}
+
+
+class ColumnarContainer(Container):
+    """
+    IN-MEMORY CONTAINER THAT STORES EACH LEAF COLUMN SEPARATELY: NUMBERS IN
+    TYPED ARRAYS, WITH A NULL MASK, AND EVERYTHING ELSE IN PLAIN LISTS.
+    where CLAUSES ARE EVALUATED ONE COLUMN AT A TIME INTO BOOLEAN MASKS,
+    groupby HASHES THE KEY COLUMNS. ANYTHING IT DOES NOT KNOW IS RUN ON THE
+    ROWS, LIKE ListContainer
+    """
+
+    @override
+    def __init__(self, name, data, schema=None, kwargs=None):
+        data = list(unwrap(data))
+        Container.__init__(self, data, schema)
+        if schema == None:
+            schema = get_schema_from_list(name, data)
+        self._schema = schema
+        self.name = name
+        self.num_rows = len(data)
+        self.columns = _decompose(schema, data)  # MAP FROM COLUMN NAME TO _Column
+
+    @classmethod
+    def _from_columns(cls, name, schema, columns, num_rows):
+        output = object.__new__(cls)
+        Container.__init__(output, None, schema)
+        output._schema = schema
+        output.name = name
+        output.num_rows = num_rows
+        output.columns = columns
+        return output
+
+    @property
+    def query_path(self):
+        return None
+
+    @property
+    def schema(self):
+        return self._schema
+
+    @property
+    def data(self):
+        """
+        :return: THE ROWS, AS A LIST OF dict (BUILT ON DEMAND)
+        """
+        if self._rows is None:
+            self._rows = _compose(self.columns, self.num_rows)
+        return self._rows
+
+    @data.setter
+    def data(self, rows):
+        self._rows = rows
+
+    def last(self):
+        if self.num_rows:
+            return wrap(self.data[-1])
+        else:
+            return Null
+
+    def query(self, q):
+        q = wrap(q)
+        frum = self
+        if is_aggs(q):
+            frum = list_aggs(frum.data, q)
+        else:  # SETOP
+            if q.where is not TRUE_FILTER and not isinstance(q.where, TrueOp):
+                frum = frum.filter(q.where)
+
+            if q.sort:
+                frum = frum.sort(q.sort)
+
+            if q.select:
+                frum = frum.select(q.select)
+
+        if q.window:
+            if isinstance(frum, ColumnarContainer):
+                # WINDOW FUNCTIONS UPDATE THE ROWS IN PLACE
+                frum = ListContainer(frum.name, frum.data, frum.schema)
+            for param in q.window:
+                frum.window(param)
+
+        return frum
+
+    def filter(self, where):
+        return self.where(where)
+
+    def where(self, where):
+        if not isinstance(where, Expression) and not hasattr(where, "__call__"):
+            where = jx_expression(where)
+        if isinstance(where, Expression):
+            mask = self._mask(where)
+        else:
+            rows = self.data
+            mask = [bool(where(r)) for r in rows]
+        return self._take([i for i, m in enumerate(mask) if m])
+
+    def _mask(self, expr):
+        """
+        :return: LIST OF bool, ONE FOR EACH ROW
+        """
+        n = self.num_rows
+        if isinstance(expr, TrueOp):
+            return [True] * n
+        elif isinstance(expr, FalseOp):
+            return [False] * n
+        elif isinstance(expr, AndOp):
+            output = [True] * n
+            for t in expr.terms:
+                output = [a and b for a, b in izip(output, self._mask(t))]
+            return output
+        elif isinstance(expr, OrOp):
+            output = [False] * n
+            for t in expr.terms:
+                output = [a or b for a, b in izip(output, self._mask(t))]
+            return output
+        elif isinstance(expr, NotOp):
+            return [not m for m in self._mask(expr.term)]
+        elif isinstance(expr, MissingOp):
+            column = self._scalar_column(expr.expr)
+            if column:
+                return [bool(m) for m in column.nulls]
+        elif isinstance(expr, ExistsOp):
+            column = self._scalar_column(expr.field)
+            if column:
+                return [not m for m in column.nulls]
+        elif isinstance(expr, (EqOp, NeOp, InequalityOp)):
+            column = self._scalar_column(expr.lhs)
+            value = _literal(expr.rhs)
+            if column and value is not None and not isinstance(value, list):
+                if isinstance(expr, EqOp):
+                    return [v == value for v in column]
+                elif isinstance(expr, NeOp):
+                    return [v is not None and v != value for v in column]
+                else:
+                    op = _inequality[expr.op]
+                    return [op(v, value) for v in column]
+        elif isinstance(expr, InOp):
+            column = self._scalar_column(expr.value)
+            values = _literal(expr.superset)
+            if column and isinstance(values, list):
+                try:
+                    values = frozenset(values)
+                except TypeError:
+                    pass
+                return [v in values for v in column]
+
+        # NOT A COLUMN EXPRESSION, SO RUN IT ON THE ROWS
+        func = jx_expression_to_function(expr)
+        return [bool(func(r)) for r in self.data]
+
+    def _scalar_column(self, expr):
+        """
+        :return: THE _Column FOR THE Variable, IF IT ONLY HOLDS SINGLE VALUES
+        """
+        if isinstance(expr, Variable):
+            column = self.columns.get(expr.var)
+            if column and column.scalar:
+                return column
+        return None
+
+    def _take(self, indexes):
+        columns = {k: c.take(indexes) for k, c in self.columns.items()}
+        return ColumnarContainer._from_columns("from " + self.name, self._schema, columns, len(indexes))
+
+    def sort(self, sort):
+        sort = listwrap(sort)
+        keys = []
+        for s in sort:
+            column = self._scalar_column(s.value)
+            if not column:
+                return ColumnarContainer("from " + self.name, jx.sort(self.data, sort, already_normalized=True), self._schema)
+            keys.append((column, s.sort == -1))
+
+        # NULL IS THE LAST VALUE, LIKE jx.value_compare()
+        order = range(self.num_rows)
+        for column, reverse in reversed(keys):
+            values = list(column)
+            order.sort(key=lambda i: (values[i] is None, values[i]), reverse=reverse)
+        return self._take(order)
+
+    def get(self, select):
+        """
+        :param select: the variable to extract from list
+        :return:  a simple list of the extraction
+        """
+        if isinstance(select, list):
+            return [(d[s] for s in select) for d in self]
+        column = self.columns.get(select)
+        if column:
+            return list(column)
+        return [d[select] for d in self]
+
+    def select(self, select):
+        selects = listwrap(select)
+        if len(selects) == 1 and isinstance(selects[0].value, Variable) and selects[0].value.var == "." and selects[0].name == ".":
+            return self
+        if not isinstance(select, list) and isinstance(select.value, Variable):
+            column = self.columns.get(select.value.var)
+            if column:
+                return ListContainer("from " + self.name, data=list(column))
+        return ListContainer("from " + self.name, self.data, self._schema).select(select)
+
+    def window(self, window):
+        Log.error("Use query() to run window functions")
+
+    def having(self, having):
+        _ = having
+        Log.error("not implemented")
+
+    def format(self, format):
+        return ListContainer(self.name, self.data, self._schema).format(format)
+
+    def groupby(self, keys, contiguous=False):
+        try:
+            keys = listwrap(keys)
+            columns = [self.columns.get(k) if isinstance(k, basestring) else None for k in keys]
+            if not all(c and c.scalar for c in columns):
+                return ListContainer(self.name, self.data, self._schema).groupby(keys, contiguous)
+
+            rows = self.data
+            key_values = zip(*[list(c) for c in columns])
+            if contiguous:
+                groups = []
+                previous = object()
+                for i, k in enumerate(key_values):
+                    if k != previous:
+                        groups.append((k, []))
+                        previous = k
+                    groups[-1][1].append(i)
+            else:
+                index = {}
+                for i, k in enumerate(key_values):
+                    index.setdefault(k, []).append(i)
+                # SAME GROUP ORDER AS ListContainer.groupby()
+                groups = sorted(index.items())
+
+            def _output():
+                for g, indexes in groups:
+                    group = Data()
+                    for k, gg in zip(keys, g):
+                        group[k] = gg
+                    yield (group, wrap([rows[i] for i in indexes]))
+
+            return _output()
+        except Exception as e:
+            Log.error("Problem grouping", e)
+
+    def insert(self, documents):
+        self.extend(documents)
+
+    def extend(self, documents):
+        # THE SCHEMA MAY CHANGE, SO THE COLUMNS ARE REBUILT
+        data = self.data + list(unwrap(documents))
+        schema = get_schema_from_list(self.name, data)
+        self._schema = schema
+        self.columns = _decompose(schema, data)
+        self.num_rows = len(data)
+        self._rows = data
+
+    def add(self, value):
+        self.extend([value])
+
+    def __data__(self):
+        return wrap({
+            "meta": {"format": "list"},
+            "data": self.data
+        })
+
+    def get_columns(self, table_name=None):
+        return self._schema.values()
+
+    def __getitem__(self, item):
+        if item < 0 or self.num_rows <= item:
+            return Null
+        return self.data[item]
+
+    def __iter__(self):
+        return (wrap(d) for d in self.data)
+
+    def __len__(self):
+        return self.num_rows
+
+
+class _Column(object):
+    """
+    ONE COLUMN OF VALUES, WITH A NULL MASK
+    values IS A TYPED array WHEN THE COLUMN IS NUMERIC, OTHERWISE A list
+    """
+    __slots__ = ["name", "path", "type", "values", "nulls", "scalar"]
+
+    def __init__(self, name, type, values, nulls, scalar):
+        self.name = name
+        self.path = split_field(name)
+        self.type = type
+        self.values = values
+        self.nulls = nulls  # bytearray, 1 FOR EVERY NULL
+        self.scalar = scalar  # True IF NO VALUE IS A list OR dict
+
+    @classmethod
+    def build(cls, name, type, raw):
+        nulls = bytearray(1 if v is None else 0 for v in raw)
+        code = _typecodes.get(type)
+        if code:
+            typecode, allowed = code
+            if all(v is None or v.__class__ in allowed for v in raw):
+                try:
+                    values = array(typecode, [0 if v is None else v for v in raw])
+                    return _Column(name, type, values, nulls, True)
+                except (TypeError, OverflowError):
+                    pass
+        scalar = not any(isinstance(v, (list, Mapping)) for v in raw)
+        return _Column(name, type, raw, nulls, scalar)
+
+    def take(self, indexes):
+        values = self.values
+        if isinstance(values, array):
+            values = array(values.typecode, [values[i] for i in indexes])
+        else:
+            values = [values[i] for i in indexes]
+        nulls = self.nulls
+        return _Column(self.name, self.type, values, bytearray(nulls[i] for i in indexes), self.scalar)
+
+    def __iter__(self):
+        """
+        :return: THE PYTHON VALUES, None FOR NULL
+        """
+        values = self.values
+        if isinstance(values, array):
+            decode = _decoders.get(self.type)
+            if decode:
+                return (None if n else decode(v) for v, n in izip(values, self.nulls))
+            return (None if n else v for v, n in izip(values, self.nulls))
+        return iter(values)
+
+    def __len__(self):
+        return len(self.nulls)
+
+
+def _decompose(schema, rows):
+    """
+    :return: MAP FROM COLUMN NAME TO _Column
+    """
+    names = set()
+    opaque = []  # COLUMNS STORED WHOLE, SO THEIR CHILDREN ARE NOT STORED
+    for c in schema.columns:
+        if listwrap(c.nested_path)[0] != ".":
+            continue
+        if c.type == "object":
+            continue
+        name = c.names["."]
+        names.add((name, c.type))
+        if c.type not in _typecodes and c.type not in ("string", "undefined"):
+            opaque.append(name)
+
+    output = {}
+    for name, type_ in names:
+        if any(name != o and (name.startswith(o + ".")) for o in opaque):
+            continue
+        path = split_field(name)
+        output[name] = _Column.build(name, type_, [_get(r, path) for r in rows])
+    return output
+
+
+def _compose(columns, num_rows):
+    """
+    :return: LIST OF dict, ONE FOR EACH ROW
+    """
+    self_column = columns.get(".")
+    if self_column:
+        # THE ROWS ARE NOT OBJECTS
+        return list(self_column)
+
+    rows = [{} for _ in range(num_rows)]
+    for c in columns.values():
+        parents, leaf = c.path[:-1], c.path[-1]
+        for row, v in izip(rows, c):
+            if v is None:
+                continue
+            for p in parents:
+                row = row.setdefault(p, {})
+            row[leaf] = v
+    return rows
+
+
+def _get(row, path):
+    for p in path:
+        if not isinstance(row, Mapping):
+            return None
+        row = row.get(p)
+        if row is None:
+            return None
+    return row
+
+
+def _literal(expr):
+    """
+    :return: THE PYTHON VALUE OF A Literal, OR None
+    """
+    if isinstance(expr, Literal) and not isinstance(expr, (TrueOp, FalseOp)):
+        return unwrap(json2value(expr.json))
+    return None
+
+
+from jx_python import jx
@@ -22,7 +22,6 @@ from pyLibrary import convert
 
 from jx_base.expressions import TRUE_FILTER, jx_expression, Expression, TrueOp, jx_expression_to_function, Variable
 from jx_python.containers import Container
-from jx_python.expression_compiler import compile_expression
 from jx_python.lists.aggs import is_aggs, list_aggs
 from jx_python.meta import get_schema_from_list
 
@@ -107,13 +106,7 @@ class ListContainer(Container):
         return self.where(where)
 
     def where(self, where):
-        temp = None
-        if isinstance(where, Mapping):
-            exec("def temp(row):\n    return "+jx_expression(where).to_python())
-        elif isinstance(where, Expression):
-            temp = compile_expression(where.to_python())
-        else:
-            temp = where
+        temp = jx_expression_to_function(where)
 
         return ListContainer("from "+self.name, filter(temp, self.data), self.schema)
 
@@ -11,7 +11,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
-import itertools
+from bisect import bisect_right
 from collections import Mapping
 from numbers import Number
 
@@ -427,7 +427,7 @@ class SetDomain(Domain):
 
 
 class TimeDomain(Domain):
-    __slots__ = ["max", "min", "interval", "partitions", "NULL"]
+    __slots__ = ["max", "min", "interval", "partitions", "NULL", "lookup"]
 
     def __init__(self, **desc):
         Domain.__init__(self, **desc)
@@ -454,6 +454,11 @@ class TimeDomain(Domain):
             {"min": v, "max": v + self.interval, "dataIndex": i}
             for i, v in enumerate(Date.range(self.min, self.max, self.interval))
         ])
+        # MONTHS ARE NOT ALL THE SAME LENGTH
+        self.lookup = _PartitionLookup(
+            [(p.min.unix, p.max.unix) for p in self.partitions],
+            interval=None if self.interval.month else self.interval.seconds
+        )
 
     def compare(self, a, b):
         return value_compare(a, b)
@@ -462,16 +467,16 @@ class TimeDomain(Domain):
         return self.getPartByKey(part[self.key])
 
     def getIndexByKey(self, key):
-        for p in self.partitions:
-            if p.min <= key < p.max:
-                return p.dataIndex
-        return len(self.partitions)
+        return self.lookup.index(_unix(key))
+
+    def getIndexesByKeys(self, keys):
+        return self.lookup.indexes_of([_unix(k) for k in keys])
 
     def getPartByKey(self, key):
-        for p in self.partitions:
-            if p.min <= key < p.max:
-                return p
-        return self.NULL
+        i = self.lookup.index(_unix(key))
+        if i == len(self.partitions):
+            return self.NULL
+        return self.partitions[i]
 
     def getKey(self, part):
         return part[self.key]
@@ -490,7 +495,7 @@ class TimeDomain(Domain):
 
 
 class DurationDomain(Domain):
-    __slots__ = ["max", "min", "interval", "partitions", "NULL"]
+    __slots__ = ["max", "min", "interval", "partitions", "NULL", "lookup"]
 
     def __init__(self, **desc):
         Domain.__init__(self, **desc)
@@ -514,6 +519,10 @@ class DurationDomain(Domain):
 
         self.key = "min"
         self.partitions = wrap([{"min": v, "max": v + self.interval, "dataIndex":i} for i, v in enumerate(Duration.range(self.min, self.max, self.interval))])
+        self.lookup = _PartitionLookup(
+            [(p.min.milli, p.max.milli) for p in self.partitions],
+            interval=self.interval.milli
+        )
 
     def compare(self, a, b):
         return value_compare(a, b)
@@ -522,16 +531,16 @@ class DurationDomain(Domain):
         return self.getPartByKey(part[self.key])
 
     def getIndexByKey(self, key):
-        for p in self.partitions:
-            if p.min <= key < p.max:
-                return p.dataIndex
-        return len(self.partitions)
+        return self.lookup.index(_milli(key))
+
+    def getIndexesByKeys(self, keys):
+        return self.lookup.indexes_of([_milli(k) for k in keys])
 
     def getPartByKey(self, key):
-        for p in self.partitions:
-            if p.min <= key < p.max:
-                return p
-        return self.NULL
+        i = self.lookup.index(_milli(key))
+        if i == len(self.partitions):
+            return self.NULL
+        return self.partitions[i]
 
     def getKey(self, part):
         return part[self.key]
@@ -614,7 +623,7 @@ class UniqueDomain(Domain):
 
 
 class RangeDomain(Domain):
-    __slots__ = ["max", "min", "interval", "partitions", "NULL"]
+    __slots__ = ["max", "min", "interval", "partitions", "NULL", "lookup"]
 
     def __init__(self, **desc):
         Domain.__init__(self, **desc)
@@ -636,18 +645,15 @@ class RangeDomain(Domain):
                     Log.error("Expecting all parts to have {{key}} as a property", key=self.key)
                 p.dataIndex = i
 
-            # VERIFY PARTITIONS DO NOT OVERLAP, HOLES ARE FINE
-            for p, q in itertools.product(parts, parts):
-                if p.min <= q.min and q.min < p.max:
-                    Log.error("partitions overlap!")
-
             self.partitions = parts
+            self.lookup = _PartitionLookup([(p.min, p.max) for p in parts])
             return
         elif any([self.min == None, self.max == None, self.interval == None]):
             Log.error("Can not handle missing parameter")
 
         self.key = "min"
         self.partitions = wrap([{"min": v, "max": v + self.interval, "dataIndex": i} for i, v in enumerate(frange(self.min, self.max, self.interval))])
+        self.lookup = _PartitionLookup([(p.min, p.max) for p in self.partitions], interval=self.interval)
 
     def compare(self, a, b):
         return value_compare(a, b)
@@ -656,16 +662,16 @@ class RangeDomain(Domain):
         return self.getPartByKey(part[self.key])
 
     def getIndexByKey(self, key):
-        for p in self.partitions:
-            if p.min <= key < p.max:
-                return p.dataIndex
-        return len(self.partitions)
+        return self.lookup.index(_number(key))
+
+    def getIndexesByKeys(self, keys):
+        return self.lookup.indexes_of([_number(k) for k in keys])
 
     def getPartByKey(self, key):
-        for p in self.partitions:
-            if p.min <= key < p.max:
-                return p
-        return self.NULL
+        i = self.lookup.index(_number(key))
+        if i == len(self.partitions):
+            return self.NULL
+        return self.partitions[i]
 
     def getKey(self, part):
         return part[self.key]
@@ -683,6 +689,83 @@ class RangeDomain(Domain):
         return output
 
 
+class _PartitionLookup(object):
+    """
+    FIND THE PARTITION HOLDING A KEY WITHOUT VISITING ALL THE PARTITIONS
+    KEYS AND BOUNDARIES ARE NUMBERS, SO THERE ARE NO Date/Duration COMPARES
+    """
+    __slots__ = ["mins", "maxs", "indexes", "interval", "num"]
+
+    def __init__(self, ranges, interval=None):
+        """
+        :param ranges: (min, max) PAIR FOR EACH PARTITION, IN dataIndex ORDER
+        :param interval: WIDTH OF EVERY PARTITION, IF THEY ARE CONTIGUOUS AND
+                         ALL THE SAME WIDTH, SO THE INDEX CAN BE CALCULATED
+        """
+        order = sorted(range(len(ranges)), key=lambda i: ranges[i][0])
+        self.mins = [ranges[i][0] for i in order]
+        self.maxs = [ranges[i][1] for i in order]
+        self.indexes = order
+        self.interval = interval
+        self.num = len(ranges)
+
+        # VERIFY PARTITIONS DO NOT OVERLAP, HOLES ARE FINE
+        for i in range(1, self.num):
+            if self.mins[i] < self.maxs[i - 1]:
+                Log.error("partitions overlap!")
+
+    def index(self, key):
+        """
+        :return: dataIndex OF THE PARTITION, OR num IF NO PARTITION HOLDS key
+        """
+        if key is None or not self.num:
+            return self.num
+        mins = self.mins
+        if self.interval:
+            i = int((key - mins[0]) // self.interval)
+            if i < 0:
+                return self.num
+            if i >= self.num:
+                i = self.num - 1
+            # THE BOUNDARIES WERE MADE BY REPEATED ADDITION, SO ROUNDING
+            # CAN PUT THE key ONE PARTITION OVER
+            if key < mins[i]:
+                i -= 1
+            elif key >= self.maxs[i] and i + 1 < self.num:
+                i += 1
+        else:
+            i = bisect_right(mins, key) - 1
+        if i < 0 or not (mins[i] <= key < self.maxs[i]):
+            return self.num
+        return self.indexes[i]
+
+    def indexes_of(self, keys):
+        index = self.index
+        return [index(k) for k in keys]
+
+
+def _unix(key):
+    if key == None:
+        return None
+    if isinstance(key, Date):
+        return key.unix
+    return Date(key).unix
+
+
+def _milli(key):
+    if key == None:
+        return None
+    if isinstance(key, Duration):
+        return key.milli
+    return Duration(key).milli
+
+
+def _number(key):
+    if key == None:
+        return None
+    return key
+
+
 def frange(start, stop, step):
     # LIKE range(), BUT FOR FLOATS
     output = start
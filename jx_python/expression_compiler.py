@@ -13,9 +13,11 @@ from __future__ import unicode_literals
 
 import re
 
+from mo_collections.lru_cache import LruCache
 from pyLibrary import convert
 from mo_logs import Log
-from mo_dots import coalesce, Data, listwrap
+from mo_dots import coalesce, Data, listwrap, unwrap
+from mo_json import json2value
 from mo_times.dates import Date
 
 true = True
@@ -23,8 +25,73 @@ false = False
 null = None
 EMPTY_DICT = {}
 
+MAX_COMPILED = 10000  # NUMBER OF COMPILED FUNCTIONS KEPT
+compiled = LruCache(max_size=MAX_COMPILED, name="compiled expressions")  # MAP FROM SOURCE TO FUNCTION
+supersets = LruCache(max_size=MAX_COMPILED, name="expression supersets")  # MAP FROM JSON TO Superset
+SUPERSET = re.compile(r'__superset__\(("(?:[^"\\]|\\.)*")\)')
+
+
+PRIMITIVES = {str, unicode, int, long, float, bool, type(None)}  # TYPES WHERE EQUAL MEANS EQUAL HASH
+
+
+class Superset(object):
+    """
+    FAST `value in superset`, WITH LIST SEMANTICS FOR EVERYTHING ELSE
+    ONLY PRIMITIVES USE THE SET; TYPES LIKE Date DEFINE __eq__ WITHOUT A
+    MATCHING __hash__, SO WOULD NOT BE FOUND
+    """
+    __slots__ = ["set", "list"]
+
+    def __init__(self, values):
+        self.list = values
+        if all(v.__class__ in PRIMITIVES for v in values):
+            self.set = frozenset(values)
+        else:
+            self.set = None
+
+    def __contains__(self, value):
+        if self.set is not None and value.__class__ in PRIMITIVES:
+            return value in self.set
+        return value in self.list
+
+
+def __superset__(json):
+    """
+    :param json: JSON OF THE VALUES
+    :return: Superset OF THE VALUES, SHARED WITH ALL OTHER EXPRESSIONS
+    """
+    output = supersets.get(json)
+    if output is None:
+        output = supersets[json] = Superset(listwrap(unwrap(json2value(json))))
+    return output
+
 
 def compile_expression(source):
+    """
+    :param source:  PYTHON SOURCE CODE
+    :return:  PYTHON FUNCTION, SHARED WITH ALL OTHER CALLERS OF THE SAME source
+    """
+    output = compiled.get(source)
+    if output is None:
+        output = compiled[source] = _compile_expression(source)
+    return output
+
+
+def _hoist(source):
+    """
+    MAKE THE __superset__() CALLS ONCE, HERE, NOT FOR EVERY ROW
+    :return: (code, hoisted) PAIR; code REFERS TO _hoisted[i]
+    """
+    hoisted = []
+
+    def hoist(match):
+        hoisted.append(__superset__(json2value(match.group(1))))
+        return "_hoisted[" + unicode(len(hoisted) - 1) + "]"
+
+    return SUPERSET.sub(hoist, source), hoisted
+
+
+def _compile_expression(source):
     """
     THIS FUNCTION IS ON ITS OWN FOR MINIMAL GLOBAL NAMESPACE
 
@@ -42,11 +109,13 @@ def compile_expression(source):
     _ = EMPTY_DICT
     _ = re
 
+    code, _hoisted = _hoist(source)
+
     output = None
     exec """
-def output(row, rownum=None, rows=None):
+def output(row, rownum=None, rows=None, _hoisted=_hoisted):
     try:
-        return """ + source + """
+        return """ + code + """
     except Exception as e:
         Log.error("Problem with dynamic function {{func|quote}}",  func= """ + convert.value2quote(source) + """, cause=e)
 """
@@ -138,6 +138,8 @@ def to_python(self, not_null=False, boolean=False, many=False):
 
 @extend(InOp)
 def to_python(self, not_null=False, boolean=False, many=False):
+    if isinstance(self.superset, Literal) and self.superset.json.startswith("["):
+        return "(" + self.value.to_python() + ") in " + _superset(self.superset)
     return self.value.to_python() + " in " + self.superset.to_python(many=True)
 
 
@@ -154,6 +156,8 @@ def to_python(self, not_null=False, boolean=False, many=False):
 
 @extend(EqOp)
 def to_python(self, not_null=False, boolean=False, many=False):
+    if isinstance(self.lhs, Literal):
+        return "(" + self.rhs.to_python() + ") in " + _superset(self.lhs)
     return "(" + self.rhs.to_python() + ") in listwrap(" + self.lhs.to_python() + ")"
 
 
@@ -287,3 +291,10 @@ def to_python(self, not_null=False, boolean=False, many=False):
     for w in reversed(self.whens[0:-1]):
         acc = "(" + w.when.to_python(boolean=True) + ") ? (" + w.then.to_python() + ") : (" + acc + ")"
     return acc
+
+
+def _superset(literal):
+    """
+    PYTHON FOR THE Literal AS A Superset, BUILT ONCE BY compile_expression()
+    """
+    return "__superset__(" + quote(literal.json) + ")"
@@ -12,18 +12,19 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import itertools
+from copy import copy
 
 from mo_logs import Log
 from mo_math import UNION
 from mo_times.dates import Date
-from mo_dots import listwrap, wrap, coalesce
+from mo_dots import listwrap, wrap, coalesce, unwrap, Data, FlatList
 from mo_collections.matrix import Matrix
 from jx_python import windows
 from jx_python.domains import SimpleSetDomain, DefaultDomain
-from jx_python.expression_compiler import compile_expression
 from jx_base.expressions import jx_expression_to_function
 
 _ = Date
+_EMPTY = object()  # MARKS CELLS WITH NO ROWS
 
 def is_aggs(query):
     if query.edges or query.groupby or any(a != None and a != "none" for a in listwrap(query.select).aggregate):
@@ -32,73 +33,310 @@ def is_aggs(query):
 
 
 def list_aggs(frum, query):
-    frum = wrap(frum)
+    """
+    ONE PASS OVER THE ROWS, ACCUMULATING THE select VALUES FOR EACH COORDINATE
+    IN A dict; THE CUBE IS ONLY BUILT AT THE END
+    """
     select = listwrap(query.select)
+    where = jx_expression_to_function(query.where)
+    rows = [d for d in unwrap(frum) if where(d)]
+    accumulators = [_accumulator(s) for s in select]
+
+    if query.groupby:
+        cells = _collect(rows, query.groupby, select, [_value_keyer(g) for g in query.groupby], accumulators)
+        return _groupby_output(query.groupby, select, cells)
+
+    edges = query.edges
+    net_new_edge_names = set(wrap(edges).name) - UNION(e.value.vars() for e in edges)
+    if net_new_edge_names & UNION(ss.value.vars() for ss in select):
+        # s_accessor NEEDS THESE EDGES, SO THE DOMAINS MUST BE KNOWN BEFORE THE PASS
+        for e in edges:
+            if isinstance(e.domain, DefaultDomain):
+                accessor = jx_expression_to_function(e.value)
+                _set_domain(e, set(accessor(d) for d in rows))
+        cells = _collect(rows, edges, select, [make_accessor(e) for e in edges], accumulators, add_edges=True)
+    else:
+        keyers = [
+            _value_keyer(e) if isinstance(e.domain, DefaultDomain)
+            else _index_keyer(e) if e.value and hasattr(e.domain, "getIndexesByKeys")
+            else make_accessor(e)
+            for e in edges
+        ]
+        cells = _collect(rows, edges, select, keyers, accumulators)
 
-    for e in query.edges:
-        if isinstance(e.domain, DefaultDomain):
-            accessor = jx_expression_to_function(e.value)
-            unique_values = set(map(accessor, frum))
-            if None in unique_values:
-                e.allowNulls = coalesce(e.allowNulls, True)
-                unique_values -= {None}
-            e.domain = SimpleSetDomain(partitions=list(sorted(unique_values)))
+        # CONVERT EDGE VALUES TO PARTITION INDEXES
+        lookups = []
+        for i, e in enumerate(edges):
+            if isinstance(e.domain, DefaultDomain):
+                _set_domain(e, set(c[i] for c in cells))
+                domain = e.domain
+                lookups.append({v: domain.getIndexByKey(v) for v in set(c[i] for c in cells)})
+            else:
+                lookups.append(None)
+        if any(lookups):
+            cells = {
+                tuple(c if l is None else l[c] for c, l in zip(coord, lookups)): values
+                for coord, values in cells.items()
+            }
+
+    dims = [len(e.domain.partitions) + (1 if e.allowNulls else 0) for e in edges]
+    result = {}
+    for i, (s, accumulator) in enumerate(zip(select, accumulators)):
+        if not edges:
+            cell = cells.get(())
+            result[s.name] = Matrix(value=(cell[i] if cell else accumulator()).end())
+        elif any(d == 0 for d in dims):
+            result[s.name] = Matrix(dims=dims)
         else:
-            pass
+            flat = [_EMPTY] * _product(dims)
+            for coord, accs in cells.items():
+                flat[_offset(coord, dims)] = accs[i].end()
+            for o, v in enumerate(flat):
+                if v is _EMPTY:
+                    flat[o] = accumulator().end()
+            result[s.name] = Matrix.from_flat(dims, flat)
 
-    s_accessors = [(ss.name, compile_expression(ss.value.to_python())) for ss in select]
+    from jx_python.containers.cube import Cube
 
-    result = {
-        s.name: Matrix(
-            dims=[len(e.domain.partitions) + (1 if e.allowNulls else 0) for e in query.edges],
-            zeros=lambda: windows.name2accumulator.get(s.aggregate)(**s)
-        )
-        for s in select
-    }
-    where = jx_expression_to_function(query.where)
-    coord = [None]*len(query.edges)
-    edge_accessor = [(i, make_accessor(e)) for i, e in enumerate(query.edges)]
+    output = Cube(select, edges, result)
+    return output
 
-    net_new_edge_names = set(wrap(query.edges).name) - UNION(e.value.vars() for e in query.edges)
-    if net_new_edge_names & UNION(ss.value.vars() for ss in select):
-        # s_accessor NEEDS THESE EDGES, SO WE PASS THEM ANYWAY
-        for d in filter(where, frum):
-            d = d.copy()
-            for c, get_matches in edge_accessor:
-                coord[c] = get_matches(d)
-
-            for s_name, s_accessor in s_accessors:
-                mat = result[s_name]
-                for c in itertools.product(*coord):
-                    acc = mat[c]
-                    for e, cc in zip(query.edges, c):
-                        d[e.name] = e.domain.partitions[cc]
-                    val = s_accessor(d, c, frum)
-                    acc.add(val)
+
+def _collect(rows, edges, select, keyers, accumulators, add_edges=False):
+    """
+    :param accumulators: ONE FACTORY PER select, FOR THE RUNNING AGGREGATE OF A CELL
+    :return: MAP FROM COORDINATE TUPLE TO LIST (ONE PER select) OF ACCUMULATORS
+    """
+    s_accessors = [jx_expression_to_function(s.value) for s in select]
+    cells = {}
+
+    if add_edges:
+        for rownum, d in enumerate(rows):
+            coord = [k(d) for k in keyers]
+            for c in itertools.product(*coord):
+                dd = wrap(copy(d))
+                for e, cc in zip(edges, c):
+                    dd[e.name] = e.domain.partitions[cc]
+                cell = cells.get(c)
+                if cell is None:
+                    cell = cells[c] = [a() for a in accumulators]
+                for acc, s_accessor in zip(cell, s_accessors):
+                    acc.add(s_accessor(dd, rownum, rows))
+    elif all(isinstance(k, (_ValueKeyer, _IndexKeyer)) for k in keyers):
+        # FASTER: EXACTLY ONE COORDINATE PER ROW, FOUND A COLUMN AT A TIME
+        if keyers:
+            coords = zip(*(k.column(rows) for k in keyers))
+        else:
+            coords = [()] * len(rows)
+        drop_nulls = [(i, k.null) for i, k in enumerate(keyers) if not k.allow_nulls]
+        for rownum, (d, c) in enumerate(zip(rows, coords)):
+            if drop_nulls and any(c[i] == null for i, null in drop_nulls):
+                continue
+            cell = cells.get(c)
+            if cell is None:
+                cell = cells[c] = [a() for a in accumulators]
+            for acc, s_accessor in zip(cell, s_accessors):
+                acc.add(s_accessor(d, rownum, rows))
     else:
-        # FASTER
-        for d in filter(where, frum):
-            for c, get_matches in edge_accessor:
-                coord[c] = get_matches(d)
-
-            for s_name, s_accessor in s_accessors:
-                mat = result[s_name]
-                for c in itertools.product(*coord):
-                    acc = mat[c]
-                    val = s_accessor(d, c, frum)
-                    acc.add(val)
-
-    for s in select:
-        # if s.aggregate == "count":
-        #     continue
-        m = result[s.name]
-        for c, var in m.items():
-            if var != None:
-                m[c] = var.end()
+        for rownum, d in enumerate(rows):
+            values = [s_accessor(d, rownum, rows) for s_accessor in s_accessors]
+            for c in itertools.product(*(k(d) for k in keyers)):
+                cell = cells.get(c)
+                if cell is None:
+                    cell = cells[c] = [a() for a in accumulators]
+                for acc, v in zip(cell, values):
+                    acc.add(v)
+    return cells
+
+
+class _ValueKeyer(object):
+    """
+    EDGE WITH NO DOMAIN (YET): THE COORDINATE IS THE VALUE ITSELF
+    """
+    __slots__ = ["accessor", "allow_nulls"]
+    null = None
+
+    def __init__(self, accessor, allow_nulls):
+        self.accessor = accessor
+        self.allow_nulls = allow_nulls
+
+    def __call__(self, row):
+        v = self.accessor(row)
+        if v is None and not self.allow_nulls:
+            return []
+        return [v]
+
+    def column(self, rows):
+        accessor = self.accessor
+        return [accessor(d) for d in rows]
+
+
+def _value_keyer(e):
+    return _ValueKeyer(jx_expression_to_function(e.value), e.allowNulls is not False)
+
+
+class _IndexKeyer(object):
+    """
+    EDGE WITH A DOMAIN THAT CAN FIND MANY PARTITIONS AT ONCE
+    THE COORDINATE IS THE PARTITION INDEX, len(partitions) FOR NULL
+    """
+    __slots__ = ["accessor", "domain", "allow_nulls", "null"]
+
+    def __init__(self, accessor, domain, allow_nulls):
+        self.accessor = accessor
+        self.domain = domain
+        self.allow_nulls = allow_nulls
+        self.null = len(domain.partitions)
+
+    def __call__(self, row):
+        c = self.domain.getIndexByKey(self.accessor(row))
+        if c == self.null and not self.allow_nulls:
+            return []
+        return [c]
+
+    def column(self, rows):
+        accessor = self.accessor
+        return self.domain.getIndexesByKeys([accessor(d) for d in rows])
+
+
+def _index_keyer(e):
+    return _IndexKeyer(jx_expression_to_function(e.value), e.domain, bool(e.allowNulls))
+
+
+def _set_domain(e, values):
+    if None in values:
+        e.allowNulls = coalesce(e.allowNulls, True)
+        values = values - {None}
+    e.domain = SimpleSetDomain(partitions=list(sorted(values)))
+
+
+def _groupby_output(groupby, select, cells):
+    """
+    :return: LIST OF RECORDS, ONE PER NON-EMPTY GROUP, NULL KEYS LAST
+    """
+    output = FlatList()
+    for coord in sorted(cells.keys(), key=lambda c: tuple((v is None, v) for v in c)):
+        record = Data()
+        for g, v in zip(groupby, coord):
+            record[g.name] = v
+        for s, acc in zip(select, cells[coord]):
+            record[s.name] = acc.end()
+        output.append(record)
+    return output
+
+
+class _Count(object):
+    __slots__ = ["total"]
+
+    def __init__(self):
+        self.total = 0
+
+    def add(self, value):
+        if value != None:
+            self.total += 1
+
+    def end(self):
+        return self.total
+
+
+class _Sum(object):
+    __slots__ = ["total"]
+
+    def __init__(self):
+        self.total = 0
+
+    def add(self, value):
+        if value != None:
+            self.total += value
+
+    def end(self):
+        return self.total
+
+
+class _Min(object):
+    __slots__ = ["value"]
+
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if value != None and (self.value is None or value < self.value):
+            self.value = value
+
+    def end(self):
+        return self.value
+
+
+class _Max(object):
+    __slots__ = ["value"]
+
+    def __init__(self):
+        self.value = None
+
+    def add(self, value):
+        if value != None and (self.value is None or value > self.value):
+            self.value = value
+
+    def end(self):
+        return self.value
+
+
+class _Average(object):
+    __slots__ = ["total", "count"]
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, value):
+        if value != None:
+            self.total += value
+            self.count += 1
+
+    def end(self):
+        if not self.count:
+            return None
+        return self.total / self.count
+
+
+# AGGREGATES KEPT AS A RUNNING VALUE, SO A CELL NEVER HOLDS ITS ROWS' VALUES
+_running_aggregates = {
+    "count": _Count,
+    "sum": _Sum,
+    "min": _Min,
+    "minimum": _Min,
+    "max": _Max,
+    "maximum": _Max,
+    "average": _Average
+}
+
+
+def _accumulator(s):
+    """
+    :return: FACTORY FOR THE ACCUMULATOR OF ONE CELL; ONLY THE AGGREGATES
+             THAT NEED ALL THE VALUES (percentile, median, list) KEEP THEM
+    """
+    running = _running_aggregates.get(s.aggregate)
+    if running:
+        return running
+
+    accumulator = windows.name2accumulator.get(s.aggregate)
+    if not accumulator:
+        Log.error("{{aggregate|quote}} is not a known aggregate", aggregate=s.aggregate)
+    return lambda: accumulator(**s)
+
+
+def _offset(coord, dims):
+    offset = 0
+    for c, d in zip(coord, dims):
+        offset = offset * d + c
+    return offset
 
-    from jx_python.containers.cube import Cube
 
-    output = Cube(select, query.edges, result)
+def _product(dims):
+    output = 1
+    for d in dims:
+        output *= d
     return output
 
 
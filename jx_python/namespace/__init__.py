@@ -32,6 +32,7 @@ class Namespace(object):
         output.window = convert_list(self._convert_window, query.window)
         output.sort = self._convert_clause(query.sort)
         output.format = query.format
+        output.stream = query.stream
 
         return output
 
@@ -80,6 +80,7 @@ class Normal(Namespace):
             Log.error("Expecting limit >= 0")
 
         output.isLean = query.isLean
+        output.stream = query.stream
 
         # DEPTH ANALYSIS - LOOK FOR COLUMN REFERENCES THAT MAY BE DEEPER THAN
         # THE from SOURCE IS.
@@ -88,6 +88,8 @@ class Typed(Namespace):
         output.sort = self._convert_clause(query.sort)
         output.limit = query.limit
         output.format = query.format
+        output.isLean = query.isLean
+        output.stream = query.stream
 
         return output
 
@@ -49,7 +49,7 @@ def _late_import():
 
 
 class QueryOp(Expression):
-    __slots__ = ["frum", "select", "edges", "groupby", "where", "window", "sort", "limit", "having", "format", "isLean"]
+    __slots__ = ["frum", "select", "edges", "groupby", "where", "window", "sort", "limit", "having", "format", "isLean", "stream"]
 
     def __new__(cls, op, frum, select=None, edges=None, groupby=None, window=None, where=None, sort=None, limit=None, format=None):
         output = object.__new__(cls)
@@ -233,7 +233,12 @@ class QueryOp(Expression):
         output.window = [_normalize_window(w) for w in listwrap(query.window)]
         output.having = None
         output.sort = _normalize_sort(query.sort)
-        output.limit = Math.min(MAX_LIMIT, coalesce(query.limit, DEFAULT_LIMIT))
+        output.stream = query.meta.stream == True  # FORMATTERS MAY RETURN data AS A GENERATOR
+        if output.stream and not output.edges and not output.groupby:
+            # STREAMED SET OPERATIONS MAY BE PAGED OUT OF THE CONTAINER; CONTAINERS THAT CAN NOT DO THAT APPLY MAX_LIMIT
+            output.limit = coalesce(query.limit, DEFAULT_LIMIT)
+        else:
+            output.limit = Math.min(MAX_LIMIT, coalesce(query.limit, DEFAULT_LIMIT))
         if not Math.is_integer(output.limit) or output.limit < 0:
             Log.error("Expecting limit >= 0")
 
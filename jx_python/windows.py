@@ -13,13 +13,13 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import functools
+import math
+from collections import deque
 from copy import copy
 
-import mo_math
-from mo_collections.multiset import Multiset
+from mo_collections.sorted_list import SortedList
 from mo_dots.lists import FlatList
 from mo_logs import Log
-from mo_math import MIN
 from mo_math import Math
 from mo_math import stats
 from mo_math.stats import ZeroMoment, ZeroMoment2Stats
@@ -182,60 +182,61 @@ class _SimpleStats(WindowFunction):
 
 
 class Min(WindowFunction):
+    """
+    MONOTONIC DEQUE: ONLY VALUES THAT CAN STILL BE THE MINIMUM ARE KEPT
+    EXPECTS A SLIDING WINDOW: sub() IS ALWAYS GIVEN THE OLDEST VALUE
+    """
     def __init__(self, **kwargs):
         object.__init__(self)
-        self.total = Multiset()
-
+        self.candidates = deque()
 
     def add(self, value):
         if value == None:
-
             return
-        self.total.add(value)
+        candidates = self.candidates
+        while candidates and value < candidates[-1]:
+            candidates.pop()
+        candidates.append(value)
 
     def sub(self, value):
         if value == None:
             return
-        self.total.remove(value)
+        if self.candidates and self.candidates[0] == value:
+            self.candidates.popleft()
 
     def end(self):
-        return MIN(self.total)
-
-
-# class Max(WindowFunction):
-#     def __init__(self, **kwargs):
-#         object.__init__(self)
-#         self.total = Multiset()
-#
-#
-#     def add(self, value):
-#         if value == None:
-#             return
-#         self.total.add(value)
-#
-#     def sub(self, value):
-#         if value == None:
-#             return
-#         self.total.remove(value)
-#
-#     def end(self):
-#         return MAX(self.total.dic.keys())
+        if self.candidates:
+            return self.candidates[0]
+        return None
 
 
 class Max(WindowFunction):
+    """
+    MONOTONIC DEQUE: ONLY VALUES THAT CAN STILL BE THE MAXIMUM ARE KEPT
+    EXPECTS A SLIDING WINDOW: sub() IS ALWAYS GIVEN THE OLDEST VALUE
+    """
     def __init__(self, **kwargs):
         object.__init__(self)
-        self.max = None
-
+        self.candidates = deque()
 
     def add(self, value):
-        self.max = mo_math.MAX([self.max, value])
+        if value == None:
+            return
+        candidates = self.candidates
+        while candidates and candidates[-1] < value:
+            candidates.pop()
+        candidates.append(value)
 
     def sub(self, value):
-        Log.error("Not implemented")
+        if value == None:
+            return
+        if self.candidates and self.candidates[0] == value:
+            self.candidates.popleft()
 
     def end(self):
-        return self.max
+        if self.candidates:
+            return self.candidates[0]
+        return None
 
 
 class Count(WindowFunction):
@@ -279,31 +280,43 @@ class Sum(WindowFunction):
 
 
 class Percentile(WindowFunction):
+    """
+    KEEP THE WINDOW SORTED, SO THE PERCENTILE IS A LOOKUP, NOT A SORT
+    """
     def __init__(self, percentile, *args, **kwargs):
-        """
-        USE num_records TO MINIMIZE MEMORY CONSUPTION
-        """
         object.__init__(self)
         self.percentile = percentile
-        self.total = []
-
+        self.total = SortedList()
 
     def add(self, value):
         if value == None:
             return
-        self.total.append(value)
+        self.total.add(value)
 
     def sub(self, value):
         if value == None:
             return
         try:
-            i = self.total.index(value)
-            self.total = self.total[:i] + self.total[i+1:]
+            self.total.remove(value)
         except Exception as e:
             Log.error("Problem with window function", e)
 
     def end(self):
-        return stats.percentile(self.total, self.percentile)
+        # SAME INTERPOLATION AS stats.percentile()
+        N = self.total
+        if not N:
+            return None
+        k = (len(N) - 1) * self.percentile
+        f = int(math.floor(k))
+        c = int(math.ceil(k))
+        if f == c:
+            return N[f]
+        return N[f] * (c - k) + N[c] * (k - f)
+
+
+class Median(Percentile):
+    def __init__(self, *args, **kwargs):
+        Percentile.__init__(self, 0.5)
 
 
 class List(WindowFunction):
@@ -330,6 +343,7 @@ name2accumulator = {
     "max": Max,
     "maximum": Max,
     "list": List,
+    "median": Median,
     "min": Min,
     "minimum": Min,
     "percentile": Percentile,
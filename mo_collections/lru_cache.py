@@ -0,0 +1,98 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from time import time
+
+from mo_dots import Data
+from mo_threads import Lock
+
+
+class LruCache(object):
+    """
+    THREAD-SAFE MAPPING THAT FORGETS THE LEAST RECENTLY USED KEYS
+
+    max_size - MAXIMUM NUMBER OF KEYS KEPT
+    timeout - SECONDS A VALUE IS GOOD FOR (None FOR FOREVER)
+    """
+
+    def __init__(self, max_size=1000, timeout=None, name=""):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.locker = Lock("lru cache " + name)
+        self.data = OrderedDict()  # MAP FROM key TO (expires, value), OLDEST FIRST
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time()
+        with self.locker:
+            pair = self.data.pop(key, None)
+            if pair is None:
+                self.misses += 1
+                return default
+            expires, value = pair
+            if expires is not None and expires < now:
+                self.misses += 1
+                self.evictions += 1
+                return default
+            self.data[key] = pair  # MOVE TO THE MOST RECENTLY USED END
+            self.hits += 1
+            return value
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __setitem__(self, key, value):
+        if self.timeout is None:
+            expires = None
+        else:
+            expires = time() + self.timeout
+
+        with self.locker:
+            self.data.pop(key, None)
+            self.data[key] = (expires, value)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        now = time()
+        with self.locker:
+            pair = self.data.get(key)
+            return pair is not None and (pair[0] is None or now <= pair[0])
+
+    def __len__(self):
+        return len(self.data)
+
+    def discard(self, key):
+        with self.locker:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.locker:
+            self.data.clear()
+
+    @property
+    def stats(self):
+        with self.locker:
+            return Data(
+                name=self.name,
+                size=len(self.data),
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions
+            )
@@ -60,6 +60,18 @@ class Matrix(object):
         output.cube = array
         return output
 
+    @staticmethod
+    def from_flat(dims, values):
+        """
+        :param dims: THE SHAPE OF THE MATRIX
+        :param values: LIST OF ALL CELLS, IN ROW-MAJOR ORDER
+        """
+        output = Matrix(dims=[])
+        output.num = len(dims)
+        output.dims = tuple(dims)
+        output.cube = _reshape(values, output.dims)
+        return output
+
     def __getitem__(self, index):
         if not isinstance(index, (list, tuple)):
             if isinstance(index, slice):
@@ -302,6 +314,13 @@ def _zeros(dims, zero):
         return [_zeros(dims[1::], zero) for _ in range(d0)]
 
 
+def _reshape(values, dims):
+    if len(dims) == 1:
+        return values
+    step = _product(dims[1::])
+    return [_reshape(values[i * step:(i + 1) * step:], dims[1::]) for i in range(dims[0])]
+
+
 def _groupby(cube, depth, intervals, offset, output, group, new_coord):
     if depth == len(intervals):
         output[offset][0] = group
@@ -12,15 +12,19 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import os
+from collections import deque
+
 import mo_json
-from mo_dots import Data, wrap
+from mo_dots import Data, wrap, Null
 from mo_files import File
 from mo_logs import Log
-from mo_logs.exceptions import suppress_exception
-from mo_math.randoms import Random
-from mo_threads import Lock, Signal, THREAD_STOP
+from mo_logs.exceptions import suppress_exception, Except
+from mo_threads import Lock, Signal, Thread, Till, THREAD_STOP
 
 DEBUG = True
+FORMAT = 2  # VERSION OF THE FILE LAYOUT; THE ORIGINAL DELTA LOG HAS NO format
+SEGMENT_SIZE = 10000  # ITEMS PER SEGMENT FILE
 
 
 class PersistentQueue(object):
@@ -31,58 +35,210 @@ class PersistentQueue(object):
     ONE CONSUMER.
 
     IT IS IMPORTANT YOU commit() or close(), OTHERWISE NOTHING COMES OFF THE QUEUE
+
+    ITEMS ARE APPENDED, ONE JSON PER LINE, TO SEGMENT FILES OF segment_size
+    ITEMS EACH, SO THE POSITION OF AN ITEM IS ITS INDEX.  THE MAIN FILE ONLY
+    HOLDS THE COMMITTED start.  ONE writer THREAD DOES ALL APPENDS, SO THE
+    add()s WAITING ON ONE fsync() ARE ALL WRITTEN WITH THE NEXT ONE.  THE
+    writer ALSO DELETES THE SEGMENTS THAT ARE COMPLETELY COMMITTED.
     """
 
-    def __init__(self, _file):
+    def __init__(self, _file, segment_size=SEGMENT_SIZE):
         """
         file - USES FILE FOR PERSISTENCE
+        segment_size - NUMBER OF ITEMS PER SEGMENT FILE
         """
         self.file = File.new_instance(_file)
         self.lock = Lock("lock for persistent queue using file " + self.file.name)
         self.please_stop = Signal()
-        self.db = Data()
-        self.pending = []
+        self.segment_size = segment_size
+        self.status = Data(start=0, end=0)  # start IS COMMITTED, end IS WRITTEN
+        self.start = 0  # NEXT ITEM TO pop()
+        self.pending = deque()  # ITEMS NOT POPPED (start TO status.end)
+        self.popped = []  # ITEMS POPPED, BUT NOT COMMITTED (status.start TO start)
+
+        self.to_write = []  # (value, json) PAIRS WAITING FOR THE writer
+        self.batch = Data(done=Signal("batch written"))  # THE to_write WILL BE DONE WITH THIS batch
+        self.has_work = Signal("persistent queue has work")
+        self.writer_stopped = False  # NO MORE WRITES ARE ACCEPTED
+        self.out = None  # OPEN SEGMENT FILE
+        self.out_segment = None  # NUMBER OF THE OPEN SEGMENT FILE
+        self.first_segment = 0  # OLDEST SEGMENT FILE THAT MAY EXIST
 
         if self.file.exists:
-            for line in self.file:
-                with suppress_exception:
-                    delta = mo_json.json2value(line)
-                    apply_delta(self.db, delta)
-            if self.db.status.start == None:  # HAPPENS WHEN ONLY ADDED TO QUEUE, THEN CRASH
-                self.db.status.start = 0
-            self.start = self.db.status.start
-
-            # SCRUB LOST VALUES
-            lost = 0
-            for k in self.db.keys():
-                with suppress_exception:
-                    if k!="status" and int(k) < self.start:
-                        self.db[k] = None
-                        lost += 1
-                  # HAPPENS FOR self.db.status, BUT MAYBE OTHER PROPERTIES TOO
-            if lost:
-                Log.warning("queue file had {{num}} items lost",  num= lost)
+            content = self.file.read()
+            try:
+                status = mo_json.json2value(content.split("\n")[0])
+            except Exception:
+                # AN EMPTY FILE, OR A DELTA LOG THAT WAS DAMAGED WHILE WRITING ITS FIRST LINE
+                status = Null
+            if status.format == FORMAT:
+                self._load(status)
+            else:
+                self._load_delta_log()
 
             if DEBUG:
                 Log.note("Persistent queue {{name}} found with {{num}} items", name=self.file.abspath, num=len(self))
         else:
-            self.db.status = Data(
-                start=0,
-                end=0
-            )
-            self.start = self.db.status.start
+            self._write_status()
             if DEBUG:
                 Log.note("New persistent queue {{name}}", name=self.file.abspath)
 
-    def _add_pending(self, delta):
-        delta = wrap(delta)
-        self.pending.append(delta)
+        self.writer = Thread.run("persistent queue writer for " + self.file.name, self._writer)
 
-    def _apply_pending(self):
-        for delta in self.pending:
-            apply_delta(self.db, delta)
-        self.pending = []
+    def _segment(self, number):
+        return File(self.file.abspath + "." + unicode(number))
+
+    def _load(self, status):
+        """
+        READ ONLY THE SEGMENTS HOLDING THE UNCOMMITTED ITEMS
+        """
+        self.status.start = self.status.end = self.start = status.start
+        self.segment_size = status.segment_size
+        segment, offset = divmod(self.status.start, self.segment_size)
+        self.first_segment = segment
+        while self._segment(self.first_segment - 1).exists:
+            self.first_segment -= 1  # NOT DELETED BEFORE SHUTDOWN
+
+        while True:
+            file = self._segment(segment)
+            if not file.exists:
+                break
+            content = file.read_bytes()
+            lines = content.split(b"\n")
+            good = 0  # BYTES OF COMPLETE, PARSABLE LINES
+            num = 0
+            for line in lines[:-1]:
+                try:
+                    value = mo_json.json2value(line.decode("utf8"))
+                except Exception as e:
+                    Log.warning("queue file {{file}} is damaged after line {{num}}", file=file.abspath, num=num, cause=e)
+                    break
+                if num >= offset:
+                    self.pending.append(value)
+                num += 1
+                good += len(line) + 1
+            if good < len(content):
+                # INCOMPLETE WRITE BEFORE SHUTDOWN, REMOVE IT
+                Log.warning("queue file {{file}} had {{num}} bytes lost", file=file.abspath, num=len(content) - good)
+                file.write_bytes(content[:good])
+            self.status.end = segment * self.segment_size + num
+            if num < self.segment_size:
+                break
+            segment += 1
+            offset = 0
+
+    def _load_delta_log(self):
+        """
+        CONVERT THE ORIGINAL (ONE DELTA PER LINE) FILE TO SEGMENTS
+        """
+        db = Data()
+        for line in self.file:
+            with suppress_exception:
+                delta = mo_json.json2value(line)
+                apply_delta(db, delta)
+        start = db.status.start
+        if start == None:  # HAPPENS WHEN ONLY ADDED TO QUEUE, THEN CRASH
+            start = 0
+        end = db.status.end
+        if end == None:  # HAPPENS WHEN THE FILE IS EMPTY
+            end = start
+        values = [db[unicode(i)] for i in range(start, end)]
+        self._write([(v, mo_json.value2json(v)) for v in values])
+        self._write_status()
+        if DEBUG:
+            Log.note("Persistent queue {{name}} converted to segments", name=self.file.abspath)
 
+    def _write_status(self):
+        """
+        REPLACE THE MAIN FILE, ALL AT ONCE
+        """
+        temp = self.file.abspath + ".tmp"
+        with open(temp, b"wb") as f:
+            f.write(mo_json.value2json({
+                "format": FORMAT,
+                "start": self.status.start,
+                "segment_size": self.segment_size
+            }).encode("utf8"))
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.rename(temp, self.file.abspath)
+        except OSError:
+            # WINDOWS WILL NOT RENAME OVER AN EXISTING FILE
+            self.file.delete()
+            os.rename(temp, self.file.abspath)
+
+    def _write(self, batch):
+        """
+        APPEND (value, json) PAIRS AT status.end, fsync, THEN MAKE THEM AVAILABLE
+        ON FAILURE, THE ITEMS BEFORE THE FAILED SEGMENT ARE STILL ADDED
+        """
+        while batch:
+            segment, offset = divmod(self.status.end, self.segment_size)
+            if self.out_segment != segment:
+                if self.out:
+                    self.out.close()
+                self.out = open(self._segment(segment).abspath, b"ab")
+                self.out_segment = segment
+            num = min(len(batch), self.segment_size - offset)
+            position = self.out.tell()
+            try:
+                self.out.write(b"".join(j.encode("utf8") + b"\n" for _, j in batch[:num]))
+                self.out.flush()
+                os.fsync(self.out.fileno())
+            except Exception as e:
+                # REMOVE THE PARTIAL WRITE, SO LINE NUMBERS REMAIN INDEXES
+                with suppress_exception:
+                    self.out.truncate(position)
+                raise e
+            with self.lock:
+                self.pending.extend(v for v, _ in batch[:num])
+                self.status.end += num
+            batch = batch[num:]
+
+    def _writer(self, please_stop):
+        try:
+            while True:
+                (self.has_work | please_stop).wait()
+                with self.lock:
+                    self.has_work = Signal("persistent queue has work")
+                    to_write, self.to_write = self.to_write, []
+                    batch, self.batch = self.batch, Data(done=Signal("batch written"))
+                    last_segment = self.status.start // self.segment_size
+
+                if to_write:
+                    try:
+                        self._write(to_write)
+                    except Exception as e:
+                        batch.error = e
+                batch.done.go()
+
+                # COMPACT: DELETE THE SEGMENTS THAT ARE COMPLETELY COMMITTED
+                while self.first_segment < last_segment:
+                    try:
+                        self._segment(self.first_segment).delete()
+                    except Exception as e:
+                        Log.warning("Can not delete queue segment", cause=e)
+                        break
+                    self.first_segment += 1
+
+                if please_stop:
+                    with self.lock:
+                        if not self.to_write:
+                            self.writer_stopped = True
+                            break
+        finally:
+            with self.lock:
+                self.writer_stopped = True
+                if self.to_write:
+                    # NOBODY WILL WRITE THESE, SO DO NOT LET THE extend() WAIT FOREVER
+                    self.batch.error = Except(template="Queue writer stopped before {{num}} items were written", num=len(self.to_write))
+                    self.to_write = []
+                    self.batch.done.go()
+            if self.out:
+                self.out.close()
+                self.out = None
 
     def __iter__(self):
         """
@@ -99,48 +255,60 @@ class PersistentQueue(object):
             Log.note("queue iterator is done")
 
     def add(self, value):
-        with self.lock:
-            if self.closed:
-                Log.error("Queue is closed")
+        return self.extend([value])
 
+    def extend(self, values):
+        """
+        RETURN ONCE ALL values ARE ON DISK
+        """
+        todo = []
+        for value in values:
             if value is THREAD_STOP:
                 if DEBUG:
                     Log.note("Stop is seen in persistent queue")
                 self.please_stop.go()
-                return
+                break
+            todo.append((wrap(value), mo_json.value2json(value)))
 
-            self._add_pending({"add": {str(self.db.status.end): value}})
-            self.db.status.end += 1
-            self._add_pending({"add": {"status.end": self.db.status.end}})
-            self._commit()
+        with self.lock:
+            if self.closed:
+                Log.error("Queue is closed")
+            if not todo:
+                return self
+            if self.writer_stopped:
+                Log.error("Queue is closing, can not add {{num}} items", num=len(todo))
+            self.to_write.extend(todo)
+            batch = self.batch
+            self.has_work.go()
+
+        batch.done.wait()
+        if batch.error:
+            Log.error("Could not add {{num}} items to queue", num=len(todo), cause=batch.error)
         return self
 
     def __len__(self):
         with self.lock:
-            return self.db.status.end - self.start
+            return self.status.end - self.start
 
     def __getitem__(self, item):
-        return self.db[str(item + self.start)]
+        return self.pending[item]
 
     def pop(self, timeout=None):
         """
-        :param timeout: OPTIONAL DURATION
+        :param timeout: OPTIONAL SECONDS TO WAIT
         :return: None, IF timeout PASSES
         """
+        till = None if timeout is None else Till(seconds=timeout)
         with self.lock:
             while not self.please_stop:
-                if self.db.status.end > self.start:
-                    value = self.db[str(self.start)]
+                if self.pending:
+                    value = self.pending.popleft()
+                    self.popped.append(value)
                     self.start += 1
                     return value
 
-                if timeout is not None:
-                    with suppress_exception:
-                        self.lock.wait(timeout=timeout)
-                        if self.db.status.end <= self.start:
-                            return None
-                else:
-                    self.lock.wait()
+                if not self.lock.wait(till=self.please_stop | till) and till:
+                    return None
 
             if DEBUG:
                 Log.note("persistent queue already stopped")
@@ -153,82 +321,59 @@ class PersistentQueue(object):
         with self.lock:
             if self.please_stop:
                 return [THREAD_STOP]
-            if self.db.status.end == self.start:
-                return []
-
-            output = []
-            for i in range(self.start, self.db.status.end):
-                output.append(self.db[str(i)])
 
-            self.start = self.db.status.end
+            output = list(self.pending)
+            self.pending.clear()
+            self.popped.extend(output)
+            self.start += len(output)
             return output
 
     def rollback(self):
         with self.lock:
             if self.closed:
                 return
-            self.start = self.db.status.start
-            self.pending = []
+            self.pending.extendleft(reversed(self.popped))
+            self.popped = []
+            self.start = self.status.start
 
     def commit(self):
         with self.lock:
             if self.closed:
                 Log.error("Queue is closed, commit not allowed")
-
-            try:
-                self._add_pending({"add": {"status.start": self.start}})
-                for i in range(self.db.status.start, self.start):
-                    self._add_pending({"remove": str(i)})
-
-                if self.db.status.end - self.start < 10 or Random.range(0, 1000) == 0:  # FORCE RE-WRITE TO LIMIT FILE SIZE
-                    # SIMPLY RE-WRITE FILE
-                    if DEBUG:
-                        Log.note("Re-write {{num_keys}} keys to persistent queue", num_keys=self.db.status.end - self.start)
-
-                        for k in self.db.keys():
-                            if k == "status" or int(k) >= self.db.status.start:
-                                continue
-                            Log.error("Not expecting {{key}}", key=k)
-                    self._commit()
-                    self.file.write(mo_json.value2json({"add": self.db}) + "\n")
-                else:
-                    self._commit()
-            except Exception as e:
-                raise e
+            self._commit()
+            self.has_work.go()
 
     def _commit(self):
-        self.file.append("\n".join(mo_json.value2json(p) for p in self.pending))
-        self._apply_pending()
+        if self.status.start == self.start:
+            return
+        self.status.start = self.start
+        self.popped = []
+        self._write_status()
 
     def close(self):
         self.please_stop.go()
         with self.lock:
-            if self.db is None:
+            if self.closed:
                 return
+        self.writer.please_stop.go()
+        self.writer.join()
 
-            self.add(THREAD_STOP)
-
-            if self.db.status.end == self.start:
+        with self.lock:
+            if self.status.end == self.start:
                 if DEBUG:
                     Log.note("persistent queue clear and closed")
+                for i in range(self.first_segment, self.status.end // self.segment_size + 1):
+                    self._segment(i).delete()
                 self.file.delete()
             else:
                 if DEBUG:
-                    Log.note("persistent queue closed with {{num}} items left", num=len(self))
-                try:
-                    self._add_pending({"add": {"status.start": self.start}})
-                    for i in range(self.db.status.start, self.start):
-                        self._add_pending({"remove": str(i)})
-                    self.file.write(mo_json.value2json({"add": self.db}) + "\n" + ("\n".join(mo_json.value2json(p) for p in self.pending)) + "\n")
-                    self._apply_pending()
-                except Exception as e:
-                    raise e
-            self.db = None
+                    Log.note("persistent queue closed with {{num}} items left", num=self.status.end - self.start)
+                self._commit()
+            self.pending = None
 
     @property
     def closed(self):
-        with self.lock:
-            return self.db is None
+        return self.pending is None
 
 
 def apply_delta(value, delta):
@@ -0,0 +1,103 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from bisect import bisect_left, insort
+
+from mo_logs import Log
+
+DEFAULT_BLOCK_SIZE = 1000
+
+
+class SortedList(object):
+    """
+    A LIST THAT IS ALWAYS SORTED, WITH DUPLICATES
+
+    VALUES ARE KEPT IN SHORT SORTED BLOCKS, SO add() AND remove() ARE A
+    BISECT PLUS A SHORT SHIFT, AND [index] ONLY WALKS THE BLOCK LENGTHS
+    """
+
+    def __init__(self, values=None, block_size=DEFAULT_BLOCK_SIZE):
+        self.block_size = block_size
+        self.blocks = []  # LIST OF SORTED LISTS
+        self.maxes = []  # maxes[i] IS THE LAST VALUE IN blocks[i]
+        self.length = 0
+        if values:
+            values = sorted(values)
+            self.blocks = [values[i:i + block_size] for i in range(0, len(values), block_size)]
+            self.maxes = [b[-1] for b in self.blocks]
+            self.length = len(values)
+
+    def add(self, value):
+        if not self.blocks:
+            self.blocks.append([value])
+            self.maxes.append(value)
+            self.length = 1
+            return
+
+        i = bisect_left(self.maxes, value)
+        if i == len(self.blocks):
+            # BIGGER THAN EVERYTHING
+            i -= 1
+            block = self.blocks[i]
+            block.append(value)
+            self.maxes[i] = value
+        else:
+            block = self.blocks[i]
+            insort(block, value)
+        self.length += 1
+
+        if len(block) > 2 * self.block_size:
+            half = len(block) // 2
+            self.blocks[i:i + 1] = [block[:half], block[half:]]
+            self.maxes[i:i + 1] = [block[half - 1], block[-1]]
+
+    def remove(self, value):
+        i = bisect_left(self.maxes, value)
+        if i < len(self.blocks):
+            block = self.blocks[i]
+            j = bisect_left(block, value)
+            if j < len(block) and block[j] == value:
+                del block[j]
+                self.length -= 1
+                if block:
+                    self.maxes[i] = block[-1]
+                else:
+                    del self.blocks[i]
+                    del self.maxes[i]
+                return
+        Log.error("{{value}} is not in list", value=value)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if index < 0 or self.length <= index:
+            raise IndexError("list index out of range")
+        for block in self.blocks:
+            if index < len(block):
+                return block[index]
+            index -= len(block)
+
+    def __iter__(self):
+        for block in self.blocks:
+            for v in block:
+                yield v
+
+    def __len__(self):
+        return self.length
+
+    def __nonzero__(self):
+        return self.length > 0
+
+    def __bool__(self):
+        return self.length > 0
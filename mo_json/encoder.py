@@ -19,6 +19,7 @@ from collections import Mapping
 from datetime import datetime, date, timedelta
 from decimal import Decimal
 from math import floor
+from json.encoder import encode_basestring_ascii
 from repr import Repr
 
 from mo_logs import Except
@@ -27,7 +28,7 @@ from mo_times.dates import Date
 from mo_times.durations import Duration
 from mo_dots import Data, FlatList, NullType, Null
 
-from mo_json import quote, ESCAPE_DCT, scrub, float2json
+from mo_json import quote, ESCAPE_DCT, scrub, float2json, datetime2unix
 
 json_decoder = json.JSONDecoder().decode
 _get = object.__getattribute__
@@ -137,6 +138,135 @@ class cPythonJSONEncoder(object):
             raise e
 
 
+class cPythonUTF8Encoder(object):
+    """
+    ONE PASS, NO scrub() COPY: THE VALUE IS WALKED ONCE, FOLLOWING THE scrub()
+    RULES (unicode IS STRIPPED, EMPTY STRINGS AND NaN ARE null, null PROPERTIES
+    ARE DROPPED) AS THE JSON IS WRITTEN.  STRINGS ARE ESCAPED TO ASCII, SO THE
+    RESULT IS ALREADY UTF-8 BYTES.  THE DECODED RESULT IS THE SAME AS value2json()
+    """
+
+    def __init__(self, sort_keys=False):
+        object.__init__(self)
+        self.sort_keys = sort_keys
+
+    def encode(self, value):
+        """
+        :return: UTF-8 ENCODED JSON (str)
+        """
+        acc = []
+        _scrub2json(value, acc.append, set(), self.sort_keys)
+        return b"".join(acc)
+
+
+NoneType = type(None)
+_NULL_TYPES = (NoneType, NullType)
+_NEVER_NULL = {str, bool, int, long, date, datetime, timedelta, Date, Duration, Decimal, Data, dict, list, tuple, FlatList}
+
+
+def _scrub2json(value, append, is_done, sort_keys):
+    """
+    APPEND THE JSON OF scrub(value), WITHOUT MAKING scrub(value)
+    """
+    type_ = value.__class__
+    if type_ is unicode:
+        value = value.strip()
+        append(encode_basestring_ascii(value) if value else b"null")
+    elif type_ in _NULL_TYPES:
+        append(b"null")
+    elif type_ is bool:
+        append(b"true" if value else b"false")
+    elif type_ in (int, long):
+        append(str(value))
+    elif type_ is float:
+        _float2json(value, append)
+    elif type_ is str:
+        append(encode_basestring_ascii(utf82unicode(value)))
+    elif type_ is Data:
+        _scrub2json(_get(value, "_dict"), append, is_done, sort_keys)
+    elif type_ in (list, tuple, FlatList):
+        if not value:
+            append(b"[]")
+            return
+        sep = b"["
+        for v in value:
+            append(sep)
+            sep = b", "
+            _scrub2json(v, append, is_done, sort_keys)
+        append(b"]")
+    elif type_ is Date:
+        _float2json(float(value.unix), append)
+    elif type_ is Duration:
+        _float2json(float(value.seconds), append)
+    elif type_ is Decimal:
+        _float2json(float(value), append)
+    elif type_ in (date, datetime):
+        _float2json(float(datetime2unix(value)), append)
+    elif type_ is timedelta:
+        _float2json(value.total_seconds(), append)
+    elif isinstance(value, Mapping):
+        _dict2json_scrubbed(value, append, is_done, sort_keys)
+    else:
+        # RARE TYPES (EXCEPTIONS, __data__, ITERATORS, ...) ARE scrub()ED FIRST
+        _scrub2json(scrub(value), append, is_done, sort_keys)
+
+
+def _dict2json_scrubbed(value, append, is_done, sort_keys):
+    _id = id(value)
+    if _id in is_done:
+        from mo_logs import Log
+
+        Log.warning("possible loop in structure detected")
+        append(encode_basestring_ascii('"<LOOP IN STRUCTURE>"'))
+        return
+    is_done.add(_id)
+
+    items = value.iteritems()
+    if sort_keys:
+        items = sorted(items)
+    sep = b"{"
+    for k, v in items:
+        if isinstance(k, basestring):
+            pass
+        elif hasattr(k, "__unicode__"):
+            k = unicode(k)
+        else:
+            from mo_logs import Log
+
+            Log.error("keys must be strings")
+
+        type_ = v.__class__
+        if type_ is unicode:
+            v = v.strip()
+            if not v:
+                continue
+        elif type_ in _NULL_TYPES:
+            continue
+        elif type_ is float:
+            if math.isnan(v) or math.isinf(v):
+                continue
+        elif type_ not in _NEVER_NULL and not isinstance(v, Mapping):
+            v = scrub(v)
+            if v is None:
+                continue
+
+        append(sep)
+        sep = b", "
+        append(encode_basestring_ascii(utf82unicode(k) if k.__class__ is str else k))
+        append(b": ")
+        _scrub2json(v, append, is_done, sort_keys)
+
+    append(b"{}" if sep == b"{" else b"}")
+    is_done.discard(_id)
+
+
+def _float2json(value, append):
+    if math.isnan(value) or math.isinf(value):
+        append(b"null")
+    else:
+        append(repr(value))
+
+
 def _value2json(value, _buffer):
     try:
         _class = value.__class__
@@ -508,7 +638,11 @@ def _repr(obj):
 # http://morepypy.blogspot.ca/2011/10/speeding-up-json-encoding-in-pypy.html
 if use_pypy:
     json_encoder = pypy_json_encode
+
+    def utf8_json_encoder(value):
+        return pypy_json_encode(value).encode("utf8")
 else:
     json_encoder = cPythonJSONEncoder().encode
+    utf8_json_encoder = cPythonUTF8Encoder().encode
 
 
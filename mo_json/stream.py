@@ -25,6 +25,7 @@ CLOSE = {
     b"[": "]"
 }
 NO_VARS = set()
+EMPTY_ARRAY = object()  # MARKER FOR A NESTED ARRAY WITH NO MEMBERS
 
 json_decoder = json.JSONDecoder().decode
 
@@ -72,7 +73,9 @@ def parse(json, path, expected_vars=NO_VARS):
             else:
                 c, index = skip_whitespace(index)
                 if c == b']':
-                    return  # EMPTY ARRAY
+                    # EMPTY ARRAY, YIELD ONLY THE INDEX SO THE CALLER CAN CONTINUE PAST IT
+                    yield EMPTY_ARRAY, index
+                    return
 
                 while True:
                     value, index = _decode_token(index, c, parent_path, path, name2index, None, expected_vars)
@@ -163,9 +166,12 @@ def parse(json, path, expected_vars=NO_VARS):
                     else:
                         new_path = path
 
-                    nested_done = True
                     for j, i in _decode(index - 1, full_path, new_path, name2index, expected_vars=child_expected):
                         index = i
+                        if j is EMPTY_ARRAY:
+                            # NO MEMBERS, SO THIS OBJECT IS YIELDED AS IF THE NESTED PROPERTY WAS MISSING
+                            continue
+                        nested_done = True
                         j = {name: j}
                         for k, v in destination.items():
                             j.setdefault(k, v)
@@ -274,7 +280,8 @@ def parse(json, path, expected_vars=NO_VARS):
         return c, index + 1
 
     for j, i in _decode(0, [], map(split_field, listwrap(path)), {}, expected_vars=expected_vars):
-        yield j
+        if j is not EMPTY_ARRAY:
+            yield j
 
 
 
@@ -21,6 +21,7 @@ from mo_threads.till import Till
 from mo_threads.threads import Thread, THREAD_STOP, THREAD_TIMEOUT
 from mo_threads.queues import Queue
 from mo_threads.queues import ThreadedQueue
+from mo_threads.pool import ThreadPool
 from mo_threads.multiprocess import Process
 
 
@@ -0,0 +1,221 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+# THIS THREADING MODULE IS PERMEATED BY THE please_stop SIGNAL.
+# THIS SIGNAL IS IMPORTANT FOR PROPER SIGNALLING WHICH ALLOWS
+# FOR FAST AND PREDICTABLE SHUTDOWN AND CLEANUP OF THREADS
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from time import time
+
+from mo_dots import Data
+from mo_logs import Log, Except
+from mo_threads.lock import Lock
+from mo_threads.queues import Queue
+from mo_threads.signal import Signal
+from mo_threads.threads import Thread, THREAD_STOP, THREAD_TIMEOUT
+
+DEBUG = False
+DEFAULT_WORKERS = 4
+
+
+class Future(object):
+    """
+    THE EVENTUAL RESULT OF A TASK GIVEN TO ThreadPool.submit()
+
+    done - Signal FOR WHEN THE TASK IS FINISHED (WELL OR NOT)
+    please_stop - Signal GIVEN TO THE TASK; go() TO CANCEL
+    """
+
+    __slots__ = ["name", "target", "args", "kwargs", "done", "please_stop", "response", "exception", "submitted"]
+
+    def __init__(self, name, target, args, kwargs, please_stop):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+        self.done = Signal("done signal for " + name)
+        self.please_stop = please_stop
+        self.response = None
+        self.exception = None
+        self.submitted = time()
+
+    def cancel(self):
+        """
+        A TASK THAT HAS NOT STARTED WILL NOT START, A RUNNING TASK IS SENT please_stop
+        """
+        self.please_stop.go()
+
+    def wait(self, till=None):
+        """
+        RETURN THE TASK RESPONSE, OR RAISE ITS EXCEPTION
+        :param till: Signal TO STOP WAITING (RAISES THREAD_TIMEOUT)
+        """
+        (self.done | till).wait()
+        if not self.done:
+            Log.error(THREAD_TIMEOUT)
+        if self.exception:
+            Log.error("Task {{name|quote}} did not end well", name=self.name, cause=self.exception)
+        return self.response
+
+    def _run(self):
+        if self.please_stop:
+            self.exception = Except(template="Task {{name|quote}} was cancelled before it started", params={"name": self.name})
+            self.done.go()
+            return
+        try:
+            self.response = self.target(*self.args, please_stop=self.please_stop, **self.kwargs)
+        except Exception as e:
+            self.exception = Except.wrap(e)
+        finally:
+            self.target = self.args = self.kwargs = None
+            self.done.go()
+
+
+class ThreadPool(object):
+    """
+    RUN TASKS ON A FIXED NUMBER OF WORKER THREADS, SO THE COST OF
+    PARALLELISM IS BOUNDED, AND NO THREAD IS MADE PER TASK
+
+    USAGE:
+        pool = ThreadPool("es requests", num_workers=4)
+        future = pool.submit("page 0", post, es, query)
+        result = future.wait()
+        pool.stop()
+
+    THE WORKERS ARE CHILDREN OF THE THREAD THAT MAKES THE POOL
+    """
+
+    def __init__(self, name, num_workers=DEFAULT_WORKERS, max_queue=None, please_stop=None):
+        """
+        :param name: FOR THE WORKER THREAD NAMES
+        :param num_workers: NUMBER OF THREADS
+        :param max_queue: MOST TASKS WAITING FOR A WORKER, submit() BLOCKS WHEN FULL
+        :param please_stop: OPTIONAL Signal TO STOP THE POOL
+        """
+        self.name = name
+        self.please_stop = Signal("stop signal for pool " + name) if please_stop is None else please_stop
+        self.queue = Queue("task queue for pool " + name, max=max_queue, silent=True)
+        self.locker = Lock("stats lock for pool " + name)
+        self.num_submitted = 0
+        self.num_done = 0
+        self.num_failed = 0
+        self.num_running = 0
+        self.wait_time = 0  # TOTAL SECONDS TASKS WAITED FOR A WORKER
+        self.max_wait_time = 0
+        self.run_time = 0  # TOTAL SECONDS TASKS RAN
+        self.please_stop.on_go(self.queue.close)
+        self.workers = [
+            Thread.run(name + " worker " + unicode(i), self._worker)
+            for i in range(num_workers)
+        ]
+
+    def submit(self, name, target, *args, **kwargs):
+        """
+        :param name: NAME OF THE TASK
+        :param target: FUNCTION TO RUN, MUST ACCEPT please_stop, LIKE Thread.run()
+        :return: Future
+        """
+        if "please_stop" not in target.__code__.co_varnames:
+            Log.error("function must have please_stop argument for signalling emergency shutdown")
+        if self.please_stop:
+            Log.error("Pool {{name|quote}} is stopped", name=self.name)
+
+        please_stop = kwargs.pop("please_stop", None)
+        please_stop = Signal("please_stop for " + name) | please_stop
+        self.please_stop.on_go(please_stop.go)
+        future = Future(name, target, args, kwargs, please_stop)
+        future.done.on_go(lambda: self.please_stop.remove_go(please_stop.go))
+
+        with self.locker:
+            self.num_submitted += 1
+        self.queue.add(future)
+        return future
+
+    def _worker(self, please_stop):
+        please_stop.on_go(self.please_stop.go)
+        while True:
+            future = self.queue.pop()
+            if future is THREAD_STOP:
+                break
+            if future is None:
+                continue
+
+            start = time()
+            waited = start - future.submitted
+            with self.locker:
+                self.num_running += 1
+                self.wait_time += waited
+                self.max_wait_time = max(self.max_wait_time, waited)
+
+            if self.please_stop:
+                # POOL IS STOPPING, THE TASK MAY NOT HAVE HEARD YET
+                future.cancel()
+            future._run()
+
+            with self.locker:
+                self.num_running -= 1
+                self.num_done += 1
+                if future.exception:
+                    self.num_failed += 1
+                self.run_time += time() - start
+            if DEBUG:
+                Log.note("{{pool}} ran {{task|quote}}", pool=self.name, task=future.name)
+
+        # TASKS STILL QUEUED WILL NEVER RUN
+        for future in self.queue.pop_all():
+            if future is not THREAD_STOP:
+                future.cancel()
+                future._run()
+
+    @property
+    def stats(self):
+        """
+        :return: QUEUE DEPTH AND LATENCY OF THE POOL
+        """
+        with self.locker:
+            num_done = self.num_done
+            return Data(
+                workers=len(self.workers),
+                queued=len(self.queue),
+                running=self.num_running,
+                submitted=self.num_submitted,
+                done=num_done,
+                failed=self.num_failed,
+                wait=Data(
+                    average=self.wait_time / num_done if num_done else None,
+                    max=self.max_wait_time
+                ),
+                run=Data(average=self.run_time / num_done if num_done else None)
+            )
+
+    def stop(self):
+        """
+        CANCEL THE QUEUED TASKS, AND SEND please_stop TO THE RUNNING ONES
+        """
+        self.please_stop.go()
+
+    def join(self, till=None):
+        """
+        WAIT FOR THE QUEUED TASKS TO FINISH, THEN STOP THE WORKERS
+        """
+        self.queue.close()
+        for w in self.workers:
+            w.join(till=till)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if isinstance(exc_val, BaseException):
+            self.stop()
+        self.join()
@@ -18,6 +18,7 @@ from __future__ import unicode_literals
 
 import types
 from collections import deque
+from heapq import heappush, heappop
 from datetime import datetime
 from time import time
 
@@ -58,11 +59,12 @@ class Queue(object):
      IS DIFFICULT TO USE JUST BETWEEN THREADS (SERIALIZATION REQUIRED)
     """
 
-    def __init__(self, name, max=None, silent=False, unique=False, allow_add_after_close=False):
+    def __init__(self, name, max=None, silent=False, unique=False, priority=False, allow_add_after_close=False):
         """
         max - LIMIT THE NUMBER IN THE QUEUE, IF TOO MANY add() AND extend() WILL BLOCK
         silent - COMPLAIN IF THE READERS ARE TOO SLOW
-        unique - SET True IF YOU WANT ONLY ONE INSTANCE IN THE QUEUE AT A TIME
+        unique - SET True IF YOU WANT ONLY ONE INSTANCE IN THE QUEUE AT A TIME (VALUES MUST BE HASHABLE)
+        priority - SET True TO pop() THE LOWEST priority GIVEN TO add() FIRST
         """
         if not _Log:
             _late_import()
@@ -72,9 +74,11 @@ class Queue(object):
         self.silent = silent
         self.allow_add_after_close=allow_add_after_close
         self.unique = unique
+        self.members = set()  # WHAT IS IN THE QUEUE, WHEN unique
+        self.priority = priority
         self.please_stop = Signal("stop signal for " + name)
         self.lock = Lock("lock for queue " + name)
-        self.queue = deque()
+        self.queue = _PriorityDeque(unique) if priority else deque()
         self.next_warning = time()  # FOR DEBUGGING
 
     def __iter__(self):
@@ -91,7 +95,11 @@ class Queue(object):
         if not self.silent:
             _Log.note("queue iterator is done")
 
-    def add(self, value, timeout=None):
+    def add(self, value, timeout=None, priority=0):
+        """
+        :param priority: ONLY FOR priority QUEUES; LOWER IS POPPED SOONER. ADDING A
+                         value ALREADY IN A unique QUEUE WILL MOVE IT UP TO priority
+        """
         with self.lock:
             if value is THREAD_STOP:
                 # INSIDE THE lock SO THAT EXITING WILL RELEASE wait()
@@ -103,13 +111,25 @@ class Queue(object):
             if self.please_stop and not self.allow_add_after_close:
                 _Log.error("Do not add to closed queue")
             else:
-                if self.unique:
-                    if value not in self.queue:
-                        self.queue.append(value)
-                else:
-                    self.queue.append(value)
+                self._add(value, priority)
         return self
 
+    def _add(self, value, priority):
+        """
+        EXPECT THE self.lock TO BE HAD
+        """
+        if self.unique:
+            if value in self.members:
+                if self.priority:
+                    self.queue.promote(value, priority)
+                return
+            self.members.add(value)
+
+        if self.priority:
+            self.queue.append(value, priority)
+        else:
+            self.queue.append(value)
+
     def push(self, value):
         """
         SNEAK value TO FRONT OF THE QUEUE
@@ -120,6 +140,12 @@ class Queue(object):
         with self.lock:
             self._wait_for_queue_space()
             if not self.please_stop:
+                if self.unique:
+                    if value in self.members:
+                        if self.priority:
+                            self.queue.promote(value, None)
+                        return self
+                    self.members.add(value)
                 self.queue.appendleft(value)
         return self
 
@@ -133,7 +159,7 @@ class Queue(object):
             _Log.error("Expecting a signal")
         return Null, self.pop(till=till)
 
-    def extend(self, values):
+    def extend(self, values, priority=0):
         if self.please_stop and not self.allow_add_after_close:
             _Log.error("Do not push to closed queue")
 
@@ -141,19 +167,11 @@ class Queue(object):
             # ONCE THE queue IS BELOW LIMIT, ALLOW ADDING MORE
             self._wait_for_queue_space()
             if not self.please_stop:
-                if self.unique:
-                    for v in values:
-                        if v is THREAD_STOP:
-                            self.please_stop.go()
-                            continue
-                        if v not in self.queue:
-                            self.queue.append(v)
-                else:
-                    for v in values:
-                        if v is THREAD_STOP:
-                            self.please_stop.go()
-                            continue
-                        self.queue.append(v)
+                for v in values:
+                    if v is THREAD_STOP:
+                        self.please_stop.go()
+                        continue
+                    self._add(v, priority)
         return self
 
     def _wait_for_queue_space(self, timeout=DEFAULT_WAIT_TIME):
@@ -216,6 +234,8 @@ class Queue(object):
             while True:
                 if self.queue:
                     value = self.queue.popleft()
+                    if self.unique:
+                        self.members.discard(value)
                     return value
                 if self.please_stop:
                     break
@@ -227,13 +247,21 @@ class Queue(object):
             _Log.note(self.name + " queue stopped")
         return THREAD_STOP
 
-    def pop_all(self):
+    def pop_all(self, max=None):
         """
         NON-BLOCKING POP ALL IN QUEUE, IF ANY
+
+        :param max: MOST NUMBER OF ITEMS TO POP
         """
         with self.lock:
-            output = list(self.queue)
-            self.queue.clear()
+            if max is None or max >= len(self.queue):
+                output = list(self.queue)
+                self.queue.clear()
+                self.members.clear()
+            else:
+                output = [self.queue.popleft() for _ in range(max)]
+                if self.unique:
+                    self.members.difference_update(output)
 
         return output
 
@@ -248,6 +276,8 @@ class Queue(object):
                 return None
             else:
                 v =self.queue.pop()
+                if self.unique:
+                    self.members.discard(v)
                 if v is THREAD_STOP:  # SENDING A STOP INTO THE QUEUE IS ALSO AN OPTION
                     self.please_stop.go()
                 return v
@@ -266,6 +296,81 @@ class Queue(object):
         self.close()
 
 
+class _PriorityDeque(object):
+    """
+    THE PART OF THE deque INTERFACE Queue USES, BUT popleft() RETURNS THE
+    LOWEST priority FIRST, AND IN THE ORDER ADDED FOR EQUAL priority
+    """
+
+    def __init__(self, unique=False):
+        self.heap = []  # LIST OF [priority, sequence, value] ENTRIES
+        self.entries = {} if unique else None  # MAP FROM value TO ITS ENTRY, FOR promote()
+        self.sequence = 0
+        self.length = 0
+
+    def append(self, value, priority=0):
+        self._push(value, priority, self.sequence)
+        self.sequence += 1
+
+    def appendleft(self, value):
+        # AHEAD OF ALL PRIORITIES, AND AHEAD OF PREVIOUS appendleft()
+        self._push(value, float("-inf"), -self.sequence)
+        self.sequence += 1
+
+    def promote(self, value, priority):
+        """
+        MOVE value UP TO priority (None FOR THE FRONT), IF IT IS NOT ALREADY
+        THE OLD ENTRY IS LEFT IN THE heap, MARKED AS REMOVED
+        """
+        entry = self.entries[value]
+        if priority is None:
+            entry[2] = _REMOVED
+            self.length -= 1
+            self.appendleft(value)
+        elif priority < entry[0]:
+            entry[2] = _REMOVED
+            self.length -= 1
+            self._push(value, priority, entry[1])
+
+    def _push(self, value, priority, sequence):
+        entry = [priority, sequence, value]
+        heappush(self.heap, entry)
+        if self.entries is not None:
+            self.entries[value] = entry
+        self.length += 1
+
+    def popleft(self):
+        while self.heap:
+            _, _, value = heappop(self.heap)
+            if value is _REMOVED:
+                continue
+            if self.entries is not None:
+                del self.entries[value]
+            self.length -= 1
+            return value
+        raise IndexError("pop from an empty queue")
+
+    pop = popleft
+
+    def clear(self):
+        self.heap = []
+        if self.entries is not None:
+            self.entries.clear()
+        self.length = 0
+
+    def __iter__(self):
+        return (value for _, _, value in sorted(self.heap) if value is not _REMOVED)
+
+    def __len__(self):
+        return self.length
+
+    def __nonzero__(self):
+        return self.length > 0
+
+
+_REMOVED = object()  # MARKS A STALE _PriorityDeque ENTRY
+
+
 class ThreadedQueue(Queue):
     """
     DISPATCH TO ANOTHER (SLOWER) queue IN BATCHES OF GIVEN size
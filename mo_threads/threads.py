@@ -421,5 +421,6 @@ ALL_LOCK = Lock("threads ALL_LOCK")
 ALL = dict()
 ALL[thread.get_ident()] = MAIN_THREAD
 
+till.Till.enabled = True  # TIMERS MADE BEFORE THE daemon STARTS WILL WAIT FOR IT
 MAIN_THREAD.timers = Thread.run("timers", till.daemon)
 MAIN_THREAD.children.remove(MAIN_THREAD.timers)
@@ -15,24 +15,35 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+from heapq import heappush, heappop, heapify
+from itertools import count
 from thread import allocate_lock as _allocate_lock
 from time import sleep, time
+from weakref import ref
 
 from mo_threads.signal import Signal
 
 DEBUG = False
 INTERVAL = 0.1
+MIN_COMPACT = 1000  # DO NOT BOTHER REMOVING ABANDONED TIMERS FROM A HEAP SMALLER THAN THIS
 
 
 class Till(Signal):
     """
     TIMEOUT AS A SIGNAL
+
+    THE daemon ONLY HOLDS A WEAK REFERENCE; A Till NO ONE IS WAITING ON IS
+    GARBAGE, AND WILL NOT BE TRIGGERED.  on_go() KEEPS IT ALIVE, UNTIL THE
+    LAST TARGET IS REMOVED
     """
     locker = _allocate_lock()
     next_ping = time()
     done = Signal("Timers shutdown")
     enabled = False
     new_timers = []
+    sequence = count()  # TIE-BREAKER FOR TIMERS WITH THE SAME TIME
+    pinned = {}  # MAP FROM id() TO Till, FOR THE ONES WITH on_go() TARGETS
+    num_abandoned = 0  # TIMERS COLLECTED SINCE THE LAST COMPACTION, SOME MAY HAVE GONE OFF ALREADY
 
     def __new__(cls, till=None, timeout=None, seconds=None):
         if not Till.enabled:
@@ -65,7 +76,45 @@ class Till(Signal):
         with Till.locker:
             if timeout != None:
                 Till.next_ping = min(Till.next_ping, timeout)
-            Till.new_timers.append((timeout, self))
+            Till.new_timers.append((timeout, next(Till.sequence), ref(self, Till._abandoned)))
+
+    def on_go(self, target):
+        if not target:
+            from mo_logs import Log
+
+            Log.error("expecting target")
+
+        # PIN ONLY WHILE THERE IS A go() TO UNPIN IT
+        with self.lock:
+            if not self._go:
+                with Till.locker:
+                    Till.pinned[id(self)] = self
+                if not self.job_queue:
+                    self.job_queue = [target]
+                else:
+                    self.job_queue.append(target)
+                return
+        target()
+
+    def remove_go(self, target):
+        with self.lock:
+            if self._go:
+                return
+            self.job_queue.remove(target)
+            if not self.job_queue:
+                with Till.locker:
+                    Till.pinned.pop(id(self), None)
+
+    def go(self):
+        Signal.go(self)
+        if Till.pinned:
+            with Till.locker:
+                Till.pinned.pop(id(self), None)
+
+    @classmethod
+    def _abandoned(cls, _):
+        # NO GLOBALS, THIS IS ALSO CALLED DURING INTERPRETER SHUTDOWN
+        cls.num_abandoned += 1
 
 
 Till.done.go()
@@ -75,7 +124,7 @@ def daemon(please_stop):
     from mo_logs import Log
 
     Till.enabled = True
-    sorted_timers = []
+    sorted_timers = []  # HEAP OF (time, sequence, weakref)
 
     try:
         while not please_stop:
@@ -105,27 +154,33 @@ def daemon(please_stop):
             if DEBUG and new_timers:
                 Log.note("new timers: {{timers}}", timers=[t for t, s in new_timers])
 
-            sorted_timers.extend(new_timers)
+            for r in new_timers:
+                heappush(sorted_timers, r)
 
-            if sorted_timers:
-                sorted_timers.sort(key=lambda r: r[0])
-                for i, (t, s) in enumerate(sorted_timers):
-                    if now < t:
-                        work, sorted_timers = sorted_timers[:i], sorted_timers[i:]
-                        Till.next_ping = min(Till.next_ping, sorted_timers[0][0])
-                        break
-                else:
-                    work, sorted_timers = sorted_timers, []
+            if MIN_COMPACT < Till.num_abandoned and len(sorted_timers) < Till.num_abandoned * 2:
+                # MOSTLY GARBAGE, REMOVE IT
+                Till.num_abandoned = 0
+                sorted_timers = [r for r in sorted_timers if r[2]() is not None]
+                heapify(sorted_timers)
 
-                if work:
-                    if DEBUG:
-                        Log.note(
-                            "done: {{timers}}.  Remaining {{pending}}",
-                            timers=[t for t, s in work],
-                            pending=[t for t, s in sorted_timers]
-                        )
+            work = []
+            while sorted_timers and sorted_timers[0][0] <= now:
+                work.append(heappop(sorted_timers))
+            if sorted_timers:
+                with Till.locker:
+                    Till.next_ping = min(Till.next_ping, sorted_timers[0][0])
+
+            if work:
+                if DEBUG:
+                    Log.note(
+                        "done: {{timers}}.  Remaining {{pending}}",
+                        timers=[t for t, _, _ in work],
+                        pending=len(sorted_timers)
+                    )
 
-                    for t, s in work:
+                for t, _, r in work:
+                    s = r()
+                    if s is not None:
                         s.go()
 
     except Exception as e:
@@ -137,7 +192,9 @@ def daemon(please_stop):
         # TRIGGER ALL REMAINING TIMERS RIGHT NOW
         with Till.locker:
             new_work, Till.new_timers = Till.new_timers, []
-        for t, s in new_work + sorted_timers:
-            s.go()
+        for t, _, r in new_work + sorted_timers:
+            s = r()
+            if s is not None:
+                s.go()
 
 
@@ -12,8 +12,9 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import json
+import re
 
-from moz_sql_parser.sql_parser import SQLParser
+from moz_sql_parser.sql_parser import SQLParser, to_string, unquote
 
 
 def parse(sql):
@@ -21,6 +22,69 @@ def parse(sql):
     return _scrub(parse_result)
 
 
+# TOKENS THAT MAY LOOK LIKE THEY HOLD A LITERAL, STRINGS, AND NUMBERS
+_tokens = re.compile(
+    r"""(--[^\n]*|#[^\n]*|"(?:""|\\.|[^"])*"|[A-Za-z_$][\w$]*)"""
+    r"""|('(?:''|\\.|[^'])*')"""
+    r"""|(?<![\w.+-])(\d+(?:\.\d*)?|\.\d+)(?![\w.])"""
+)
+_MARKER = "__sql_literal_"
+
+
+def parameterize(sql):
+    """
+    REPLACE THE STRING AND NUMBER LITERALS WITH MARKERS, SO STATEMENTS THAT
+    DIFFER ONLY BY CONSTANTS HAVE THE SAME template, AND SHARE A parse()
+
+    LITERALS THAT ARE FALSE (0, '') ARE LEFT IN PLACE, BECAUSE THE GRAMMAR
+    TREATS THEM DIFFERENTLY.  SO ARE SIGNED, AND SCIENTIFIC, NUMBERS.
+
+    :return: (template, literals) PAIR; USE bind(parse(template), literals)
+    """
+    literals = []
+
+    def replace(match):
+        string, number = match.group(2), match.group(3)
+        try:
+            if string:
+                value = to_string(None, None, [string])
+                if not value["literal"]:
+                    return string
+            elif number:
+                value = unquote(None, None, [number])
+                if not value:
+                    return number
+            else:
+                return match.group(0)
+        except Exception:
+            # LET parse() COMPLAIN ABOUT IT
+            return match.group(0)
+        literals.append(value)
+        return "'" + _MARKER + unicode(len(literals) - 1) + "__'"
+
+    template = _tokens.sub(replace, sql)
+    return template, literals
+
+
+def bind(template, literals):
+    """
+    :param template: parse() OF THE parameterize() template
+    :param literals: THE parameterize() literals
+    :return: A NEW PARSE, AS IF parse() WAS GIVEN THE ORIGINAL SQL
+    """
+    if isinstance(template, dict):
+        if len(template) == 1:
+            marker = template.get("literal")
+            if isinstance(marker, basestring) and marker.startswith(_MARKER):
+                value = literals[int(marker[len(_MARKER):-2])]
+                return dict(value) if isinstance(value, dict) else value
+        return {k: bind(v, literals) for k, v in template.items()}
+    elif isinstance(template, list):
+        return [bind(v, literals) for v in template]
+    else:
+        return template
+
+
 def _scrub(result):
     if isinstance(result, (str, unicode, int, float)):
         return result
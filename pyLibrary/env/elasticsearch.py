@@ -12,10 +12,13 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import re
-from collections import Mapping
+from collections import Mapping, deque
 from copy import deepcopy
+from time import time
 
 import mo_json
+from mo_json import stream
+from mo_json.stream import MIN_READ_SIZE
 from mo_logs import Log, strings
 from mo_logs.exceptions import Except
 from mo_logs.strings import utf82unicode
@@ -32,6 +35,7 @@ from mo_math.randoms import Random
 from mo_kwargs import override
 from jx_python import jx
 from mo_threads import ThreadedQueue
+from mo_threads import Thread
 from mo_threads import Till
 from mo_times.dates import Date
 from mo_times.timer import Timer
@@ -40,10 +44,55 @@ ES_STRUCT = ["object", "nested"]
 ES_NUMERIC_TYPES = ["long", "integer", "double", "float"]
 ES_PRIMITIVE_TYPES = ["string", "boolean", "integer", "date", "long", "double"]
 INDEX_DATE_FORMAT = "%Y%m%d_%H%M%S"
+DEFAULT_SCROLL_SIZE = 1000
+DEFAULT_BULK_SENDERS = 4
+DEFAULT_BULK_BYTES = 5 * 1024 * 1024  # LARGEST _bulk REQUEST
+MIN_BULK_BYTES = 64 * 1024  # SMALLEST _bulk REQUEST, AFTER ES HAS REJECTED MANY
+MAX_BULK_BACKOFF = 60  # MOST SECONDS TO WAIT AFTER ES REJECTS A REQUEST
+MAX_BULK_FAILURES = 10  # NUMBER OF FAILURE REASONS A BulkQueue KEEPS
 
 
 class Features(object):
-    pass
+    """
+    METHODS COMMON TO Index AND Alias, WHICH BOTH HAVE cluster, path AND settings
+    """
+
+    def scroll(self, query, size=None, keep_alive="1m", timeout=None):
+        """
+        GENERATE ALL HITS OF query USING THE ES SCROLL API, size HITS PER
+        REQUEST, SO NEITHER ES NOR THIS PROCESS HOLDS THE WHOLE RESULT
+        :param query: ES QUERY, ITS size AND from ARE IGNORED
+        :param size: NUMBER OF HITS PER PAGE
+        :param keep_alive: HOW LONG ES KEEPS THE SCROLL CONTEXT BETWEEN PAGES
+        """
+        query = wrap(query).copy()
+        query.size = coalesce(size, DEFAULT_SCROLL_SIZE)
+        query["from"] = None
+        timeout = coalesce(timeout, self.settings.timeout)
+
+        response = self.cluster.post(
+            self.path + "/_search",
+            data=query,
+            params={"scroll": keep_alive},
+            timeout=timeout
+        )
+        scroll_id = response._scroll_id
+        try:
+            while response.hits.hits:
+                for h in response.hits.hits:
+                    yield h
+                response = self.cluster.post(
+                    "/_search/scroll",
+                    data=scroll_id.encode("utf8"),
+                    params={"scroll": keep_alive},
+                    timeout=timeout
+                )
+                scroll_id = response._scroll_id
+        finally:
+            try:
+                self.cluster.delete("/_search/scroll", data=scroll_id.encode("utf8"))
+            except Exception as e:
+                Log.warning("Could not release scroll", cause=e)
 
 
 class Index(Features):
@@ -99,7 +148,7 @@ class Index(Features):
             if type == None:
                 # NO type PROVIDED, MAYBE THERE IS A SUITABLE DEFAULT?
                 with self.cluster.metadata_locker:
-                    index_ = self.cluster._metadata.indices[self.settings.index]
+                    index_ = wrap(self.cluster._metadata).indices[self.settings.index]
                 if not index_:
                     indices = self.cluster.get_metadata().indices
                     index_ = indices[self.settings.index]
@@ -274,56 +323,46 @@ class Index(Features):
         lines = []
         try:
             for r in records:
-                id = r.get("id")
-                r_value = r.get('value')
-                if id == None and r_value:
-                    id = r_value.get('_id')
-                if id == None:
-                    id = random_id()
-
-                if "json" in r:
-                    json_bytes = r["json"].encode("utf8")
-                elif r_value or isinstance(r_value, (dict, Data)):
-                    json_bytes = convert.value2json(r_value).encode("utf8")
-                else:
-                    json_bytes = None
-                    Log.error("Expecting every record given to have \"value\" or \"json\" property")
-
-                lines.append(b'{"index":{"_id": ' + convert.value2json(id).encode("utf8") + b'}}')
-                if self.settings.tjson:
-                    lines.append(json2typed(json_bytes.decode('utf8')).encode('utf8'))
-                else:
-                    lines.append(json_bytes)
+                lines.extend(self._encode(r))
             del records
 
             if not lines:
                 return
 
+            if sum(len(l) + 1 for l in lines) > DEFAULT_BULK_BYTES:
+                # TOO BIG FOR ONE REQUEST: SEND IN PIECES, CONCURRENTLY
+                self._bulk_extend(lines)
+                return
+
             with Timer("Add {{num}} documents to {{index}}", {"num": len(lines) / 2, "index":self.settings.index}, debug=self.debug):
                 try:
                     data_bytes = b"\n".join(l for l in lines) + b"\n"
                 except Exception as e:
                     Log.error("can not make request body from\n{{lines|indent}}", lines=lines, cause=e)
 
-                response = self.cluster.post(
+                items_stream = self.cluster.post(
                     self.path + "/_bulk",
                     data=data_bytes,
                     headers={"Content-Type": "text"},
                     timeout=self.settings.timeout,
                     retry=self.settings.retry,
-                    params={"consistency": self.settings.consistency}
+                    params={"consistency": self.settings.consistency},
+                    stream="items"
                 )
-                items = response["items"]
 
+                # ONLY THE FAILED ITEMS ARE KEPT
                 fails = []
+                items = {}
                 if self.cluster.version.startswith("0.90."):
-                    for i, item in enumerate(items):
+                    for i, item in enumerate(items_stream):
                         if not item.index.ok:
                             fails.append(i)
+                            items[i] = item
                 elif any(map(self.cluster.version.startswith, ["1.4.", "1.5.", "1.6.", "1.7."])):
-                    for i, item in enumerate(items):
+                    for i, item in enumerate(items_stream):
                         if item.index.status not in [200, 201]:
                             fails.append(i)
+                            items[i] = item
                 else:
                     Log.error("version not supported {{version}}", version=self.cluster.version)
 
@@ -359,6 +398,44 @@ class Index(Features):
                 Log.error("problem with {{data}}", data=repr(lines[int(e.message[14:16].strip())]), cause=e)
             Log.error("problem sending to ES", e)
 
+    def _bulk_extend(self, lines):
+        """
+        SEND THE ENCODED lines WITH A BulkQueue, AND WAIT FOR ALL OF THEM
+        """
+        with Timer("Add {{num}} documents to {{index}} in pieces", {"num": len(lines) / 2, "index": self.settings.index}, debug=self.debug):
+            queue = BulkQueue(self, batch_bytes=DEFAULT_BULK_BYTES)
+            try:
+                queue._push([(lines[i], lines[i + 1], 0) for i in range(0, len(lines), 2)])
+            finally:
+                queue.stop()
+            if queue.failures:
+                Log.error("Problems with insert", cause=queue.failures[:3])
+
+    def _encode(self, record):
+        """
+        :return: THE TWO _bulk LINES (action, document) FOR ONE RECORD, AS BYTES
+        """
+        id = record.get("id")
+        r_value = record.get('value')
+        if id == None and r_value:
+            id = r_value.get('_id')
+        if id == None:
+            id = random_id()
+
+        if "json" in record:
+            json_bytes = record["json"].encode("utf8")
+        elif r_value or isinstance(r_value, (dict, Data)):
+            json_bytes = convert.value2json(r_value).encode("utf8")
+        else:
+            json_bytes = None
+            Log.error("Expecting every record given to have \"value\" or \"json\" property")
+
+        action = b'{"index":{"_id": ' + convert.value2json(id).encode("utf8") + b'}}'
+        if self.settings.tjson:
+            return action, json2typed(json_bytes.decode('utf8')).encode('utf8')
+        else:
+            return action, json_bytes
+
     # RECORDS MUST HAVE id AND json AS A STRING OR
     # HAVE id AND value AS AN OBJECT
     def add(self, record):
@@ -409,7 +486,11 @@ class Index(Features):
         else:
             Log.error("Do not know how to handle ES version {{version}}", version=self.cluster.version)
 
-    def search(self, query, timeout=None, retry=None):
+    def search(self, query, timeout=None, retry=None, stream=None):
+        """
+        :param stream: PATH TO AN ARRAY IN THE RESPONSE, LIKE "hits.hits", TO
+                       GET A GENERATOR OF ITS MEMBERS INSTEAD OF THE RESPONSE
+        """
         query = wrap(query)
         try:
             if self.debug:
@@ -423,7 +504,8 @@ class Index(Features):
                 self.path + "/_search",
                 data=query,
                 timeout=coalesce(timeout, self.settings.timeout),
-                retry=retry
+                retry=retry,
+                stream=stream
             )
         except Exception as e:
             Log.error(
@@ -465,10 +547,315 @@ class Index(Features):
             error_target=errors
         )
 
+    def bulk_queue(
+        self,
+        senders=DEFAULT_BULK_SENDERS,
+        batch_bytes=DEFAULT_BULK_BYTES,
+        max_pending_bytes=None,
+        max_retries=5
+    ):
+        """
+        LIKE threaded_queue(), BUT WITH MANY CONCURRENT _bulk REQUESTS
+        """
+        if self.settings.read_only:
+            Log.error("Index opened in read only mode, no changes allowed")
+        return BulkQueue(
+            self,
+            senders=senders,
+            batch_bytes=batch_bytes,
+            max_pending_bytes=max_pending_bytes,
+            max_retries=max_retries
+        )
+
     def delete(self):
         self.cluster.delete_index(index_name=self.settings.index)
 
 
+class BulkQueue(object):
+    """
+    SEND RECORDS TO AN Index WITH MANY CONCURRENT _bulk REQUESTS
+
+    RECORDS ARE ENCODED BY THE CALLER, AND BATCHED BY SIZE IN BYTES. WHEN ES
+    REJECTS WORK (429) THE BATCH SIZE IS HALVED AND ALL SENDERS BACK OFF;
+    EACH SUCCESSFUL REQUEST GROWS THE BATCH SIZE BACK. ONLY THE ITEMS THAT
+    FAILED ARE SENT AGAIN.
+    """
+
+    def __init__(
+        self,
+        index,  # THE Index TO FILL
+        senders=DEFAULT_BULK_SENDERS,  # NUMBER OF CONCURRENT _bulk REQUESTS
+        batch_bytes=DEFAULT_BULK_BYTES,  # LARGEST REQUEST; SHRINKS WHEN ES REJECTS, AND GROWS BACK
+        max_pending_bytes=None,  # WRITERS WILL BLOCK WHEN THIS MUCH IS WAITING TO BE SENT
+        max_retries=5  # NUMBER OF TIMES AN ITEM IS SENT BEFORE GIVING UP ON IT
+    ):
+        self.index = index
+        self.name = "bulk to " + index.settings.index
+        self.batch_bytes = batch_bytes
+        self.max_batch_bytes = batch_bytes
+        self.min_batch_bytes = min(MIN_BULK_BYTES, batch_bytes)
+        self.max_pending_bytes = coalesce(max_pending_bytes, 2 * senders * batch_bytes)
+        self.max_retries = max_retries
+
+        self.locker = Lock(self.name)
+        self.pending = deque()  # (action, document, attempts) TRIPLES
+        self.pending_bytes = 0
+        self.closed = False
+        self.backoff = 0  # SECONDS
+        self.next_send = 0  # NO SENDING BEFORE THIS TIME
+
+        self.start = time()
+        self.num_requests = 0
+        self.num_sent = 0
+        self.num_bytes = 0
+        self.num_retried = 0
+        self.num_rejected = 0
+        self.num_failed = 0
+        self.failures = []  # THE FIRST FEW REASONS DOCUMENTS WERE NOT INSERTED
+
+        self.num_senders = senders  # SENDERS STILL RUNNING
+        self.threads = [
+            Thread.run(self.name + " sender " + unicode(i), self._sender)
+            for i in range(senders)
+        ]
+
+    def add(self, record):
+        return self.extend([record])
+
+    def extend(self, records):
+        items = []
+        for r in records:
+            action, document = self.index._encode(r)
+            items.append((action, document, 0))
+        self._push(items)
+        return self
+
+    def _push(self, items):
+        """
+        :param items: LIST OF (action, document, attempts) TRIPLES
+        """
+        size = sum(len(action) + len(document) + 2 for action, document, _ in items)
+        with self.locker:
+            while self.pending_bytes > self.max_pending_bytes and not self.closed and self.num_senders:
+                self.locker.wait(till=Till(seconds=1))
+            if self.closed:
+                Log.error("Do not add to closed queue")
+            if not self.num_senders:
+                Log.error("{{name}} has no senders left, {{num}} documents were not sent", name=self.name, num=len(self.pending) + len(items))
+            self.pending.extend(items)
+            self.pending_bytes += size
+
+    def _next_batch(self, please_stop):
+        """
+        :return: LIST OF ITEMS, NO MORE THAN batch_bytes IN SIZE (UNLESS ONE ITEM IS BIGGER), OR None WHEN DONE
+        """
+        with self.locker:
+            while not self.pending:
+                if self.closed or please_stop:
+                    return None
+                self.locker.wait(till=Till(seconds=1) | please_stop)
+
+            batch = []
+            size = 0
+            while self.pending:
+                action, document, attempts = self.pending[0]
+                item_size = len(action) + len(document) + 2
+                if batch and size + item_size > self.batch_bytes:
+                    break
+                batch.append(self.pending.popleft())
+                size += item_size
+            self.pending_bytes -= size
+            return batch
+
+    def _requeue(self, items):
+        if not items:
+            return
+        with self.locker:
+            for action, document, attempts in reversed(items):
+                self.pending.appendleft((action, document, attempts))
+                self.pending_bytes += len(action) + len(document) + 2
+            self.num_retried += len(items)
+
+    def _rejected(self):
+        """
+        ES IS TOO BUSY: SMALLER BATCHES, AND WAIT LONGER BEFORE SENDING
+        """
+        with self.locker:
+            self.num_rejected += 1
+            self.batch_bytes = max(self.min_batch_bytes, int(self.batch_bytes / 2))
+            self.backoff = min(MAX_BULK_BACKOFF, max(1, self.backoff * 2))
+            self.next_send = time() + self.backoff
+            Log.note(
+                "ES rejected bulk request, waiting {{seconds}} seconds, batches now {{bytes|comma}} bytes",
+                seconds=self.backoff,
+                bytes=self.batch_bytes
+            )
+
+    def _accepted(self):
+        with self.locker:
+            self.batch_bytes = min(self.max_batch_bytes, int(self.batch_bytes * 1.25))
+            self.backoff = 0
+
+    def _sender(self, please_stop):
+        try:
+            while True:
+                batch = self._next_batch(please_stop)
+                if batch is None:
+                    return
+
+                wait = self.next_send - time()
+                if wait > 0:
+                    (Till(seconds=wait) | please_stop).wait()
+                try:
+                    self._send(batch)
+                except Exception as e:
+                    e = Except.wrap(e)
+                    Log.warning("Problem sending {{num}} documents to {{index}}", num=len(batch), index=self.index.settings.index, cause=e)
+                    self._retry(batch, [e] * len(batch))
+        finally:
+            with self.locker:
+                self.num_senders -= 1
+
+    def _send(self, batch):
+        data = b"".join(action + b"\n" + document + b"\n" for action, document, _ in batch)
+        try:
+            items = self.index.cluster.post(
+                self.index.path + "/_bulk",
+                data=data,
+                headers={"Content-Type": "text"},
+                timeout=self.index.settings.timeout,
+                params={"consistency": self.index.settings.consistency},
+                stream="items"
+            )
+        except Exception as e:
+            e = Except.wrap(e)
+            if "429" in e or "EsRejectedExecutionException" in e:
+                # REJECTIONS COUNT AS ATTEMPTS, SO A CLUSTER THAT NEVER RECOVERS WILL NOT HOLD THE DOCUMENTS FOREVER
+                self._rejected()
+                self._retry(batch, [e] * len(batch))
+            else:
+                Log.warning("Problem sending {{num}} documents to {{index}}", num=len(batch), index=self.index.settings.index, cause=e)
+                self._retry(batch, [e] * len(batch))
+            return
+
+        retry = []
+        errors = []
+        failed = []
+        rejected = False
+        try:
+            results = [
+                (batch[i], result)
+                for i, result in enumerate(items)
+                if not result.index.ok and result.index.status not in [200, 201]
+            ]
+        except Exception as e:
+            Log.warning("Problem reading response for {{num}} documents sent to {{index}}", num=len(batch), index=self.index.settings.index, cause=e)
+            self._retry(batch, [Except.wrap(e)] * len(batch))
+            return
+
+        with self.locker:
+            self.num_requests += 1
+            self.num_bytes += len(data)
+
+        for item, result in results:
+            status = result.index.status
+            error = coalesce(result.index.error, "")
+            if result.index.ok or status in [200, 201]:
+                continue
+            elif status == 429:
+                rejected = True
+                retry.append(item)
+                errors.append(error)
+            elif status >= 500 and not any(h in error for h in HOPELESS):
+                retry.append(item)
+                errors.append(error)
+            else:
+                failed.append((item, result))
+
+        causes = [
+            Except(
+                template="{{status}} {{error}} while loading line id={{id}}:\n{{line}}",
+                status=result.index.status,
+                error=result.index.error,
+                id=result.index._id,
+                line=strings.limit(document, 500)
+            )
+            for (action, document, _), result in failed[:MAX_BULK_FAILURES]
+        ]
+        with self.locker:
+            self.num_sent += len(batch) - len(retry) - len(failed)
+            self.num_failed += len(failed)
+            self.failures.extend(causes[:MAX_BULK_FAILURES - len(self.failures)])
+        if failed:
+            Log.warning(
+                "{{num}} documents not inserted into {{index|quote}}, will not try again",
+                num=len(failed),
+                index=self.index.settings.index,
+                cause=causes[0]
+            )
+
+        if rejected:
+            self._rejected()
+        else:
+            self._accepted()
+        self._retry(retry, errors)
+
+    def _retry(self, items, errors):
+        again = []
+        for (action, document, attempts), error in zip(items, errors):
+            if attempts + 1 < self.max_retries:
+                again.append((action, document, attempts + 1))
+            else:
+                with self.locker:
+                    self.num_failed += 1
+                    if len(self.failures) < MAX_BULK_FAILURES:
+                        self.failures.append(Except(template="Gave up after {{num}} attempts: {{error}}", num=attempts + 1, error=error))
+                Log.warning("Gave up sending document to {{index|quote}}", index=self.index.settings.index, cause=error)
+        self._requeue(again)
+
+    @property
+    def stats(self):
+        with self.locker:
+            duration = time() - self.start
+            return Data(
+                name=self.name,
+                requests=self.num_requests,
+                sent=self.num_sent,
+                bytes=self.num_bytes,
+                retried=self.num_retried,
+                rejected=self.num_rejected,
+                failed=self.num_failed,
+                pending=len(self.pending),
+                batch_bytes=self.batch_bytes,
+                docs_per_second=self.num_sent / duration if duration else None,
+                bytes_per_second=self.num_bytes / duration if duration else None
+            )
+
+    def stop(self):
+        """
+        SEND EVERYTHING PENDING, THEN STOP
+        """
+        with self.locker:
+            self.closed = True
+        for t in self.threads:
+            t.join()
+        with self.locker:
+            if self.pending:
+                # THE SENDERS WERE STOPPED BEFORE THEY WERE DONE
+                self.num_failed += len(self.pending)
+                self.failures.append(Except(template="{{num}} documents were never sent", num=len(self.pending)))
+        Log.note("{{name}} done: {{stats|json}}", name=self.name, stats=self.stats)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if isinstance(value, BaseException):
+            for t in self.threads:
+                t.please_stop.go()
+        self.stop()
+
+
 HOPELESS = [
     "Document contains at least one immense term",
     "400 MapperParsingException",
@@ -496,7 +883,17 @@ class Cluster(object):
         return cluster
 
     @override
-    def __init__(self, host, port=9200, explore_metadata=True, kwargs=None):
+    def __init__(
+        self,
+        host,
+        port=9200,
+        explore_metadata=True,
+        pool_size=None,  # MAXIMUM NUMBER OF KEEP-ALIVE CONNECTIONS TO THIS CLUSTER
+        pool_idle_timeout=None,  # SECONDS BEFORE AN UNUSED CONNECTION IS CLOSED
+        pool_max_requests=None,  # NUMBER OF REQUESTS BEFORE A CONNECTION IS REPLACED
+        pool_timeout=None,  # SECONDS A REQUEST WAITS FOR A FREE CONNECTION BEFORE FAILING
+        kwargs=None
+    ):
         """
         settings.explore_metadata == True - IF PROBING THE CLUSTER FOR METADATA IS ALLOWED
         settings.timeout == NUMBER OF SECONDS TO WAIT FOR RESPONSE, OR SECONDS TO WAIT FOR DOWNLOAD (PASSED TO requests)
@@ -506,12 +903,35 @@ class Cluster(object):
 
         self.settings = kwargs
         self.cluster_state = None
+        self.state_version = None  # VERSION OF THE CLUSTER STATE THE _metadata CAME FROM
         self._metadata = None
         self.metadata_locker = Lock()
         self.debug = kwargs.debug
-        self.version = None
+        self._version = None
         self.path = kwargs.host + ":" + unicode(kwargs.port)
-        self.get_metadata()
+        self.pool = http.SessionPool(
+            self.path,
+            size=pool_size,
+            idle_timeout=pool_idle_timeout,
+            max_requests=pool_max_requests,
+            timeout=pool_timeout
+        )
+        # THE (LARGE) CLUSTER STATE IS FETCHED ONLY WHEN FIRST NEEDED
+
+    @property
+    def version(self):
+        """
+        ES VERSION NUMBER, WITHOUT PULLING THE WHOLE CLUSTER STATE
+        """
+        if self._version is None:
+            self._version = self.get("/", retry={"times": 3}).version.number
+        return self._version
+
+    def get_state_version(self):
+        """
+        :return: CURRENT VERSION OF THE CLUSTER STATE; IT CHANGES WHEN THE MAPPINGS (OR ANYTHING ELSE) DO
+        """
+        return self.get("/_cluster/state/version", retry={"times": 3}, timeout=10).version
 
     @override
     def get_or_create_index(
@@ -687,7 +1107,7 @@ class Cluster(object):
 
         url = self.settings.host + ":" + unicode(self.settings.port) + "/" + index_name
         try:
-            response = http.delete(url)
+            response = http.delete(url, pool=self.pool)
             if response.status_code != 200:
                 Log.error("Expecting a 200, got {{code}}", code=response.status_code)
             details = mo_json.json2value(utf82unicode(response.content))
@@ -719,6 +1139,7 @@ class Cluster(object):
         if not self._metadata or force:
             response = self.get("/_cluster/state", retry={"times": 3}, timeout=30)
             with self.metadata_locker:
+                self.state_version = response.version
                 self._metadata = wrap(response.metadata)
                 # REPLICATE MAPPING OVER ALL ALIASES
                 indices = self._metadata.indices
@@ -728,12 +1149,18 @@ class Cluster(object):
                         if not indices[a]:
                             indices[a] = m
                 self.cluster_state = wrap(self.get("/"))
-                self.version = self.cluster_state.version.number
+                self._version = self.cluster_state.version.number
             return self._metadata
 
         return self._metadata
 
-    def post(self, path, **kwargs):
+    def post(self, path, stream=None, **kwargs):
+        """
+        :param stream: PATH TO AN ARRAY IN THE RESPONSE (LIKE "hits.hits" OR
+                       "items"). WHEN GIVEN, RETURN A GENERATOR OF ITS MEMBERS,
+                       DECODED ONE AT A TIME AS THE RESPONSE ARRIVES, AND
+                       NEVER HOLD THE WHOLE RESPONSE IN MEMORY
+        """
         url = self.settings.host + ":" + unicode(self.settings.port) + path
 
         try:
@@ -753,9 +1180,11 @@ class Cluster(object):
 
             if self.debug:
                 Log.note("POST {{url}}", url=url)
-            response = http.post(url, **kwargs)
+            response = http.post(url, pool=self.pool, **kwargs)
             if response.status_code not in [200, 201]:
                 Log.error(response.reason.decode("latin1") + ": " + strings.limit(response.content.decode("latin1"), 100 if self.debug else 10000))
+            if stream:
+                return _stream_members(response, stream, url)
             if self.debug:
                 Log.note("response: {{response}}", response=utf82unicode(response.content)[:130])
             details = mo_json.json2value(utf82unicode(response.content))
@@ -785,7 +1214,7 @@ class Cluster(object):
     def delete(self, path, **kwargs):
         url = self.settings.host + ":" + unicode(self.settings.port) + path
         try:
-            response = http.delete(url, **kwargs)
+            response = http.delete(url, pool=self.pool, **kwargs)
             if response.status_code not in [200]:
                 Log.error(response.reason+": "+response.all_content)
             if self.debug:
@@ -802,7 +1231,7 @@ class Cluster(object):
         try:
             if self.debug:
                 Log.note("GET {{url}}", url=url)
-            response = http.get(url, **kwargs)
+            response = http.get(url, pool=self.pool, **kwargs)
             if response.status_code not in [200]:
                 Log.error(response.reason + ": " + response.all_content)
             if self.debug:
@@ -817,7 +1246,7 @@ class Cluster(object):
     def head(self, path, **kwargs):
         url = self.settings.host + ":" + unicode(self.settings.port) + path
         try:
-            response = http.head(url, **kwargs)
+            response = http.head(url, pool=self.pool, **kwargs)
             if response.status_code not in [200]:
                 Log.error(response.reason+": "+response.all_content)
             if self.debug:
@@ -839,7 +1268,7 @@ class Cluster(object):
             sample = kwargs["data"][:300]
             Log.note("PUT {{url}}:\n{{data|indent}}", url=url, data=sample)
         try:
-            response = http.put(url, **kwargs)
+            response = http.put(url, pool=self.pool, **kwargs)
             if response.status_code not in [200]:
                 Log.error(response.reason+": "+response.all_content)
             if self.debug:
@@ -849,6 +1278,31 @@ class Cluster(object):
             Log.error("Problem with call to {{url}}",  url= url, cause=e)
 
 
+def _stream_members(response, path, url):
+    """
+    GENERATE THE MEMBERS OF THE path ARRAY, ONE AT A TIME, STRAIGHT FROM THE
+    SOCKET.  ONLY THE MEMBER BEING YIELDED IS IN MEMORY
+    """
+    steps = split_field(path)
+    try:
+        content = response.raw.stream(MIN_READ_SIZE, decode_content=True)
+        # ES SENDS _shards BEFORE hits, SO IT IS KNOWN WHEN THE FIRST HIT ARRIVES
+        # WITH NO HITS, parse() GIVES ONE RECORD WITHOUT path, SO IT IS CHECKED THEN TOO
+        for i, r in enumerate(stream.parse(content, path, [path, "_shards.failed"])):
+            if i == 0 and r.get("_shards", {}).get("failed"):
+                Log.error("Shard failures")
+            for s in steps:
+                r = r.get(s) if isinstance(r, Mapping) else None
+            if r is None:
+                # path IS NOT IN THE RESPONSE
+                return
+            yield wrap(r)
+    except Exception as e:
+        Log.error("Problem with streaming response from {{url}}", url=url, cause=e)
+    finally:
+        response.close()
+
+
 def proto_name(prefix, timestamp=None):
     if not timestamp:
         timestamp = Date.now()
@@ -1054,7 +1508,7 @@ class Alias(Features):
                             message=status._shards.failures[0].reason
                         )
 
-    def search(self, query, timeout=None):
+    def search(self, query, timeout=None, stream=None):
         query = wrap(query)
         try:
             if self.debug:
@@ -1067,7 +1521,8 @@ class Alias(Features):
             return self.cluster.post(
                 self.path + "/_search",
                 data=query,
-                timeout=coalesce(timeout, self.settings.timeout)
+                timeout=coalesce(timeout, self.settings.timeout),
+                stream=stream
             )
         except Exception as e:
             Log.error(
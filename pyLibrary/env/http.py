@@ -24,6 +24,7 @@ from copy import copy
 from mmap import mmap
 from numbers import Number
 from tempfile import TemporaryFile
+from time import time
 
 from requests import sessions, Response
 
@@ -45,6 +46,11 @@ MIN_READ_SIZE = 8 * 1024
 ZIP_REQUEST = False
 default_headers = Data()  # TODO: MAKE THIS VARIABLE A SPECIAL TYPE OF EXPECTED MODULE PARAMETER SO IT COMPLAINS IF NOT SET
 default_timeout = 600
+DEFAULT_POOL_SIZE = 10
+DEFAULT_IDLE_TIMEOUT = 60  # SECONDS A KEEP-ALIVE CONNECTION MAY SIT UNUSED BEFORE WE DISCARD IT
+DEFAULT_MAX_REQUESTS = 1000  # REQUESTS SENT OVER ONE CONNECTION BEFORE IT IS REPLACED
+DEFAULT_POOL_TIMEOUT = 600  # SECONDS TO WAIT FOR A SESSION BEFORE GIVING UP
+POOL_WARNING_INTERVAL = 5  # SECONDS BETWEEN COMPLAINTS ABOUT WAITING FOR A SESSION
 
 _warning_sent = False
 
@@ -61,6 +67,8 @@ def request(method, url, zip=None, retry=None, **kwargs):
      * zip - ZIP THE REQUEST BODY, IF BIG ENOUGH
      * json - JSON-SERIALIZABLE STRUCTURE
      * retry - {"times": x, "sleep": y} STRUCTURE
+     * session - USE THIS requests.Session, OR
+     * pool - A SessionPool TO BORROW A KEEP-ALIVE SESSION FROM
 
     THE BYTE_STRINGS (b"") ARE NECESSARY TO PREVENT httplib.py FROM **FREAKING OUT**
     IT APPEARS requests AND httplib.py SIMPLY CONCATENATE STRINGS BLINDLY, WHICH
@@ -91,6 +99,26 @@ def request(method, url, zip=None, retry=None, **kwargs):
                 failures.append(e)
         Log.error("Tried {{num}} urls", num=len(url), cause=failures)
 
+    if b"pool" in kwargs:
+        pool = kwargs[b"pool"]
+        del kwargs[b"pool"]
+        if pool:
+            pooled = pool._acquire()
+            try:
+                response = request(method, url, zip=zip, retry=retry, session=pooled.session, **kwargs)
+            except Exception as e:
+                pool._release(pooled, failed=True)
+                raise e
+            if kwargs.get(b"stream") and not _no_body(method, response):
+                # THE BODY IS NOT READ YET, SO THE SESSION IS STILL IN USE
+                _release_with_connection(response, pool, pooled)
+            else:
+                if kwargs.get(b"stream"):
+                    # NOTHING TO READ, SO DO NOT WAIT FOR A CALLER THAT MAY NEVER LOOK
+                    _ = response.content
+                pool._release(pooled, failed=False)
+            return response
+
     if b"session" in kwargs:
         session = kwargs[b"session"]
         del kwargs[b"session"]
@@ -242,6 +270,177 @@ def delete(url, **kwargs):
     return HttpResponse(request(b'delete', url, **kwargs))
 
 
+class SessionPool(object):
+    """
+    KEEP-ALIVE SESSIONS TO A SINGLE HOST, SHARED BY MANY THREADS
+    EACH SESSION IS USED BY ONE THREAD AT A TIME, SO THE POOL SIZE IS
+    ALSO THE MAXIMUM NUMBER OF CONCURRENT REQUESTS; MORE WILL WAIT
+
+    size - MAXIMUM NUMBER OF SESSIONS (CONNECTIONS)
+    idle_timeout - SECONDS A SESSION MAY SIT UNUSED BEFORE IT IS CLOSED
+    max_requests - NUMBER OF REQUESTS A SESSION SERVES BEFORE IT IS REPLACED
+    timeout - SECONDS A REQUEST WAITS FOR A SESSION BEFORE RAISING
+    """
+
+    def __init__(self, name, size=None, idle_timeout=None, max_requests=None, timeout=None):
+        self.name = name
+        self.size = coalesce(size, DEFAULT_POOL_SIZE)
+        self.idle_timeout = coalesce(idle_timeout, DEFAULT_IDLE_TIMEOUT)
+        self.max_requests = coalesce(max_requests, DEFAULT_MAX_REQUESTS)
+        self.timeout = coalesce(timeout, DEFAULT_POOL_TIMEOUT)
+        self.locker = Lock("session pool for " + name)
+        self.available = []  # STACK OF IDLE _PooledSession, MOST RECENTLY USED LAST
+        self.num_sessions = 0  # NUMBER OF SESSIONS OPEN, IDLE OR IN USE
+        self.hits = 0  # REQUESTS THAT REUSED AN OPEN SESSION
+        self.new = 0  # SESSIONS (AND CONNECTIONS) MADE
+        self.waits = 0  # REQUESTS THAT HAD TO WAIT FOR A SESSION
+        self.expired = 0  # SESSIONS CLOSED FOR BEING IDLE, OR USED TOO MUCH
+
+    def session(self):
+        """
+        :return: CONTEXT MANAGER THAT BORROWS A requests.Session FROM THE POOL
+        """
+        return _Borrowed(self)
+
+    def _acquire(self):
+        start = time()
+        next_warning = start + POOL_WARNING_INTERVAL
+        with self.locker:
+            waited = False
+            while True:
+                now = time()
+                while self.available:
+                    s = self.available.pop()
+                    if now - s.last_used > self.idle_timeout:
+                        self._discard(s)
+                        continue
+                    self.hits += 1
+                    return s
+                if self.num_sessions < self.size:
+                    self.num_sessions += 1
+                    self.new += 1
+                    break
+                if not waited:
+                    waited = True
+                    self.waits += 1
+
+                if now - start >= self.timeout:
+                    Log.error(
+                        "Waited {{seconds}} seconds for a session to {{name}}, all {{num}} are in use",
+                        seconds=self.timeout,
+                        name=self.name,
+                        num=self.num_sessions
+                    )
+                if now >= next_warning:
+                    next_warning = now + POOL_WARNING_INTERVAL
+                    Log.alert(
+                        "All {{num}} sessions to {{name}} are in use, thread has been waiting {{seconds}} sec",
+                        num=self.num_sessions,
+                        name=self.name,
+                        seconds=int(now - start)
+                    )
+                self.locker.wait(till=Till(till=min(next_warning, start + self.timeout)))
+
+        output = _PooledSession()
+        output.session.headers.update(default_headers)
+        return output
+
+    def _release(self, s, failed):
+        s.last_used = time()
+        s.num_requests += 1
+        with self.locker:
+            if failed or s.num_requests >= self.max_requests:
+                self._discard(s)
+            else:
+                self.available.append(s)
+
+    def _discard(self, s):
+        # EXPECTING self.locker TO BE HELD
+        self.num_sessions -= 1
+        self.expired += 1
+        try:
+            s.session.close()
+        except Exception:
+            pass
+
+    @property
+    def stats(self):
+        with self.locker:
+            return Data(
+                name=self.name,
+                size=self.size,
+                open=self.num_sessions,
+                idle=len(self.available),
+                hits=self.hits,
+                new=self.new,
+                waits=self.waits,
+                expired=self.expired
+            )
+
+    def close(self):
+        with self.locker:
+            available, self.available = self.available, []
+            for s in available:
+                self._discard(s)
+
+
+class _PooledSession(object):
+    __slots__ = ["session", "last_used", "num_requests"]
+
+    def __init__(self):
+        self.session = sessions.Session()
+        self.last_used = time()
+        self.num_requests = 0
+
+
+def _no_body(method, response):
+    """
+    RETURN True IF response CAN NOT HAVE A BODY TO READ
+    """
+    return (
+        method.lower() == b"head" or
+        response.status_code in (204, 304) or
+        response.headers.get(b"content-length") == b"0"
+    )
+
+
+def _release_with_connection(response, pool, pooled):
+    """
+    RETURN pooled TO pool WHEN THE response BODY IS ALL READ, OR THE
+    response IS close()D; urllib3 CALLS release_conn() FOR BOTH
+    """
+    raw = response.raw
+    release_conn = getattr(raw, "release_conn", None)
+    if release_conn is None:
+        pool._release(pooled, failed=False)
+        return
+
+    def release():
+        try:
+            release_conn()
+        finally:
+            if raw.release_conn is not release_conn:
+                raw.release_conn = release_conn
+                pool._release(pooled, failed=False)
+    raw.release_conn = release
+
+
+class _Borrowed(object):
+    __slots__ = ["pool", "pooled"]
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.pooled = None
+
+    def __enter__(self):
+        self.pooled = self.pool._acquire()
+        return self.pooled.session
+
+    def __exit__(self, type, value, traceback):
+        pooled, self.pooled = self.pooled, None
+        self.pool._release(pooled, failed=value is not None)
+
+
 class HttpResponse(Response):
     def __new__(cls, resp):
         resp.__class__ = HttpResponse
@@ -47,7 +47,7 @@ class MySQL(object):
         from pyLibrary.sql.mysql import MySQL
 
         self.settings = kwargs
-        self._db = MySQL(kwargs)
+        self.db = MySQL(kwargs)  # BORROWS FROM THE SHARED POOL, ONLY WHILE QUERYING
 
     def __data__(self):
         settings = self.settings.copy()
@@ -58,9 +58,10 @@ class MySQL(object):
         """
         TRANSLATE JSON QUERY EXPRESSION ON SINGLE TABLE TO SQL QUERY
         """
-        from jx_python.query import QueryOp
+        from jx_python.query import QueryOp, MAX_LIMIT
 
         query = QueryOp.wrap(query)
+        query.limit = min(query.limit, MAX_LIMIT)  # NO scroll HERE, SO STREAMED QUERIES ARE CAPPED TOO
 
         sql, post = self._subquery(query, isolate=False, stacked=stacked)
         query.data = post(sql)
@@ -16,6 +16,7 @@ import json
 import subprocess
 from collections import Mapping
 from datetime import datetime
+from time import time
 
 import mo_json
 from mo_dots import coalesce, wrap, listwrap, unwrap
@@ -27,7 +28,9 @@ from mo_logs.strings import expand_template
 from mo_logs.strings import indent
 from mo_logs.strings import outdent
 from mo_math import Math
+from mo_threads import Lock, Till
 from mo_times import Date
+from mo_times.dates import unix2datetime
 from pymysql import connect, InterfaceError, cursors
 
 from pyLibrary import convert
@@ -36,8 +39,15 @@ from pyLibrary.sql import SQL
 
 DEBUG = False
 MAX_BATCH_SIZE = 100
+DEFAULT_POOL_SIZE = 10
+DEFAULT_IDLE_TIMEOUT = 600  # SECONDS, WELL UNDER THE SERVER wait_timeout
+DEFAULT_POOL_TIMEOUT = 600  # SECONDS TO WAIT FOR A CONNECTION BEFORE GIVING UP
+POOL_WARNING_INTERVAL = 5  # SECONDS BETWEEN COMPLAINTS ABOUT WAITING FOR A CONNECTION
+DEFAULT_CHUNK_SIZE = 1000  # RECORDS PER BULK INSERT
 
 all_db = []
+pools = {}  # MAP FROM CONNECTION SETTINGS TO ConnectionPool
+pools_locker = Lock("mysql connection pools")
 
 
 class MySQL(object):
@@ -56,6 +66,8 @@ class MySQL(object):
         schema=None,
         preamble=None,
         readonly=False,
+        pool_size=DEFAULT_POOL_SIZE,
+        chunk_size=DEFAULT_CHUNK_SIZE,
         kwargs=None
     ):
         """
@@ -70,6 +82,12 @@ class MySQL(object):
         readonly - USED ONLY TO INDICATE IF A TRANSACTION WILL BE OPENED UPON
         USE IN with CLAUSE, YOU CAN STILL SEND UPDATES, BUT MUST OPEN A
         TRANSACTION BEFORE YOU DO
+
+        pool_size - MAXIMUM CONNECTIONS, SHARED BY ALL MySQL WITH THE SAME
+        CONNECTION SETTINGS.  A CONNECTION IS HELD ONLY DURING A TRANSACTION,
+        OR A READ
+
+        chunk_size - NUMBER OF RECORDS SENT PER BULK INSERT
         """
         all_db.append(self)
 
@@ -82,36 +100,29 @@ class MySQL(object):
 
         self.readonly = readonly
         self.debug = coalesce(debug, DEBUG)
+        self.chunk_size = chunk_size
+        self.db = None        # THE BORROWED CONNECTION, IF ANY
+        self.cursor = None
+        self.partial_rollback = False
+        self.transaction_level = 0
+        self.backlog = []     # accumulate the write commands so they are sent at once
         if host:
+            self.pool = get_pool(kwargs)
             self._open()
+            self._release()   # CONNECTION WORKS, LET OTHERS USE IT
 
     def _open(self):
         """ DO NOT USE THIS UNLESS YOU close() FIRST"""
-        try:
-            self.db = connect(
-                host=self.settings.host,
-                port=self.settings.port,
-                user=coalesce(self.settings.username, self.settings.user),
-                passwd=coalesce(self.settings.password, self.settings.passwd),
-                db=coalesce(self.settings.schema, self.settings.db),
-                charset=u"utf8",
-                use_unicode=True,
-                ssl=coalesce(self.settings.ssl, None),
-                cursorclass=cursors.SSCursor
-            )
-        except Exception as e:
-            if self.settings.host.find("://") == -1:
-                Log.error(u"Failure to connect to {{host}}:{{port}}",
-                    host= self.settings.host,
-                    port= self.settings.port,
-                    cause=e
-                )
-            else:
-                Log.error(u"Failure to connect.  PROTOCOL PREFIX IS PROBABLY BAD", e)
-        self.cursor = None
-        self.partial_rollback = False
-        self.transaction_level = 0
-        self.backlog = []     # accumulate the write commands so they are sent at once
+        self.db = self.pool.acquire()
+
+    def _release(self, failed=False):
+        """
+        RETURN THE CONNECTION TO THE POOL, UNLESS IN A TRANSACTION
+        """
+        if self.transaction_level or self.db is None:
+            return
+        db, self.db = self.db, None
+        self.pool.release(db, failed)
 
 
     def __enter__(self):
@@ -151,6 +162,8 @@ class MySQL(object):
 
     def begin(self):
         if self.transaction_level == 0:
+            if self.db is None:
+                self._open()
             self.cursor = self.db.cursor()
         self.transaction_level += 1
         self.execute("SET TIME_ZONE='+00:00'")
@@ -161,11 +174,8 @@ class MySQL(object):
             Log.error("expecting commit() or rollback() before close")
         self.cursor = None  # NOT NEEDED
         try:
-            self.db.close()
+            self._release()
         except Exception as e:
-            if e.message.find("Already closed") >= 0:
-                return
-
             Log.warning("can not close()", e)
         finally:
             all_db.remove(self)
@@ -192,6 +202,7 @@ class MySQL(object):
                 self.db.commit()
 
         self.transaction_level -= 1
+        self._release()
 
     def flush(self):
         try:
@@ -214,7 +225,12 @@ class MySQL(object):
             if self.cursor != None:
                 self.cursor.close()
             self.cursor = None
-            self.db.rollback()
+            try:
+                self.db.rollback()
+            except Exception as e:
+                self._release(failed=True)
+                Log.error("Can not rollback", e)
+            self._release()
         else:
             self.transaction_level -= 1
             self.partial_rollback = True
@@ -236,105 +252,89 @@ class MySQL(object):
         """
         RETURN LIST OF dicts
         """
-        self._execute_backlog()
-        try:
-            old_cursor = self.cursor
-            if not old_cursor:  # ALLOW NON-TRANSACTIONAL READS
-                self.cursor = self.db.cursor()
-                self.cursor.execute("SET TIME_ZONE='+00:00'")
-                self.cursor.close()
-                self.cursor = self.db.cursor()
-
-            if param:
-                sql = expand_template(sql, self.quote_param(param))
-            sql = self.preamble + outdent(sql)
-            if self.debug:
-                Log.note("Execute SQL:\n{{sql}}", sql=indent(sql))
-
-            self.cursor.execute(sql)
-            columns = [utf8_to_unicode(d[0]) for d in coalesce(self.cursor.description, [])]
-            fixed = [[utf8_to_unicode(c) for c in row] for row in self.cursor]
-            result = convert.table2list(columns, fixed)
-
-            if not old_cursor:   # CLEANUP AFTER NON-TRANSACTIONAL READS
-                self.cursor.close()
-                self.cursor = None
-
-            return result
-        except Exception as e:
-            if isinstance(e, InterfaceError) or e.message.find("InterfaceError") >= 0:
-                Log.error("Did you close the db connection?", e)
-            Log.error("Problem executing SQL:\n{{sql|indent}}",  sql= sql, cause=e, stack_depth=1)
+        rows = self._read(sql, param)
+        columns = next(rows)
+        return convert.table2list(columns, list(rows))
 
     def column_query(self, sql, param=None):
         """
         RETURN RESULTS IN [column][row_num] GRID
         """
-        self._execute_backlog()
-        try:
-            old_cursor = self.cursor
-            if not old_cursor: # ALLOW NON-TRANSACTIONAL READS
-                self.cursor = self.db.cursor()
-                self.cursor.execute("SET TIME_ZONE='+00:00'")
-                self.cursor.close()
-                self.cursor = self.db.cursor()
-
-            if param:
-                sql = expand_template(sql, self.quote_param(param))
-            sql = self.preamble + outdent(sql)
-            if self.debug:
-                Log.note("Execute SQL:\n{{sql}}", sql=indent(sql))
-
-            self.cursor.execute(sql)
-            grid = [[utf8_to_unicode(c) for c in row] for row in self.cursor]
-            # columns = [utf8_to_unicode(d[0]) for d in coalesce(self.cursor.description, [])]
-            result = zip(*grid)
-
-            if not old_cursor:   # CLEANUP AFTER NON-TRANSACTIONAL READS
-                self.cursor.close()
-                self.cursor = None
-
-            return result
-        except Exception as e:
-            if isinstance(e, InterfaceError) or e.message.find("InterfaceError") >= 0:
-                Log.error("Did you close the db connection?", e)
-            Log.error("Problem executing SQL:\n{{sql|indent}}",  sql= sql, cause=e,stack_depth=1)
-
-
+        rows = self._read(sql, param)
+        next(rows)
+        return zip(*rows)
 
+    def stream(self, sql, param=None):
+        """
+        GENERATE THE RESULT ROWS, AS dicts, WHILE THEY ARRIVE FROM THE SERVER
+        close() THE GENERATOR IF YOU DO NOT READ ALL OF THEM
+        """
+        rows = self._read(sql, param)
+        try:
+            columns = next(rows)
+            for row in rows:
+                yield wrap(dict(zip(columns, row)))
+        finally:
+            rows.close()
 
     # EXECUTE GIVEN METHOD FOR ALL ROWS RETURNED
     def forall(self, sql, param=None, _execute=None):
         assert _execute
         num = 0
+        try:
+            for row in self.stream(sql, param):
+                num += 1
+                _execute(row)
+        except Exception as e:
+            Log.error("Problem executing SQL:\n{{sql|indent}}",  sql= sql, cause=e, stack_depth=1)
+
+        return num
 
+    def _read(self, sql, param):
+        """
+        GENERATE THE COLUMN NAMES, THEN EACH ROW, FROM THE SSCursor, SO NO
+        RESULT IS HELD IN MEMORY.  A NON-TRANSACTIONAL READ BORROWS A
+        CONNECTION UNTIL THE LAST ROW IS READ
+        """
         self._execute_backlog()
+        old_cursor = self.cursor
+        done = False
         try:
-            old_cursor = self.cursor
-            if not old_cursor: # ALLOW NON-TRANSACTIONAL READS
+            if not old_cursor:  # ALLOW NON-TRANSACTIONAL READS
+                if self.db is None:
+                    self._open()
                 self.cursor = self.db.cursor()
+            cursor = self.cursor
 
             if param:
                 sql = expand_template(sql, self.quote_param(param))
             sql = self.preamble + outdent(sql)
             if self.debug:
-                Log.note("Execute SQL:\n{{sql}}",  sql= indent(sql))
-            self.cursor.execute(sql)
-
-            columns = tuple([utf8_to_unicode(d[0]) for d in self.cursor.description])
-            for r in self.cursor:
-                num += 1
-                _execute(wrap(dict(zip(columns, [utf8_to_unicode(c) for c in r]))))
-
-            if not old_cursor:   # CLEANUP AFTER NON-TRANSACTIONAL READS
-                self.cursor.close()
-                self.cursor = None
+                Log.note("Execute SQL:\n{{sql}}", sql=indent(sql))
 
+            cursor.execute(sql)
+            yield tuple(utf8_to_unicode(d[0]) for d in coalesce(cursor.description, []))
+            for row in cursor:
+                yield [utf8_to_unicode(c) for c in row]
+            done = True
         except Exception as e:
+            if isinstance(e, InterfaceError) or e.message.find("InterfaceError") >= 0:
+                Log.error("Did you close the db connection?", e)
             Log.error("Problem executing SQL:\n{{sql|indent}}",  sql= sql, cause=e, stack_depth=1)
-
-        return num
-
+        finally:
+            if not old_cursor:   # CLEANUP AFTER NON-TRANSACTIONAL READS
+                cursor, self.cursor = self.cursor, None
+                if done:
+                    cursor.close()
+                # AN UNFINISHED SSCursor WOULD READ THE REST OF THE RESULT ON
+                # close(), SO DROP THE CONNECTION INSTEAD
+                self._release(failed=not done)
+            elif not done:
+                # THE TRANSACTION KEEPS USING THIS SSCursor, WHICH CAN NOT SEND
+                # ANOTHER STATEMENT UNTIL THE REST OF THE RESULT IS READ
+                with suppress_exception:
+                    for _ in old_cursor:
+                        pass
 
     def execute(self, sql, param=None):
         if self.transaction_level == 0:
@@ -486,11 +486,48 @@ class MySQL(object):
         self.execute(command, {})
 
 
-    # ONLY INSERT IF THE candidate_key DOES NOT EXIST YET
-    def insert_newlist(self, table_name, candidate_key, new_records):
+    def insert_newlist(self, table_name, candidate_key, new_records, unique=False):
+        """
+        ONLY INSERT THE RECORDS WHOSE candidate_key DOES NOT EXIST YET
+
+        unique - True IF candidate_key IS A UNIQUE INDEX OF table_name, SO
+        INSERT IGNORE CAN DO THE CHECK.  OTHERWISE, THE RECORDS ARE BULK
+        INSERTED INTO A TEMPORARY TABLE, AND ONE INSERT ... SELECT COPIES THE
+        NEW ONES
+        """
+        candidate_key = listwrap(candidate_key)
+
+        # FIRST RECORD OF EACH KEY, AS IF INSERTED ONE AT A TIME
+        records = []
+        seen = set()
+        keys = set()
         for r in new_records:
-            self.insert_new(table_name, candidate_key, r)
+            uid = json_encode([r[k] for k in candidate_key])
+            if uid in seen:
+                continue
+            seen.add(uid)
+            records.append(r)
+            keys |= set(r.keys())
+        if not records:
+            return
+        keys = jx.sort(keys)
 
+        if unique:
+            self._insert_many("INSERT IGNORE INTO ", table_name, keys, records)
+            return
+
+        staging = "__new_" + table_name.split(".")[-1]
+        self.execute("DROP TEMPORARY TABLE IF EXISTS " + self.quote_column(staging))
+        self.execute("CREATE TEMPORARY TABLE " + self.quote_column(staging) + " LIKE " + self.quote_column(table_name))
+        self._insert_many("INSERT INTO ", staging, keys, records)
+        self.execute(
+            "INSERT INTO " + self.quote_column(table_name) + " (" + self.quote_column(keys) + ")\n" +
+            "SELECT " + self.quote_column(keys, "s") + " FROM " + self.quote_column(staging) + " s\n" +
+            "WHERE NOT EXISTS (SELECT 1 FROM " + self.quote_column(table_name) + " t WHERE " +
+            " AND ".join(self.quote_column(k, "t") + SQL("<=>") + self.quote_column(k, "s") for k in candidate_key) +
+            ")"
+        )
+        self.execute("DROP TEMPORARY TABLE " + self.quote_column(staging))
 
     def insert_list(self, table_name, records):
         if not records:
@@ -501,18 +538,35 @@ class MySQL(object):
             keys |= set(r.keys())
         keys = jx.sort(keys)
 
-        try:
-            command = \
-                "INSERT INTO " + self.quote_column(table_name) + "(" + \
-                ",".join([self.quote_column(k) for k in keys]) + \
-                ") VALUES " + ",\n".join([
-                    "(" + ",".join([self.quote_value(r[k]) for k in keys]) + ")"
-                    for r in records
-                ])
-            self.execute(command)
-        except Exception as e:
-            Log.error("problem with record: {{record}}",  record= records, cause=e)
+        self._insert_many("INSERT INTO ", table_name, keys, records)
+
+    def _insert_many(self, command, table_name, keys, records):
+        """
+        SEND records, chunk_size AT A TIME, AS PARAMETERS OF ONE STATEMENT;
+        executemany() EXPANDS IT TO A MULTI-ROW INSERT, SPLIT TO FIT THE
+        max_allowed_packet
+        """
+        if self.transaction_level == 0:
+            Log.error("Expecting transaction to be started before issuing queries")
+        self._execute_backlog()  # KEEP STATEMENTS IN ORDER
 
+        # NO preamble: executemany() ONLY BATCHES STATEMENTS THAT START WITH INSERT
+        sql = command + self.quote_column(table_name) + " (" + self.quote_column(keys) + ") VALUES (" + ",".join(["%s"] * len(keys)) + ")"
+        for _, chunk in jx.groupby(records, size=self.chunk_size):
+            rows = [[r[k] for k in keys] for r in chunk]
+            try:
+                if any(isinstance(v, SQL) for row in rows for v in row):
+                    # SQL CAN NOT BE A PARAMETER
+                    self.cursor.execute(
+                        command + self.quote_column(table_name) + " (" + self.quote_column(keys) + ") VALUES " +
+                        ",\n".join("(" + ",".join(self.quote_value(v) for v in row) + ")" for row in rows)
+                    )
+                else:
+                    if self.debug:
+                        Log.note("Execute SQL for {{num}} records:\n{{sql|indent}}", num=len(rows), sql=sql)
+                    self.cursor.executemany(sql, [[_param(v) for v in row] for row in rows])
+            except Exception as e:
+                Log.error("problem with record: {{record}}",  record=chunk, cause=e)
 
     def update(self, table_name, where_slice, new_values):
         """
@@ -553,9 +607,9 @@ class MySQL(object):
                 param = {k: self.quote_sql(v) for k, v in value.param.items()}
                 return SQL(expand_template(value.template, param))
             elif isinstance(value, basestring):
-                return SQL(self.db.literal(value))
+                return SQL(self.pool.literal(value))
             elif isinstance(value, Mapping):
-                return SQL(self.db.literal(json_encode(value)))
+                return SQL(self.pool.literal(json_encode(value)))
             elif Math.is_number(value):
                 return SQL(unicode(value))
             elif isinstance(value, datetime):
@@ -563,9 +617,9 @@ class MySQL(object):
             elif isinstance(value, Date):
                 return SQL("str_to_date('"+value.format("%Y%m%d%H%M%S.%f")+"', '%Y%m%d%H%i%s.%f')")
             elif hasattr(value, '__iter__'):
-                return SQL(self.db.literal(json_encode(value)))
+                return SQL(self.pool.literal(json_encode(value)))
             else:
-                return self.db.literal(value)
+                return self.pool.literal(value)
         except Exception as e:
             Log.error("problem quoting SQL", e)
 
@@ -583,7 +637,7 @@ class MySQL(object):
             elif isinstance(value, basestring):
                 return value
             elif isinstance(value, Mapping):
-                return self.db.literal(json_encode(value))
+                return self.pool.literal(json_encode(value))
             elif hasattr(value, '__iter__'):
                 return "(" + ",".join([self.quote_sql(vv) for vv in value]) + ")"
             else:
@@ -611,6 +665,162 @@ class MySQL(object):
         return ",\n".join([self.quote_column(s.field) + (" DESC" if s.sort == -1 else " ASC") for s in sort])
 
 
+def _param(value):
+    """
+    CONVERT value TO WHAT pymysql CAN ESCAPE, LIKE quote_value() DOES
+    """
+    if value == None:
+        return None
+    elif isinstance(value, basestring):
+        return value
+    elif isinstance(value, Mapping):
+        return json_encode(value)
+    elif Math.is_number(value) or isinstance(value, datetime):
+        return value
+    elif isinstance(value, Date):
+        return unix2datetime(value.unix)
+    elif hasattr(value, '__iter__'):
+        return json_encode(value)
+    else:
+        return value
+
+
+def get_pool(settings):
+    """
+    RETURN THE ConnectionPool FOR THE DATABASE AT settings
+    """
+    key = (
+        settings.host,
+        settings.port,
+        coalesce(settings.username, settings.user),
+        coalesce(settings.password, settings.passwd),
+        coalesce(settings.schema, settings.db),
+        mo_json.value2json(settings.ssl)
+    )
+    with pools_locker:
+        pool = pools.get(key)
+        if pool is None:
+            pool = pools[key] = ConnectionPool(settings)
+        return pool
+
+
+class ConnectionPool(object):
+    """
+    CONNECTIONS TO A SINGLE DATABASE, SHARED BY MANY MySQL AND MANY THREADS
+    EACH CONNECTION IS USED BY ONE MySQL AT A TIME, SO THE POOL SIZE IS ALSO
+    THE MAXIMUM NUMBER OF CONCURRENT TRANSACTIONS AND READS; MORE WILL WAIT
+
+    size - MAXIMUM NUMBER OF CONNECTIONS
+    idle_timeout - SECONDS A CONNECTION MAY SIT UNUSED BEFORE IT IS CLOSED
+    pool_timeout - SECONDS acquire() WAITS FOR A CONNECTION BEFORE RAISING
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.size = coalesce(settings.pool_size, DEFAULT_POOL_SIZE)
+        self.idle_timeout = coalesce(settings.idle_timeout, DEFAULT_IDLE_TIMEOUT)
+        self.timeout = coalesce(settings.pool_timeout, DEFAULT_POOL_TIMEOUT)
+        self.locker = Lock("mysql connection pool for " + settings.host)
+        self.available = []  # STACK OF (connection, last_used), MOST RECENTLY USED LAST
+        self.num_connections = 0  # NUMBER OF CONNECTIONS OPEN, IDLE OR IN USE
+        self.escaper = None  # ANY CONNECTION; literal() NEEDS NO NETWORK
+
+    def acquire(self):
+        start = time()
+        next_warning = start + POOL_WARNING_INTERVAL
+        with self.locker:
+            while True:
+                now = time()
+                while self.available:
+                    db, last_used = self.available.pop()
+                    if now - last_used > self.idle_timeout:
+                        self._discard(db)
+                        continue
+                    return db
+                if self.num_connections < self.size:
+                    self.num_connections += 1
+                    break
+
+                if now - start >= self.timeout:
+                    Log.error(
+                        "Waited {{seconds}} seconds for a connection to {{host}}, all {{num}} are in use",
+                        seconds=self.timeout,
+                        host=self.settings.host,
+                        num=self.num_connections
+                    )
+                if now >= next_warning:
+                    next_warning = now + POOL_WARNING_INTERVAL
+                    Log.alert(
+                        "All {{num}} connections to {{host}} are in use, thread has been waiting {{seconds}} sec",
+                        num=self.num_connections,
+                        host=self.settings.host,
+                        seconds=int(now - start)
+                    )
+                self.locker.wait(till=Till(till=min(next_warning, start + self.timeout)))
+
+        try:
+            db = self._connect()
+        except Exception as e:
+            with self.locker:
+                self.num_connections -= 1
+            raise e
+        if self.escaper is None:
+            self.escaper = db
+        return db
+
+    def release(self, db, failed=False):
+        with self.locker:
+            if failed:
+                self._discard(db)
+            else:
+                self.available.append((db, time()))
+
+    def _discard(self, db):
+        # EXPECTING self.locker TO BE HELD
+        self.num_connections -= 1
+        with suppress_exception:
+            db.close()
+
+    def _connect(self):
+        settings = self.settings
+        try:
+            return connect(
+                host=settings.host,
+                port=settings.port,
+                user=coalesce(settings.username, settings.user),
+                passwd=coalesce(settings.password, settings.passwd),
+                db=coalesce(settings.schema, settings.db),
+                charset=u"utf8",
+                use_unicode=True,
+                ssl=coalesce(settings.ssl, None),
+                init_command="SET TIME_ZONE='+00:00'",  # FOR NON-TRANSACTIONAL READS
+                cursorclass=cursors.SSCursor
+            )
+        except Exception as e:
+            if settings.host.find("://") == -1:
+                Log.error(u"Failure to connect to {{host}}:{{port}}",
+                    host= settings.host,
+                    port= settings.port,
+                    cause=e
+                )
+            else:
+                Log.error(u"Failure to connect.  PROTOCOL PREFIX IS PROBABLY BAD", e)
+
+    def literal(self, value):
+        """
+        ESCAPE value AS THE SERVER EXPECTS
+        """
+        if self.escaper is None:
+            self.release(self.acquire())
+        return self.escaper.literal(value)
+
+    def close(self):
+        with self.locker:
+            available, self.available = self.available, []
+            for db, _ in available:
+                self._discard(db)
+
+
 def utf8_to_unicode(v):
     try:
         if isinstance(v, str):
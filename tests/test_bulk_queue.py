@@ -0,0 +1,157 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_dots import wrap
+from mo_json import json2value
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Lock
+from pyLibrary.env import elasticsearch
+from pyLibrary.env.elasticsearch import BulkQueue
+
+NUM_DOCS = 40
+
+
+class _Cluster(object):
+    """
+    ANSWERS _bulk REQUESTS, REJECTING (429) EACH DOCUMENT IN reject THE FIRST TIME IT IS SEEN
+    """
+
+    def __init__(self, reject=(), hopeless=()):
+        self.locker = Lock()
+        self.reject = set(reject)
+        self.hopeless = set(hopeless)
+        self.requests = []  # LIST OF (size, ids) FOR EACH REQUEST
+        self.inserted = []
+        self.version = "1.7.5"
+
+    def post(self, path, data=None, headers=None, timeout=None, params=None, stream=None, retry=None):
+        lines = data.strip().split(b"\n")
+        ids = [json2value(lines[i].decode("utf8"))["index"]["_id"] for i in range(0, len(lines), 2)]
+        items = []
+        with self.locker:
+            self.requests.append((len(data), ids))
+            for id in ids:
+                if id in self.reject:
+                    self.reject.discard(id)
+                    items.append({"index": {"_id": id, "status": 429, "error": "EsRejectedExecutionException[rejected execution (queue capacity 50)]"}})
+                elif id in self.hopeless:
+                    items.append({"index": {"_id": id, "status": 400, "error": "MapperParsingException[failed to parse]"}})
+                else:
+                    self.inserted.append(id)
+                    items.append({"index": {"_id": id, "status": 201}})
+        return (wrap(i) for i in items)
+
+
+class _BusyCluster(_Cluster):
+    """
+    REJECTS (429) EVERY _bulk REQUEST
+    """
+
+    def post(self, path, data=None, headers=None, timeout=None, params=None, stream=None, retry=None):
+        with self.locker:
+            self.requests.append((len(data), None))
+        raise Exception("Bad response (429): EsRejectedExecutionException[rejected execution (queue capacity 50)]")
+
+
+def _index(cluster):
+    index = object.__new__(elasticsearch.Index)
+    index.cluster = cluster
+    index.path = "/test"
+    index.debug = False
+    index.settings = wrap({"index": "test", "read_only": False})
+    return index
+
+
+def _records(num=NUM_DOCS):
+    return [{"id": unicode(i), "value": {"data": "x" * 50}} for i in range(num)]
+
+
+class TestBulkQueue(FuzzyTestCase):
+
+    def setUp(self):
+        self.backoff, elasticsearch.MAX_BULK_BACKOFF = elasticsearch.MAX_BULK_BACKOFF, 0
+        self.min_bytes, elasticsearch.MIN_BULK_BYTES = elasticsearch.MIN_BULK_BYTES, 100
+
+    def tearDown(self):
+        elasticsearch.MAX_BULK_BACKOFF = self.backoff
+        elasticsearch.MIN_BULK_BYTES = self.min_bytes
+
+    def test_rejected_items_retried(self):
+        cluster = _Cluster(reject=["3", "4", "30"])
+        queue = BulkQueue(_index(cluster), senders=1, batch_bytes=1000)
+        queue.extend(_records())
+        queue.stop()
+
+        self.assertEqual(sorted(cluster.inserted, key=int), [unicode(i) for i in range(NUM_DOCS)])
+        self.assertEqual(queue.stats, {"sent": NUM_DOCS, "retried": 3, "failed": 0, "pending": 0})
+        self.assertEqual(queue.failures, [])
+
+        # ONLY THE REJECTED DOCUMENTS ARE SENT AGAIN, FIRST, IN A SMALLER REQUEST
+        sizes, ids = zip(*cluster.requests)
+        first = [i for i, r in enumerate(ids) if "3" in r]
+        self.assertEqual(len(first), 2)
+        retry = ids[first[1]]
+        self.assertEqual(retry[:2], ["3", "4"])
+        self.assertLessEqual(sizes[first[1]], 500)
+        self.assertGreater(queue.stats.rejected, 1)
+
+    def test_rejected_requests_give_up(self):
+        cluster = _BusyCluster()
+        queue = BulkQueue(_index(cluster), senders=1, batch_bytes=100000, max_retries=3)
+        queue.extend(_records())
+        queue.stop()
+
+        self.assertEqual(len(cluster.requests), 3)
+        self.assertEqual(queue.stats, {"sent": 0, "failed": NUM_DOCS, "pending": 0, "rejected": 3})
+        self.assertTrue("Gave up after 3 attempts" in queue.failures[0])
+
+    def test_hopeless_items_not_retried(self):
+        cluster = _Cluster(hopeless=["7"])
+        queue = BulkQueue(_index(cluster), senders=2, batch_bytes=1000)
+        queue.extend(_records())
+        queue.stop()
+
+        self.assertEqual(len(cluster.inserted), NUM_DOCS - 1)
+        self.assertEqual(queue.stats, {"sent": NUM_DOCS - 1, "retried": 0, "failed": 1})
+        self.assertEqual(len(queue.failures), 1)
+        self.assertTrue("MapperParsingException" in queue.failures[0])
+
+    def test_dead_senders_fail_extend(self):
+        queue = BulkQueue(_index(_Cluster()), senders=2, batch_bytes=1000, max_pending_bytes=1000)
+        for t in queue.threads:
+            t.please_stop.go()
+            t.join()
+
+        # WITHOUT SENDERS, extend() MUST NOT WAIT FOREVER
+        self.assertRaises(Exception, queue.extend, _records())
+        queue.stop()
+
+    def test_large_extend_uses_bulk_queue(self):
+        cluster = _Cluster(reject=["10"])
+        bulk_bytes, elasticsearch.DEFAULT_BULK_BYTES = elasticsearch.DEFAULT_BULK_BYTES, 1000
+        try:
+            _index(cluster).extend(_records())
+        finally:
+            elasticsearch.DEFAULT_BULK_BYTES = bulk_bytes
+
+        self.assertEqual(sorted(cluster.inserted, key=int), [unicode(i) for i in range(NUM_DOCS)])
+        self.assertGreater(len(cluster.requests), 4)
+
+    def test_large_extend_reports_failures(self):
+        cluster = _Cluster(hopeless=["10"])
+        bulk_bytes, elasticsearch.DEFAULT_BULK_BYTES = elasticsearch.DEFAULT_BULK_BYTES, 1000
+        try:
+            self.assertRaises(Exception, _index(cluster).extend, _records())
+        finally:
+            elasticsearch.DEFAULT_BULK_BYTES = bulk_bytes
+        self.assertEqual(len(cluster.inserted), NUM_DOCS - 1)
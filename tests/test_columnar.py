@@ -0,0 +1,58 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_dots import unwrap
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_python import jx
+from jx_python.containers.columnar import ColumnarContainer
+from jx_python.containers.list_usingPythonList import ListContainer
+
+DATA = [
+    {"a": 1, "b": {"c": "x", "d": 0.5}},
+    {"a": 2, "b": {"c": "y", "d": 1.5}, "e": [1, 2]},
+    {"a": None, "b": {"d": 2.5}},
+    {"a": 3, "b": {"c": "x"}, "e": [3]},
+    {"a": 2, "b": {"c": None, "d": -1.0}}
+]
+
+
+class TestColumnar(FuzzyTestCase):
+
+    def test_rows_round_trip(self):
+        container = ColumnarContainer("test", DATA)
+        self.assertEqual(container.data, [{k: v for k, v in d.items() if v is not None} for d in DATA])
+        self.assertEqual(container.columns["a"].values.typecode, b"l")
+        self.assertEqual(container.columns["b.d"].values.typecode, b"d")
+
+    def test_where(self):
+        self._compare({"where": {"eq": {"a": 2}}})
+        self._compare({"where": {"and": [{"gt": {"b.d": 0}}, {"in": {"b.c": ["x", "y"]}}]}})
+        self._compare({"where": {"or": [{"lt": {"a": 2}}, {"missing": "b.c"}]}})
+        self._compare({"where": {"eq": {"e": 3}}})  # MULTI-VALUED, RUN ON ROWS
+
+    def test_sort(self):
+        self._compare({"sort": [{"field": "a", "sort": -1}, "b.d"]})
+        self._compare({"sort": "b.c", "select": ["a", "b.c"]})
+
+    def test_groupby(self):
+        expected = [(g, list(v)) for g, v in ListContainer("test", DATA).groupby(["a", "b.c"])]
+        result = [(g, list(v)) for g, v in ColumnarContainer("test", DATA).groupby(["a", "b.c"])]
+        self.assertEqual(result, expected)
+
+    def _compare(self, query):
+        expected = dict(query)
+        expected["from"] = ListContainer("test", DATA)
+        result = dict(query)
+        result["from"] = ColumnarContainer("test", DATA)
+        self.assertEqual(unwrap(jx.run(result).data), unwrap(jx.run(expected).data))
@@ -0,0 +1,115 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from jx_base.expressions import Variable
+from jx_elasticsearch.es14 import aggs, format
+from jx_elasticsearch.es14.decoders import DefaultDecoder
+from mo_collections.matrix import Matrix
+from mo_dots import wrap
+from mo_json import value2json
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+
+def _response():
+    # WHAT ES RETURNS FOR {"edges": ["a", "b"], "select": [count, sum(v), stats(v)]}
+    def leaf(count, total):
+        return {"doc_count": count, "_sum": {"value": total}, "_stats": {"min": 1, "max": total}}
+
+    def inner(seed):
+        return {
+            "_match": {"buckets": [
+                dict(leaf(seed * (i + 1), seed + i), key=k)
+                for i, k in enumerate(["q", "p", "r"][:seed])
+            ] + [dict(leaf(0, 0), key="s")]},
+            "_missing": leaf(seed % 2, seed * 10)
+        }
+
+    return {
+        "_match": {"buckets": [
+            dict(inner(seed), key=k, doc_count=seed * 10)
+            for seed, k in [(3, "y"), (1, "x"), (2, "z")]
+        ]},
+        "_missing": dict(inner(2), doc_count=20)
+    }
+
+
+def _decoders():
+    query = wrap({"sort": [], "limit": 10})
+    decoders = []
+    for i, name in enumerate(["a", "b"]):
+        edge = wrap({"name": name, "value": Variable(name), "domain": {"type": "default"}, "dim": i})
+        d = object.__new__(DefaultDecoder)
+        d.__init__(edge, query, 10)
+        decoders.append(d)
+    decoders[0].start = 1  # OUTER AGGREGATE
+    decoders[1].start = 0
+    return decoders
+
+
+def _select():
+    return wrap([
+        {"name": "count", "pull": "doc_count", "default": 0},
+        {"name": "total", "pull": "_sum.value", "default": None},
+        {"name": "stats", "pull": {"min": "_stats.min", "max": "_stats.max"}, "default": None}
+    ])
+
+
+def _old_cube(decoders, response, select):
+    # ONE CELL AT A TIME, AS format_cube USED TO
+    new_edges = aggs.count_dim(response, decoders)
+    dims = tuple(len(e.domain.partitions) + 1 for e in new_edges)
+    matricies = [(s, Matrix(dims=dims, zeros=s.default)) for s in select]
+    for row, coord, agg in aggs.aggs_iterator(response, decoders):
+        for s, m in matricies:
+            m[coord] = format._pull(s, agg)
+    return {s.name: m for s, m in matricies}
+
+
+class TestCubeFormat(FuzzyTestCase):
+
+    def test_same_as_per_cell(self):
+        query = wrap({"select": _select()})
+        cube = format.format_cube(_decoders(), _response(), 0, query, _select())
+        expected = _old_cube(_decoders(), _response(), _select())
+
+        self.assertEqual(cube.edges.name, ["a", "b"])
+        for s in _select():
+            self.assertEqual(value2json(cube.data[s.name].cube), value2json(expected[s.name].cube))
+        self.assertEqual(cube.data["count"].cube[1][0], 6)  # a=y, b=p
+
+    def test_buckets_not_changed(self):
+        decoders = _decoders()
+        response = _response()
+        aggs.count_dim(response, decoders)
+        before = value2json(response)
+        coords, values = aggs.aggs_columns(response, decoders, [lambda a: a["doc_count"]])
+
+        self.assertEqual(value2json(response), before)
+        self.assertEqual(len(coords[0]), len(values[0]))
+        self.assertEqual(sum(values[0]), 33)
+
+    def test_index_asked_once_per_part(self):
+        decoders = _decoders()
+        response = _response()
+        aggs.count_dim(response, decoders)
+        asked = []
+        for d in decoders:
+            def get_index(row, get_index=d.get_index, start=d.start):
+                asked.append(row[start]["key"])
+                return get_index(row)
+            d.get_index = get_index
+
+        coords, values = aggs.aggs_columns(response, decoders, [lambda a: a["doc_count"]])
+        self.assertEqual(len(values[0]), 10)  # EVERY NON-EMPTY LEAF
+        # ONE CALL PER OUTER BUCKET, AND ONE PER DISTINCT (POSITION, KEY) OF THE INNER BUCKETS
+        self.assertEqual(len(asked), 4 + 4)
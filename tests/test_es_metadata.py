@@ -0,0 +1,234 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+
+from jx_elasticsearch import meta
+from jx_python.containers.list_usingPythonList import ListContainer
+from jx_python.meta import ColumnList, Column, Table
+from mo_dots import wrap, Data
+from mo_files import File
+from mo_json import value2json
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Queue, Thread, Till
+from mo_times.dates import Date
+from mo_times.durations import HOUR
+from pyLibrary.env import elasticsearch
+
+# THE DISTINCT VALUES ES HOLDS FOR EACH COLUMN OF THE "test" INDEX
+VALUES = {
+    "a": ["x", "y", "z"],
+    "b": range(500),
+    "c.d": ["p", "q"]
+}
+NUM_DOCS = 100
+
+
+class _ES(object):
+    """
+    ANSWERS cardinality AND terms AGGREGATIONS FROM VALUES
+    """
+
+    def __init__(self, fail_batch=False, state_version=1):
+        self.requests = []
+        self.fail_batch = fail_batch
+        self.state_version = state_version
+
+    def get_state_version(self):
+        self.requests.append(("/_cluster/state/version", None))
+        return self.state_version
+
+    def post(self, path, data=None):
+        data = wrap(data)
+        self.requests.append((path, data))
+        if self.fail_batch and len(data.aggs.keys()) > 1:
+            raise Exception("too many aggregations")
+
+        aggregations = {}
+        for name, agg in data.aggs.items():
+            if agg.nested:
+                inner = agg.aggs._nested
+                aggregations[name] = {"doc_count": NUM_DOCS, "_nested": _answer(inner)}
+            else:
+                aggregations[name] = _answer(agg)
+        return wrap({"hits": {"total": NUM_DOCS}, "aggregations": aggregations})
+
+
+def _answer(agg):
+    if agg.cardinality:
+        return {"value": len(VALUES[agg.cardinality.field])}
+    else:
+        return {"buckets": [{"key": v, "doc_count": 1} for v in reversed(VALUES[agg.terms.field])]}
+
+
+def _column(name, type, nested_path=(".",)):
+    return Column(
+        names={".": name},
+        es_column=name,
+        es_index="test",
+        type=type,
+        nested_path=list(nested_path),
+        last_updated=Date.now() - 3 * HOUR
+    )
+
+
+def _metadata(es, cache=None):
+    m = object.__new__(meta.FromESMetadata)
+    m.default_es = es
+    m.dirty = False
+    m.cache = cache
+    m.table_versions = {}
+    m.unvalidated = set()
+    m.meta = Data()
+    m.meta.tables = ListContainer("meta.tables", [])
+    m.meta.columns = ColumnList()
+    return m
+
+
+class TestESMetadata(FuzzyTestCase):
+
+    def setUp(self):
+        self.elasticsearch = meta._elasticsearch
+        meta._elasticsearch = elasticsearch
+        self.dir = tempfile.mkdtemp()
+        self.cache = File(os.path.join(self.dir, "metadata.json"))
+
+    def tearDown(self):
+        meta._elasticsearch = self.elasticsearch
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def snapshot(self, state_version):
+        # WHAT A PREVIOUS PROCESS SAVED AFTER PARSING THE test MAPPINGS
+        m = _metadata(_ES(), self.cache)
+        m.meta.tables.add(Table(name="test", url=None, query_path=None, timestamp=Date.now()))
+        column = _column("a", "string")
+        column.cardinality = 3
+        column.partitions = ["x", "y", "z"]
+        m.meta.columns.add(column)
+        m.table_versions["test"] = state_version
+        m._save_cache()
+
+    def test_one_request_per_index(self):
+        es = _ES()
+        m = _metadata(es)
+        columns = [_column("a", "string"), _column("b", "long"), _column("c.d", "string", ["c", "."])]
+        m.meta.columns.insert(columns)
+
+        m._update_cardinalities(columns)
+
+        # ONE REQUEST FOR ALL THE CARDINALITIES, ONE FOR THE PARTITIONS OF THE SMALL COLUMNS
+        self.assertEqual([p for p, _ in es.requests], ["/test/_search", "/test/_search"])
+        self.assertEqual(len(es.requests[0][1].aggs.keys()), 3)
+        self.assertEqual(len(es.requests[1][1].aggs.keys()), 2)
+
+        a, b, d = [m.meta.columns.find("test", n)[0] for n in ["a", "b", "c.d"]]
+        self.assertEqual(a.count, NUM_DOCS)
+        self.assertEqual(a.cardinality, 3)
+        self.assertEqual(a.partitions, ["x", "y", "z"])
+        self.assertEqual(b.cardinality, 500)
+        self.assertEqual(b.partitions, None)  # TOO MANY TO LIST
+        self.assertEqual(d.cardinality, 2)
+        self.assertEqual(d.partitions, ["p", "q"])
+        for c in (a, b, d):
+            self.assertGreater(c.last_updated, Date.now() - HOUR)
+        self.assertTrue(m.dirty)
+
+    def test_fresh_columns_skipped(self):
+        es = _ES()
+        m = _metadata(es)
+        column = _column("a", "string")
+        column.last_updated = Date.now()
+        m.meta.columns.add(column)
+
+        m._update_cardinalities([column])
+        self.assertEqual(es.requests, [])
+
+    def test_batch_failure_retries_each_column(self):
+        es = _ES(fail_batch=True)
+        m = _metadata(es)
+        columns = [_column("a", "string"), _column("c.d", "string", ["c", "."])]
+        m.meta.columns.insert(columns)
+
+        m._update_cardinalities(columns)
+
+        # THE FAILED BATCH, THEN TWO REQUESTS FOR EACH COLUMN
+        self.assertEqual(len(es.requests), 5)
+        self.assertEqual(m.meta.columns.find("test", "a")[0].partitions, ["x", "y", "z"])
+        self.assertEqual(m.meta.columns.find("test", "c.d")[0].partitions, ["p", "q"])
+
+    def test_monitor_refreshes_asked_columns(self):
+        # THE DEFAULT CONFIGURATION: NO SCAN, BUT COLUMNS QUERIES ASK FOR ARE REFRESHED IN BATCHES
+        self.assertEqual(meta.ENABLE_META_SCAN, False)
+        es = _ES()
+        m = _metadata(es)
+        m.todo = Queue("refresh metadata", unique=True, priority=True)
+        m.refresh_batch = 100
+        columns = [_column("a", "string"), _column("b", "long"), _column("c.d", "string", ["c", "."])]
+        m.meta.columns.insert(columns)
+        m.todo.extend(columns, priority=meta.HOT)
+
+        thread = Thread.run("test monitor", m.monitor)
+        timeout = Till(seconds=5)
+        while len(es.requests) < 2 and not timeout:
+            Till(seconds=0.05).wait()
+        thread.stop()
+        thread.join()
+
+        self.assertEqual([p for p, _ in es.requests], ["/test/_search", "/test/_search"])
+        self.assertEqual(m.meta.columns.find("test", "a")[0].partitions, ["x", "y", "z"])
+
+    def test_snapshot_load(self):
+        self.snapshot(state_version=7)
+        m = _metadata(_ES(), self.cache)
+        m._load_cache()
+
+        self.assertEqual(m.table_versions, {"test": 7})
+        self.assertEqual(m.unvalidated, {"test"})
+        self.assertEqual([t.name for t in m.meta.tables.data], ["test"])
+        a = m.meta.columns.find("test", "a")[0]
+        self.assertEqual(a.partitions, ["x", "y", "z"])
+        self.assertTrue(isinstance(a.last_updated, Date))
+
+        # ONLY THE FIRST USE ASKS FOR VALIDATION
+        self.assertEqual([m._first_use("test") for _ in range(3)], [True, False, False])
+        self.assertEqual(m.default_es.requests, [])
+
+    def test_old_format_ignored(self):
+        self.cache.write(value2json({"format": meta.SNAPSHOT_FORMAT - 1, "tables": [{"name": "test"}], "columns": []}))
+        m = _metadata(_ES(), self.cache)
+        m._load_cache()
+        self.assertEqual(m.meta.tables.data, [])
+        self.assertEqual(m.unvalidated, set())
+
+    def test_validate_current(self):
+        self.snapshot(state_version=7)
+        m = _metadata(_ES(state_version=7), self.cache)
+        m._load_cache()
+        parsed = []
+        m._get_columns = lambda table: parsed.append(table)
+
+        m._validate_columns("test", None)
+        self.assertEqual(parsed, [])
+        self.assertEqual([p for p, _ in m.default_es.requests], ["/_cluster/state/version"])
+
+    def test_validate_changed(self):
+        self.snapshot(state_version=7)
+        m = _metadata(_ES(state_version=8), self.cache)
+        m._load_cache()
+        parsed = []
+        m._get_columns = lambda table: parsed.append(table)
+
+        m._validate_columns("test", None)
+        self.assertEqual(parsed, ["test"])
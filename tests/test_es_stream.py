@@ -0,0 +1,104 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_dots import wrap
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from pyLibrary.env import elasticsearch, http
+
+BULK_RESPONSE = b"""{"took": 3, "errors": true, "items": [
+    {"index": {"_index": "test", "_id": "1", "status": 201}},
+    {"index": {"_index": "test", "_id": "2", "status": 429, "error": "EsRejectedExecutionException[rejected execution]"}},
+    {"index": {"_index": "test", "_id": "3", "status": 201}}
+]}"""
+
+SHARD_FAILURE = b"""{"took": 1, "timed_out": false, "_shards": {
+    "total": 5, "successful": 4, "failed": 1,
+    "failures": [{"index": "test", "shard": 2, "reason": "NodeDisconnectedException"}]
+}, "hits": {"total": %d, "max_score": 1, "hits": [%s]}}"""
+
+NO_HITS = b"""{"took": 1, "timed_out": false, "_shards": {"total": 5, "successful": 5, "failed": 0}, "hits": {"total": 0, "max_score": null, "hits": []}}"""
+
+
+class _Raw(object):
+    def __init__(self, content):
+        self.content = content
+
+    def stream(self, amount, decode_content=None):
+        # SMALL PIECES, SO MEMBERS SPAN MANY READS
+        for i in range(0, len(self.content), 7):
+            yield self.content[i:i + 7]
+
+
+class _Response(object):
+    def __init__(self, content):
+        self.status_code = 200
+        self.raw = _Raw(content)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _cluster():
+    cluster = object.__new__(elasticsearch.Cluster)
+    cluster.settings = wrap({"host": "http://localhost", "port": 9200})
+    cluster.debug = False
+    cluster.pool = None
+    return cluster
+
+
+class TestESStream(FuzzyTestCase):
+
+    def setUp(self):
+        self.post = http.post
+        self.responses = []
+
+    def tearDown(self):
+        http.post = self.post
+
+    def respond(self, content):
+        def post(url, **kwargs):
+            response = _Response(content)
+            self.responses.append(response)
+            return response
+        http.post = post
+
+    def test_bulk_items(self):
+        self.respond(BULK_RESPONSE)
+        items = list(_cluster().post("/test/_bulk", data=b"{}\n", stream="items"))
+
+        self.assertEqual([i.index._id for i in items], ["1", "2", "3"])
+        self.assertEqual([i.index.status for i in items], [201, 429, 201])
+        self.assertTrue(self.responses[0].closed)
+
+    def test_shard_failure_with_hits(self):
+        self.respond(SHARD_FAILURE % (2, b'{"_id": "1"}, {"_id": "2"}'))
+        hits = _cluster().post("/test/_search", data={"size": 10}, stream="hits.hits")
+        self.assertRaises(Exception, list, hits)
+        self.assertTrue(self.responses[0].closed)
+
+    def test_shard_failure_without_hits(self):
+        self.respond(SHARD_FAILURE % (0, b""))
+        hits = _cluster().post("/test/_search", data={"size": 10}, stream="hits.hits")
+        try:
+            list(hits)
+            self.assertTrue(False, "expecting shard failure to be reported")
+        except Exception as e:
+            self.assertTrue("Shard failures" in e)
+        self.assertTrue(self.responses[0].closed)
+
+    def test_no_hits(self):
+        self.respond(NO_HITS)
+        hits = list(_cluster().post("/test/_search", data={"size": 10}, stream="hits.hits"))
+        self.assertEqual(hits, [])
+        self.assertTrue(self.responses[0].closed)
@@ -11,6 +11,8 @@
 from __future__ import division
 from __future__ import unicode_literals
 
+from copy import deepcopy
+
 from jx_base.queries import is_variable_name
 from mo_testing.fuzzytestcase import FuzzyTestCase
 from mo_times.dates import Date
@@ -81,4 +83,27 @@ class TestESFilters(FuzzyTestCase):
         result = simplify_esfilter(jx_expression(where).to_esfilter())
         self.assertEqual(result, {"terms": {"a": [1, 2]}})
 
-
+    def test_nested_and_repeated(self):
+        esfilter = {"and": [
+            {"and": [{"range": {"a": {"gt": 20}}}, {"term": {"b": 1}}]},
+            {"or": [{"or": [{"term": {"c": 1}}, {"term": {"c": 2}}]}]},
+            {"range": {"a": {"lt": 40}}}
+        ]}
+        expected = [
+            {"range": {"a": {"gt": 20, "lt": 40}}},
+            {"term": {"b": 1}},
+            {"or": [{"term": {"c": 1}}, {"term": {"c": 2}}]}
+        ]
+        if USE_BOOL_MUST:
+            expected = {"bool": {"must": expected}}
+        else:
+            expected = {"and": expected}
+
+        original = deepcopy(esfilter)
+        self.assertEqual(simplify_esfilter(esfilter), expected)
+        self.assertEqual(esfilter, original)  # NOT CHANGED
+        result = simplify_esfilter(esfilter)  # SECOND TIME IS FROM normalized
+        self.assertEqual(result, expected)
+        result.bool = None
+        result["and"] = None
+        self.assertEqual(simplify_esfilter(esfilter), expected)
@@ -0,0 +1,53 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import jx_python.expressions
+from jx_base.expressions import jx_expression_to_function
+from jx_python.expression_compiler import Superset
+from mo_dots import wrap
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times.dates import Date
+
+
+class TestExpressions(FuzzyTestCase):
+
+    def test_in_many(self):
+        values = ["b" + unicode(i) for i in range(2000)]
+        f = jx_expression_to_function({"in": {"branch": values}})
+        self.assertEqual(
+            [f(wrap({"branch": b})) for b in ["b0", "b1999", "b2000", None]],
+            [True, True, False, False]
+        )
+
+    def test_in_unhashable(self):
+        f = jx_expression_to_function({"in": {"a": [[1, 2], 3, "x\"y"]}})
+        self.assertEqual(
+            [f(wrap({"a": a})) for a in [[1, 2], 3, "x\"y", 4]],
+            [True, True, True, False]
+        )
+
+    def test_eq_literal_list(self):
+        f = jx_expression_to_function({"eq": [{"literal": [1, 2, 3]}, "a"]})
+        self.assertEqual([f(wrap({"a": a})) for a in [2, 5]], [True, False])
+
+    def test_in_dates(self):
+        # Date EQUALS ITS unix TIMESTAMP, BUT DOES NOT HASH LIKE IT
+        f = jx_expression_to_function({"in": {"timestamp": [1500000000, 1500000060]}})
+        self.assertEqual(
+            [f(wrap({"timestamp": t})) for t in [Date(1500000000), Date(1500000060), Date(1500000001), 1500000000]],
+            [True, True, False, True]
+        )
+
+    def test_superset_mixed(self):
+        values = Superset([1500000000, "a", [1, 2]])
+        self.assertEqual([v in values for v in [Date(1500000000), "a", [1, 2], 2]], [True, True, True, False])
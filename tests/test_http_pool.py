@@ -0,0 +1,110 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from threading import Thread as PythonThread
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Thread, Till
+from pyLibrary.env import http
+
+BODY = b"x" * 100000
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = b"HTTP/1.1"  # KEEP-ALIVE
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header(b"Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header(b"Content-Length", str(len(BODY)))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # CLIENTS CLOSE KEEP-ALIVE CONNECTIONS
+
+
+class TestSessionPool(FuzzyTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        http.default_headers = {"From": "test"}
+        cls.server = _Server((b"localhost", 0), _Handler)
+        cls.url = "http://localhost:" + unicode(cls.server.server_port) + "/"
+        thread = PythonThread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_held_until_read(self):
+        pool = http.SessionPool("test", size=1)
+        response = http.get(self.url, pool=pool)
+        self.assertEqual(pool.stats, {"open": 1, "idle": 0})
+
+        # THE ONLY SESSION IS STILL READING, SO ANOTHER REQUEST MUST WAIT
+        def other(please_stop):
+            return len(http.get(self.url, pool=pool).content)
+        thread = Thread.run("other request", other)
+        Till(seconds=0.2).wait()
+        self.assertEqual(pool.stats, {"open": 1, "idle": 0, "waits": 1})
+
+        self.assertEqual(len(response.content), len(BODY))
+        self.assertEqual(thread.join(), len(BODY))
+        self.assertEqual(pool.stats, {"open": 1, "idle": 1, "hits": 1, "new": 1, "waits": 1})
+
+    def test_close_releases(self):
+        pool = http.SessionPool("test", size=1)
+        response = http.get(self.url, pool=pool)
+        response.close()
+        response.close()  # ONLY RELEASED ONCE
+        self.assertEqual(pool.stats, {"open": 1, "idle": 1})
+        http.get(self.url, pool=pool).close()
+        self.assertEqual(pool.stats, {"open": 1, "idle": 1, "hits": 1, "new": 1})
+
+    def test_failure_discards(self):
+        pool = http.SessionPool("test", size=1)
+        self.assertRaises(Exception, http.get, "http://localhost:1/", pool=pool)
+        self.assertEqual(pool.stats, {"open": 0, "idle": 0, "expired": 1})
+
+    def test_head_released(self):
+        pool = http.SessionPool("test", size=1)
+        response = http.head(self.url, pool=pool)
+        self.assertEqual(pool.stats, {"open": 1, "idle": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(http.get(self.url, pool=pool).content), len(BODY))
+
+    def test_acquire_timeout(self):
+        pool = http.SessionPool("test", size=1, timeout=0.5)
+        response = http.get(self.url, pool=pool)  # NEVER READ
+
+        self.assertRaises(Exception, http.get, self.url, pool=pool)
+        self.assertEqual(pool.stats, {"open": 1, "idle": 0, "waits": 1})
+        response.close()
+        self.assertEqual(pool.stats, {"open": 1, "idle": 1})
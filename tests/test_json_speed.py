@@ -0,0 +1,107 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import json
+import random
+from decimal import Decimal
+
+from mo_dots import wrap, Null, FlatList
+from mo_json import json2value
+from mo_json.encoder import utf8_json_encoder, json_encoder
+from mo_logs import Log
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times.dates import Date
+from mo_times.durations import DAY, SECOND
+from mo_times.timer import Timer
+from pyLibrary.convert import unicode2utf8, value2json
+
+NUM_ROWS = 5000
+
+
+class TestJSONSpeed(FuzzyTestCase):
+    """
+    COMPARE THE scrub()ING ENCODER TO utf8_json_encoder ON RESPONSE SHAPES
+    THAT /query RETURNS
+    """
+
+    def test_list_response(self):
+        self._compare("list", wrap({
+            "meta": {"format": "list", "timing": {"total": "{{TOTAL_TIME}}"}},
+            "data": FlatList([
+                {
+                    "build": {"branch": random.choice(["mozilla-central", "try", "autoland"]), "revision": "%012x" % random.getrandbits(48), "date": Date.now() - i * SECOND},
+                    "run": {"suite": "mochitest", "chunk": random.randint(1, 20), "duration": random.randint(1, 100) * SECOND},
+                    "result": {"test": "dom/tests/test_" + unicode(i) + ".html", "ok": random.random() > 0.1, "duration": random.random() * 10, "missing": Null},
+                    "etl": {"id": Decimal(i)}
+                }
+                for i in range(NUM_ROWS)
+            ])
+        }))
+
+    def test_cube_response(self):
+        self._compare("cube", wrap({
+            "meta": {"format": "cube"},
+            "edges": [
+                {"name": "date", "domain": {"type": "time", "min": Date.today() - 30 * DAY, "max": Date.today(), "interval": DAY, "partitions": [{"min": Date.today() - (30 - i) * DAY, "max": Date.today() - (29 - i) * DAY} for i in range(30)]}},
+                {"name": "branch", "domain": {"type": "set", "partitions": [{"name": b, "value": b} for b in ["mozilla-central", "try", "autoland"]]}}
+            ],
+            "data": {
+                "count": [[random.randint(0, 1000) for _ in range(4)] for _ in range(31)],
+                "duration": [[random.random() * 100 for _ in range(4)] for _ in range(31)]
+            }
+        }))
+
+    def test_scrub_rules(self):
+        self.assertEqual(utf8_json_encoder({"a": float("nan"), "b": 1}), b'{"b": 1}')
+        self.assertEqual(utf8_json_encoder({"a": "é"}), b'{"a": "\\u00e9"}')
+        self.assertEqual(utf8_json_encoder({"a": None, "b": Null, "c": "  ", "d": " x "}), b'{"d": "x"}')
+        self.assertEqual(utf8_json_encoder([None, "", " y", float("inf")]), b'[null, null, "y", null]')
+        self.assertEqual(utf8_json_encoder(wrap({"a": {"b": None}})), b'{"a": {}}')
+
+    def test_same_as_value2json(self):
+        values = [
+            wrap({
+                "meta": {"format": "table", "es_query": {"size": 10, "sort": [], "fields": None}, "timing": {"es": 0.25}, "error": None},
+                "header": ["a", "b.c", "d"],
+                "data": [[1, " padded ", None], [2.5, "", Null], [Decimal("3.25"), "é\t\n", [1, "x "]]]
+            }),
+            wrap({
+                "meta": {"format": "list"},
+                "data": [
+                    {"a": {"b": None, "c": {}}, "d": Date("2017-01-01"), "e": 5 * SECOND, "f": set([3]), "g": (1, 2)},
+                    {"a": Null, "h": "   ", "i": float("nan"), "j": True, "k": 2 ** 64, "l": [{"m": None}]}
+                ]
+            }),
+            {"name": b"utf8 \xc3\xa9", "value": [b"", b" x "], "e": {"f": set(["z"])}},
+            "  top level  ",
+            None
+        ]
+        for value in values:
+            expected = json.loads(unicode2utf8(value2json(value)).decode("utf8"))
+            result = utf8_json_encoder(value)
+            self.assertIsInstance(result, str)
+            self.assertTrue(json.loads(result.decode("utf8")) == expected, "expecting same as value2json for " + repr(value))
+
+    def _compare(self, name, value):
+        with Timer("scrub " + name, silent=True) as slow:
+            expected = unicode2utf8(json_encoder(value))
+        with Timer("fast " + name, silent=True) as fast:
+            result = utf8_json_encoder(value)
+        Log.note(
+            "{{name}} response: scrub {{slow}}, fast {{fast}}",
+            name=name,
+            slow=slow.duration.seconds,
+            fast=fast.duration.seconds
+        )
+        self.assertIsInstance(result, str)
+        self.assertEqual(json2value(result.decode("utf8")), json2value(expected.decode("utf8")))
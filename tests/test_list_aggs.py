@@ -0,0 +1,113 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_python.lists import aggs
+from jx_python.lists.aggs import list_aggs
+from jx_python.query import QueryOp
+
+DATA = [
+    {"a": 1, "b": {"c": "x", "d": 2}},
+    {"a": 2, "b": {"c": "y", "d": 4}},
+    {"a": 1, "b": {"c": "y"}},
+    {"a": None, "b": {"c": "x", "d": 8}},
+    {"a": 2, "b": {"c": "x", "d": 16}}
+]
+
+
+class TestListAggs(FuzzyTestCase):
+
+    def test_edges(self):
+        cube = self._aggs({
+            "select": [
+                {"name": "count", "aggregate": "count"},
+                {"name": "sum", "value": "b.d", "aggregate": "sum"},
+                {"name": "max", "value": "b.d", "aggregate": "max"},
+                {"name": "avg", "value": "b.d", "aggregate": "average"}
+            ],
+            "edges": ["a"]
+        })
+        self.assertEqual(cube.edges[0].domain.partitions.value, [1, 2])
+        self.assertEqual(cube.data["count"].cube, [2, 2, 1])
+        self.assertEqual(cube.data["sum"].cube, [2, 20, 8])
+        self.assertEqual(cube.data["max"].cube, [2, 16, 8])
+        self.assertEqual(cube.data["avg"].cube, [2, 10, 8])
+
+    def test_empty_cells(self):
+        cube = self._aggs({
+            "select": [
+                {"name": "count", "aggregate": "count"},
+                {"name": "min", "value": "b.d", "aggregate": "min"}
+            ],
+            "edges": [{"name": "a", "value": "a", "allowNulls": False}, "b.c"],
+            "where": {"neq": {"b.d": 16}}
+        })
+        self.assertEqual(cube.data["count"].cube, [[1, 0], [0, 1]])
+        self.assertEqual(cube.data["min"].cube, [[2, None], [None, 4]])
+
+    def test_groupby(self):
+        result = self._aggs({
+            "select": {"name": "count", "aggregate": "count"},
+            "groupby": ["b.c", "a"]
+        })
+        self.assertEqual(result, [
+            {"b": {"c": "x"}, "a": 1, "count": 1},
+            {"b": {"c": "x"}, "a": 2, "count": 1},
+            {"b": {"c": "x"}, "a": None, "count": 1},
+            {"b": {"c": "y"}, "a": 1, "count": 1},
+            {"b": {"c": "y"}, "a": 2, "count": 1}
+        ])
+
+    def test_time_edge(self):
+        data = [{"t": 1483228800 + h * 3600, "v": h} for h in range(-2, 50)] + [{"v": 100}]
+        cube = self._aggs({
+            "select": {"name": "sum", "value": "v", "aggregate": "sum"},
+            "edges": [{
+                "name": "t",
+                "value": "t",
+                "domain": {"type": "time", "min": "2017-01-01", "max": "2017-01-03", "interval": "day"}
+            }]
+        }, data)
+        self.assertEqual(cube.data["sum"].cube, [sum(range(24)), sum(range(24, 48)), 48 + 49 - 3 + 100])
+
+    def test_percentile(self):
+        cube = self._aggs({
+            "select": [
+                {"name": "median", "value": "b.d", "aggregate": "median"},
+                {"name": "p90", "value": "b.d", "aggregate": "percentile", "percentile": 0.9},
+                {"name": "min", "value": "b.d", "aggregate": "min"}
+            ],
+            "edges": ["b.c"]
+        })
+        self.assertEqual(cube.data["median"].cube, [8, 4, None])
+        self.assertAlmostEqual(cube.data["p90"].cube[0], 14.4)
+        self.assertEqual(cube.data["min"].cube, [2, 4, None])
+
+    def test_running_cells(self):
+        select = QueryOp.wrap({"from": DATA, "select": [
+            {"name": "sum", "value": "b.d", "aggregate": "sum"},
+            {"name": "median", "value": "b.d", "aggregate": "median"}
+        ]}).select
+        cells = aggs._collect(DATA, [], select, [], [aggs._accumulator(s) for s in select])
+
+        # ONLY THE median KEEPS THE VALUES
+        total, median = cells[()]
+        self.assertFalse(hasattr(total, "__dict__"))
+        self.assertEqual(total.end(), 30)
+        self.assertEqual(len(median.total), 4)
+        self.assertEqual(median.end(), 6)
+
+    def _aggs(self, query, data=DATA):
+        query["from"] = data
+        return list_aggs(data, QueryOp.wrap(query))
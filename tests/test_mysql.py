@@ -0,0 +1,171 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from pymysql import converters
+
+from mo_dots import wrap
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Thread, Till
+from pyLibrary.sql import mysql
+from pyLibrary.sql.mysql import MySQL
+
+ROWS = [(1, "x"), (2, "y"), (3, "z")]
+
+
+class _Cursor(object):
+    """
+    LIKE AN SSCursor: A NEW STATEMENT CAN NOT BE SENT UNTIL ALL ROWS ARE READ
+    """
+    description = [("a",), ("b",)]
+
+    def __init__(self, db):
+        self.db = db
+        self.rows = iter([])
+        self.unread = 0
+
+    def execute(self, sql):
+        if self.unread:
+            raise Exception("Commands out of sync; you can't run this command now")
+        self.db.log.append(sql)
+        self.unread = len(ROWS)
+        self.rows = iter(ROWS)
+
+    def executemany(self, sql, args):
+        if self.unread:
+            raise Exception("Commands out of sync; you can't run this command now")
+        self.db.log.append((sql, args))
+
+    def __iter__(self):
+        for r in self.rows:
+            self.unread -= 1
+            yield r
+
+    def close(self):
+        self.db.log.append("close cursor")
+
+
+class _Connection(object):
+    def __init__(self, **kwargs):
+        self.log = []
+        self.closed = False
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+    def close(self):
+        self.closed = True
+
+    def literal(self, value):
+        return converters.escape_item(value, "utf8")
+
+
+class TestMySQL(FuzzyTestCase):
+
+    def setUp(self):
+        self.connect = mysql.connect
+        self.connections = []
+
+        def connect(**kwargs):
+            db = _Connection(**kwargs)
+            self.connections.append(db)
+            return db
+        mysql.connect = connect
+        mysql.pools.clear()
+
+    def tearDown(self):
+        mysql.connect = self.connect
+        mysql.pools.clear()
+
+    def _db(self, **kwargs):
+        settings = dict(host="localhost", username="test", password="test", schema="test", chunk_size=2)
+        settings.update(kwargs)
+        return MySQL(settings)
+
+    def test_chunked_insert(self):
+        db = self._db()
+        with db.transaction():
+            db.insert_list("t", wrap([{"a": i, "b": "v" + unicode(i)} for i in range(5)]))
+
+        inserts = [l for l in self.connections[0].log if isinstance(l, tuple)]
+        self.assertEqual([len(args) for _, args in inserts], [2, 2, 1])
+        self.assertEqual(inserts[0][0], "INSERT INTO `t` (`a`, `b`) VALUES (%s,%s)")
+        self.assertEqual(inserts[2][1], [[4, "v4"]])
+        self.assertTrue("commit" in self.connections[0].log)
+
+    def test_staging_table(self):
+        db = self._db()
+        with db.transaction():
+            db.insert_newlist("s.t", ["a"], wrap([{"a": 1, "b": 2}, {"a": 1, "b": 3}, {"a": None, "b": 4}]))
+
+        log = [l if isinstance(l, tuple) else l.strip() for l in self.connections[0].log if l not in ["close cursor", "commit"]]
+        statements = "\n".join(l for l in log if not isinstance(l, tuple))
+        self.assertTrue("DROP TEMPORARY TABLE IF EXISTS `__new_t`" in statements)
+        self.assertTrue("CREATE TEMPORARY TABLE `__new_t` LIKE `s`.`t`" in statements)
+        self.assertTrue("WHERE NOT EXISTS (SELECT 1 FROM `s`.`t` t WHERE `t`.`a`<=>`s`.`a`)" in statements)
+
+        # ONE BULK INSERT INTO THE STAGING TABLE, FIRST RECORD OF EACH KEY ONLY
+        inserts = [l for l in log if isinstance(l, tuple)]
+        self.assertEqual(inserts, [("INSERT INTO `__new_t` (`a`, `b`) VALUES (%s,%s)", [[1, 2], [None, 4]])])
+
+    def test_pool_release(self):
+        db = self._db(pool_size=1)
+        other = self._db(pool_size=1)
+        self.assertTrue(db.pool is other.pool)
+
+        self.assertEqual(db.query("SELECT a, b FROM t"), [{"a": 1, "b": "x"}, {"a": 2, "b": "y"}, {"a": 3, "b": "z"}])
+        self.assertEqual(db.pool.num_connections, 1)
+        self.assertEqual(len(db.pool.available), 1)
+
+        # AN UNFINISHED READ DROPS THE CONNECTION, AND ANOTHER ONE IS MADE
+        rows = db.stream("SELECT a, b FROM t")
+        next(rows)
+        rows.close()
+        self.assertTrue(self.connections[0].closed)
+        self.assertEqual(db.pool.num_connections, 0)
+        self.assertEqual(other.query("SELECT a, b FROM t")[0], {"a": 1, "b": "x"})
+        self.assertEqual(len(self.connections), 2)
+
+    def test_early_close_in_transaction(self):
+        db = self._db()
+        with db.transaction():
+            rows = db.stream("SELECT a, b FROM t")
+            next(rows)
+            rows.close()
+            # THE REST OF THE RESULT WAS READ, SO THE TRANSACTION CAN CONTINUE
+            self.assertEqual(db.query("SELECT a, b FROM t")[2], {"a": 3, "b": "z"})
+
+    def test_pool_timeout(self):
+        db = self._db(pool_size=1, pool_timeout=0.5)
+        other = self._db(pool_size=1)
+        with db.transaction():
+            self.assertRaises(Exception, other.query, "SELECT a, b FROM t")
+
+    def test_pool_waits_for_release(self):
+        db = self._db(pool_size=1)
+        db.begin()
+
+        def release(please_stop):
+            Till(seconds=0.5).wait()
+            db.commit()
+        thread = Thread.run("release", release)
+
+        other = self._db(pool_size=1)
+        self.assertEqual(len(other.query("SELECT a, b FROM t")), 3)
+        thread.join()
+        self.assertEqual(len(self.connections), 1)
@@ -0,0 +1,155 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import re
+
+from jx_elasticsearch.es14 import aggs
+from jx_elasticsearch.scheduler import Scheduler
+from mo_dots import wrap
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Lock
+
+NUM_PAGES = 3
+
+# THE PAGE EACH TERM HASHES TO
+TERM_PAGE = {"a": 0, "d": 0, "g": 0, "b": 1, "e": 1, "c": 2, "f": 2, "h": 2}
+
+# THE term VALUES OF EACH DOCUMENT; SOME ARE MULTI-VALUED, SOME HAVE NONE
+DOCS = (
+    [["a"]] * 4 + [["a", "b"]] + [["d"]] + [["g"]] * 9 +
+    [["b"]] * 5 + [["b", "h", "e"]] + [["e"]] +
+    [["c"]] * 3 + [["f"]] * 8 + [["h"]] * 3 +
+    [[]] * 6
+)
+
+
+class _ES(object):
+    """
+    RUN EACH PAGE'S SCRIPTS OVER DOCS, AS ES WOULD
+    """
+
+    def __init__(self):
+        self.locker = Lock()
+        self.pages = []
+
+    def search(self, query):
+        script = query.aggs._filter.filter.script.script
+        page = int(re.search(r"== (\d+) }$", script).group(1))
+        with self.locker:
+            self.pages.append(page)
+
+        agg = query.aggs._filter.aggs
+        if ".values.any" in script:
+            in_page = lambda values: any(TERM_PAGE[v] == page for v in values)
+        else:
+            in_page = lambda values: TERM_PAGE[values[0]] == page
+        if agg._match.terms.script:
+            bucket_values = lambda values: [v for v in values if TERM_PAGE[v] == page]
+        else:
+            bucket_values = lambda values: values
+
+        counts = {}
+        missing = 0
+        for values in DOCS:
+            if not values:
+                missing += 1 if script.startswith('doc["term"].empty ? true') else 0
+            elif in_page(values):
+                for v in bucket_values(values):
+                    counts[v] = counts.get(v, 0) + 1
+
+        buckets = [{"key": k, "doc_count": c} for k, c in sorted(counts.items(), key=lambda p: -p[1])]
+        return wrap({
+            "hits": {"total": len(DOCS)},
+            "aggregations": {"_filter": {"_match": {"buckets": buckets}, "_missing": {"doc_count": missing}}}
+        })
+
+
+def _decoder(sorted=None, limit=10):
+    return wrap({"edge": {"value": {"var": "term"}}, "sorted": sorted, "domain": {"limit": limit}})
+
+
+class TestPagedAggs(FuzzyTestCase):
+
+    def test_merge_by_count(self):
+        es = _ES()
+        es_query = wrap({"aggs": {"_match": {"terms": {"field": "term"}}}})
+        result = aggs.paged_post(Scheduler("test"), es, es_query, wrap({"limit": 10}), _decoder(limit=5), NUM_PAGES)
+
+        self.assertEqual(sorted(es.pages), range(NUM_PAGES))
+        self.assertEqual([b["key"] for b in result.aggregations._match.buckets], ["g", "f", "b", "a", "h"])
+        self.assertEqual(result.aggregations._missing.doc_count, 6)
+        self.assertEqual(result.hits.total, len(DOCS))
+
+    def test_multi_valued(self):
+        es = _ES()
+        es_query = wrap({"aggs": {"_match": {"terms": {"field": "term"}}}})
+        result = aggs.paged_post(Scheduler("test"), es, es_query, wrap({"limit": 10}), _decoder(limit=10), NUM_PAGES)
+
+        # EACH TERM ONCE, COUNTING EVERY DOCUMENT THAT HAS IT
+        expected = {}
+        for values in DOCS:
+            for v in values:
+                expected[v] = expected.get(v, 0) + 1
+        buckets = result.aggregations._match.buckets
+        self.assertEqual(sorted(b["key"] for b in buckets), sorted(expected.keys()))
+        self.assertEqual({b["key"]: b["doc_count"] for b in buckets}, expected)
+
+    def test_merge_by_key(self):
+        es = _ES()
+        es_query = wrap({"aggs": {"_match": {"terms": {"field": "term"}}}})
+        result = aggs.paged_post(Scheduler("test"), es, es_query, wrap({"limit": 10}), _decoder(sorted=-1, limit=4), NUM_PAGES)
+        self.assertEqual([b["key"] for b in result.aggregations._match.buckets], ["h", "g", "f", "e"])
+
+    def test_page_filters(self):
+        es = _ES()
+        es_query = wrap({"aggs": {"_match": {"terms": {"field": "term"}}}})
+        queries = []
+
+        def post(es, query, limit):
+            queries.append(query)
+            return es.search(query)
+
+        original, aggs.es09.util.post = aggs.es09.util.post, post
+        try:
+            aggs.paged_post(Scheduler("test", max_workers=1), es, es_query, wrap({"limit": 10}), _decoder(), NUM_PAGES)
+        finally:
+            aggs.es09.util.post = original
+
+        # ONLY THE FIRST PAGE KEEPS THE DOCUMENTS WITH NO VALUE
+        scripts = [q.aggs._filter.filter.script.script for q in queries]
+        self.assertEqual([s.startswith('doc["term"].empty ? true') for s in scripts], [True, False, False])
+        self.assertEqual([q.aggs._filter.aggs._match.terms.field for q in queries], [None] * NUM_PAGES)
+        self.assertEqual(
+            [q.aggs._filter.aggs._match.terms.script for q in queries],
+            ['doc["term"].values.findAll{ Math.abs(it.hashCode() % 3) == ' + unicode(i) + ' }' for i in range(NUM_PAGES)]
+        )
+        self.assertEqual(es_query.aggs._match.terms, {"field": "term"})  # ORIGINAL IS NOT CHANGED
+
+    def test_where_clause(self):
+        es = _ES()
+        es_query = wrap({"aggs": {"_filter": {"filter": {"term": {"b": 1}}, "aggs": {"_match": {"terms": {"field": "term"}}}}}})
+        queries = []
+
+        def post(es, query, limit):
+            queries.append(query)
+            return wrap({"hits": {"total": 0}, "aggregations": {}})
+
+        original, aggs.es09.util.post = aggs.es09.util.post, post
+        try:
+            aggs.paged_post(Scheduler("test", max_workers=1), es, es_query, wrap({"limit": 10}), _decoder(), NUM_PAGES)
+        finally:
+            aggs.es09.util.post = original
+
+        for q in queries:
+            self.assertEqual(q.aggs._filter.aggs._filter.filter, {"term": {"b": 1}})
+            self.assertTrue(q.aggs._filter.aggs._filter.aggs._match.terms.script.startswith('doc["term"].values.findAll'))
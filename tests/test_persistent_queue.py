@@ -0,0 +1,117 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+
+from mo_collections import persistent_queue
+from mo_collections.persistent_queue import PersistentQueue
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Thread
+
+
+class TestPersistentQueue(FuzzyTestCase):
+
+    def setUp(self):
+        persistent_queue.DEBUG = False
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "queue.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def crash(self, queue):
+        # STOP WRITING, BUT DO NOT close()
+        queue.writer.please_stop.go()
+        queue.writer.join()
+
+    def test_restart(self):
+        queue = PersistentQueue(self.filename, segment_size=10)
+        queue.extend({"i": i} for i in range(25))
+        self.assertEqual([queue.pop().i for _ in range(12)], range(12))
+        queue.commit()
+        queue.pop()
+        queue.rollback()
+        self.crash(queue)
+
+        with open(self.filename + ".2", "ab") as f:
+            f.write(b'{"i": 2')  # INCOMPLETE WRITE
+
+        queue = PersistentQueue(self.filename)
+        self.assertEqual(len(queue), 13)
+        self.assertFalse(os.path.exists(self.filename + ".0"))  # COMPACTED
+        queue.add({"i": 25})
+        self.assertEqual([v.i for v in queue.pop_all()], range(12, 26))
+        queue.close()
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_many_producers(self):
+        queue = PersistentQueue(self.filename, segment_size=100)
+
+        def producer(n, please_stop):
+            for i in range(100):
+                queue.add({"n": n, "i": i})
+
+        threads = [Thread.run("producer " + unicode(n), producer, n) for n in range(10)]
+        for t in threads:
+            t.join()
+        queue.close()
+
+        queue = PersistentQueue(self.filename)
+        values = queue.pop_all()
+        self.assertEqual(len(values), 1000)
+        for n in range(10):
+            self.assertEqual([v.i for v in values if v.n == n], range(100))
+        queue.close()
+
+    def test_delta_log(self):
+        with open(self.filename, "wb") as f:
+            f.write(
+                b'{"add": {"status": {"start": 0, "end": 0}}}\n'
+                b'{"add": {"0": "a"}}\n{"add": {"status.end": 1}}\n'
+                b'{"add": {"1": "b"}}\n{"add": {"status.end": 2}}\n'
+                b'{"add": {"status.start": 1}}\n{"remove": "0"}\n'
+            )
+        queue = PersistentQueue(self.filename)
+        self.assertEqual(queue.pop_all(), ["b"])
+        queue.close()
+
+    def test_empty_file(self):
+        open(self.filename, "wb").close()
+        queue = PersistentQueue(self.filename)
+        self.assertEqual(len(queue), 0)
+        queue.add("a")
+        self.assertEqual(queue.pop_all(), ["a"])
+        queue.close()
+
+    def test_damaged_delta_log(self):
+        with open(self.filename, "wb") as f:
+            f.write(
+                b'{"add": {"status": {"sta\n'
+                b'{"add": {"0": "a"}}\n{"add": {"status.end": 1}}\n'
+                b'{"add": {"1": "b"}}\n{"add": {"status.end": 2}}\n'
+                b'{"add": {"status.start": 1}}\n{"remove": "0"}\n'
+            )
+        queue = PersistentQueue(self.filename)
+        self.assertEqual(queue.pop_all(), ["b"])
+        queue.close()
+
+    def test_extend_after_writer_stops(self):
+        queue = PersistentQueue(self.filename)
+        queue.add("a")
+        self.crash(queue)
+
+        # NOTHING WILL WRITE THESE, SO extend() MUST FAIL, NOT WAIT
+        self.assertRaises(Exception, queue.extend, ["b", "c"])
+        self.assertEqual(queue.pop_all(), ["a"])
@@ -0,0 +1,84 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from active_data.actions.query_cache import ResultCache
+from jx_elasticsearch import jx_usingES
+from jx_elasticsearch.jx_usingES import FromES
+from jx_python.containers import Container
+from mo_collections.lru_cache import LruCache
+from mo_dots import wrap
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Till
+
+
+class _Container(object):
+    def __init__(self):
+        self.name = "test"
+        self.generation = 0
+
+    def get_generation(self):
+        return self.generation
+
+
+class _Cluster(object):
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, path, timeout=None):
+        self.calls += 1
+        return wrap({"_all": {"total": {"refresh": {"total": self.calls}}}})
+
+
+class TestQueryCache(FuzzyTestCase):
+
+    def test_lru_eviction(self):
+        cache = LruCache(max_size=3)
+        for k in "abc":
+            cache[k] = k
+        cache.get("a")  # a IS NOW THE MOST RECENT
+        cache["d"] = "d"
+        self.assertEqual([k in cache for k in "abcd"], [True, False, True, True])
+        self.assertEqual(cache.stats, {"size": 3, "hits": 1, "misses": 0, "evictions": 1})
+
+    def test_lru_timeout(self):
+        cache = LruCache(timeout=0.1)
+        cache["a"] = 1
+        self.assertEqual(cache.get("a"), 1)
+        Till(seconds=0.2).wait()
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.stats, {"size": 0, "hits": 1, "misses": 1, "evictions": 1})
+
+    def test_generation_invalidates(self):
+        cache = ResultCache(max_size=10)
+        frum = _Container()
+        query = wrap({"select": "a", "where": {"eq": {"b": 1}}, "format": "list"})
+
+        key = cache.key(query, frum)
+        cache.add(key, b'{"data": []}', "application/json")
+        self.assertEqual(cache.get(cache.key(query, frum)), (b'{"data": []}', "application/json"))
+
+        frum.generation += 1  # INDEX WAS REFRESHED
+        self.assertEqual(cache.get(cache.key(query, frum)), None)
+
+    def test_generation_not_asked_per_query(self):
+        jx_usingES.generations.clear()
+        frum = Container.__new__(FromES)
+        cluster = _Cluster()
+        frum._es = wrap({"settings": {"index": "test"}})
+        frum._es.cluster = cluster
+
+        self.assertEqual([frum.get_generation() for _ in range(10)], [1] * 10)
+        self.assertEqual(cluster.calls, 1)
+
+        Till(seconds=jx_usingES.GENERATION_TIMEOUT + 0.1).wait()
+        self.assertEqual(frum.get_generation(), 2)
@@ -0,0 +1,52 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Queue, Till, THREAD_STOP
+
+
+class TestQueues(FuzzyTestCase):
+
+    def test_unique(self):
+        q = Queue("test", max=1000, unique=True, silent=True)
+        q.extend([1, 2, 3, 2, 1])
+        q.add(3)
+        self.assertEqual(len(q), 3)
+        self.assertEqual(q.pop(), 1)
+        q.add(1)  # NO LONGER IN QUEUE, SO ADDED AGAIN
+        self.assertEqual(q.pop_all(), [2, 3, 1])
+        q.add(2)
+        self.assertEqual(q.pop_all(), [2])
+
+    def test_priority(self):
+        q = Queue("test", max=1000, priority=True, silent=True)
+        q.add("c", priority=2)
+        q.add("a", priority=1)
+        q.add("b", priority=1)
+        q.push("first")
+        self.assertEqual(q.pop_all(), ["first", "a", "b", "c"])
+
+    def test_unique_priority(self):
+        q = Queue("test", max=1000, unique=True, priority=True, silent=True)
+        q.extend(["a", "b", "c", "d"], priority=1)
+        q.add("c", priority=0)  # PROMOTED
+        q.add("a", priority=2)  # NOT DEMOTED
+        q.push("d")
+        self.assertEqual(len(q), 4)
+        self.assertEqual(q.pop(), "d")
+        self.assertEqual(q.pop_all(max=2), ["c", "a"])
+        q.add("c")
+        self.assertEqual(q.pop_all(), ["c", "b"])
+        self.assertEqual(q.pop(till=Till(seconds=0.01)), None)
+        q.add(THREAD_STOP)
+        self.assertEqual(q.pop(), THREAD_STOP)
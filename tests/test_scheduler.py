@@ -0,0 +1,105 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from jx_elasticsearch import scheduler
+from jx_elasticsearch.scheduler import Scheduler
+from mo_dots import wrap
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Lock, Signal, ThreadPool, Till
+
+
+class _ES(object):
+    """
+    ANSWERS EVERY SEARCH AFTER A SHORT DELAY, COUNTING THE REQUESTS IN FLIGHT
+    """
+
+    def __init__(self):
+        self.locker = Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.searched = []
+
+    def search(self, query):
+        with self.locker:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            Till(seconds=0.05).wait()
+            if query.fail:
+                raise Exception("shard failure")
+            with self.locker:
+                self.searched.append(query.id)
+            return wrap({"hits": {"total": query.id}})
+        finally:
+            with self.locker:
+                self.in_flight -= 1
+
+
+class TestScheduler(FuzzyTestCase):
+
+    def test_order_and_concurrency(self):
+        es = _ES()
+        requests = Scheduler("test", max_workers=3)
+        for i in range(9):
+            requests.add("request " + unicode(i), es.search, wrap({"id": i}))
+        responses = requests.run()
+
+        self.assertEqual([r.hits.total for r in responses], range(9))
+        self.assertEqual(es.max_in_flight, 3)
+        self.assertEqual(len(requests.timing.keys()), 9)
+
+    def test_error_propagates(self):
+        es = _ES()
+        requests = Scheduler("test", max_workers=2)
+        requests.add("good", es.search, wrap({"id": 0}))
+        requests.add("bad", es.search, wrap({"id": 1, "fail": True}))
+        for i in range(2, 20):
+            requests.add("request " + unicode(i), es.search, wrap({"id": i}))
+
+        try:
+            requests.run()
+            self.assertTrue(False, "expecting error")
+        except Exception as e:
+            self.assertTrue("shard failure" in e, "expecting cause to be reported")
+
+        # NO NEW REQUESTS ARE STARTED AFTER THE FAILURE
+        self.assertLess(len(es.searched), 5)
+
+    def test_helpers_never_started(self):
+        # THE ONLY POOL WORKER IS BUSY, SO THE CALLER DOES ALL THE REQUESTS
+        release = Signal()
+        busy = ThreadPool("busy", num_workers=1)
+        busy.submit("blocker", lambda please_stop: (release | please_stop).wait())
+        old_pool, scheduler._pool = scheduler._pool, busy
+        try:
+            es = _ES()
+            requests = Scheduler("test", max_workers=3)
+            for i in range(4):
+                requests.add("request " + unicode(i), es.search, wrap({"id": i}))
+            # THE POOL STOPS BEFORE THE QUEUED HELPERS START
+            requests.add("stop pool", lambda: busy.please_stop.go())
+            responses = requests.run()
+
+            self.assertEqual([r.hits.total for r in responses[:4]], range(4))
+            self.assertEqual(es.max_in_flight, 1)
+        finally:
+            scheduler._pool = old_pool
+            release.go()
+
+    def test_single_worker(self):
+        es = _ES()
+        requests = Scheduler("test", max_workers=1)
+        requests.add("bad", es.search, wrap({"id": 0, "fail": True}))
+        requests.add("never", es.search, wrap({"id": 1}))
+        self.assertRaises(Exception, requests.run)
+        self.assertEqual(es.searched, [])
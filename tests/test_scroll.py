@@ -0,0 +1,136 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from jx_base.expressions import Variable
+from jx_elasticsearch import jx_usingES
+from jx_elasticsearch.es14 import setop
+from jx_elasticsearch.jx_usingES import FromES
+from jx_python.query import QueryOp, MAX_LIMIT
+from mo_dots import wrap, Data, FlatList
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from pyLibrary.env import elasticsearch
+
+NUM_HITS = 25
+PAGE_SIZE = 10
+
+
+class _Cluster(object):
+    """
+    ANSWERS THE SCROLL API FROM A LIST OF HITS
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.released = []
+        self.position = 0
+
+    def post(self, path, data=None, params=None, timeout=None):
+        self.requests.append((path, data))
+        if path.endswith("/_search"):
+            self.size = data.size
+            self.position = 0
+        else:
+            self.assertScrollId(data)
+        hits = [
+            {"_id": unicode(i), "fields": {"a": [i]}}
+            for i in range(self.position, min(self.position + self.size, NUM_HITS))
+        ]
+        self.position += len(hits)
+        return wrap({"_scroll_id": "scroll" + unicode(self.position), "hits": {"hits": hits}})
+
+    def delete(self, path, data=None):
+        self.released.append(data)
+
+    def assertScrollId(self, scroll_id):
+        if scroll_id != b"scroll" + str(self.position):
+            raise Exception("wrong scroll id")
+
+
+def _es():
+    es = object.__new__(elasticsearch.Alias)
+    es.cluster = _Cluster()
+    es.path = "/test"
+    es.settings = Data()
+    return es
+
+
+def _query(limit):
+    return wrap({
+        "select": [{"name": "a", "value": Variable("a")}],
+        "frum": {"schema": {"columns": [], "lookup": {}}},
+        "format": "list",
+        "stream": True,
+        "limit": limit
+    })
+
+
+class TestScroll(FuzzyTestCase):
+
+    def setUp(self):
+        self.scroll_size = setop.SCROLL_SIZE
+        setop.SCROLL_SIZE = PAGE_SIZE
+
+    def tearDown(self):
+        setop.SCROLL_SIZE = self.scroll_size
+
+    def test_all_pages(self):
+        es = _es()
+        result = setop.extract_rows(es, wrap({"fields": FlatList()}), _query(1000000))
+        self.assertEqual(es.cluster.requests, [])  # NOTHING ASKED UNTIL THE ROWS ARE READ
+
+        self.assertEqual(list(result.data), [{"a": i} for i in range(NUM_HITS)])
+        self.assertEqual([p for p, _ in es.cluster.requests], ["/test/_search", "/_search/scroll", "/_search/scroll", "/_search/scroll"])
+        self.assertEqual(es.cluster.requests[0][1].fields, ["a"])
+        self.assertEqual(es.cluster.released, [b"scroll25"])
+
+    def test_limit_releases_scroll(self):
+        es = _es()
+        result = setop.extract_rows(es, wrap({"fields": FlatList()}), _query(12))
+        self.assertEqual(list(result.data), [{"a": i} for i in range(12)])
+        result = None
+
+        # ONLY THE PAGES NEEDED ARE REQUESTED, AND THE SCROLL CONTEXT IS RELEASED
+        self.assertEqual(len(es.cluster.requests), 2)
+        self.assertEqual(es.cluster.released, [b"scroll20"])
+
+    def test_limit_capped_without_scroll(self):
+        frum = object.__new__(FromES)
+        frum.namespaces = []
+        frum.typed = False
+        frum._es = None
+
+        sent = []
+        names = ["is_deepop", "es_deepop", "is_aggsop", "is_setop", "es_setop"]
+        originals = {n: getattr(jx_usingES, n) for n in names}
+        deep = [True]
+        jx_usingES.is_deepop = lambda es, query: deep[0]
+        jx_usingES.es_deepop = lambda es, query: sent.append(("deep", query.limit))
+        jx_usingES.is_aggsop = lambda es, query: False
+        jx_usingES.is_setop = lambda es, query: True
+        jx_usingES.es_setop = lambda es, query: sent.append(("set", query.limit))
+        try:
+            query = QueryOp("from", None)
+            query.select = []
+            query.stream = True
+            query.limit = MAX_LIMIT * 10
+
+            frum.query(query)
+            deep[0] = False
+            frum.query(query)
+        finally:
+            for n, f in originals.items():
+                setattr(jx_usingES, n, f)
+
+        # ONLY THE scroll PATH GETS MORE THAN MAX_LIMIT
+        self.assertEqual(sent, [("deep", MAX_LIMIT), ("set", MAX_LIMIT * 10)])
+        self.assertEqual(query.limit, MAX_LIMIT * 10)
@@ -0,0 +1,125 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from jx_elasticsearch.es14 import aggs
+from jx_elasticsearch.scheduler import Scheduler
+from mo_dots import wrap, Data
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Lock
+
+KEYS = ["a", "b", "c", "d", "e", "f", "g", "h"]
+
+
+class _ES(object):
+    """
+    ONE BUCKET FOR EACH INCLUDED TERM, EACH WITH AN INNER range EDGE
+    """
+
+    def __init__(self):
+        self.locker = Lock()
+        self.queries = []
+
+    def search(self, query):
+        with self.locker:
+            self.queries.append(query)
+        outer = query.aggs._filter.aggs
+        response = {"hits": {"total": 100}, "aggregations": {"_filter": {"doc_count": 50}}}
+        agg = response["aggregations"]["_filter"]
+        if outer._match.terms:
+            agg["_match"] = {"buckets": [
+                {"key": k, "doc_count": KEYS.index(k) + 1, "_match": {"buckets": [{"from": 0, "to": 1, "doc_count": 1}]}}
+                for k in outer._match.terms.include
+            ]}
+        else:
+            agg["_match"] = {"buckets": [{"from": r["from"], "to": r.to, "doc_count": 1} for r in outer._match.range.ranges]}
+        for k, v in outer.items():
+            if k.startswith("_join_"):
+                agg[k] = {"doc_count": int(k[6:])}
+        if outer._missing:
+            agg["_missing"] = {"doc_count": 7}
+        return wrap(response)
+
+
+def _post(es, query, limit):
+    return es.search(query)
+
+
+def _query(outer):
+    return wrap({"aggs": {"_filter": {"filter": {"term": {"x": 1}}, "aggs": outer}}, "size": 0})
+
+
+def _decoders(*num_parts):
+    return [[Data(edge={"domain": {"partitions": range(n)}}) for n in num_parts]]
+
+
+class TestSlicedAggs(FuzzyTestCase):
+
+    def setUp(self):
+        self.post = aggs.es09.util.post
+        aggs.es09.util.post = _post
+
+    def tearDown(self):
+        aggs.es09.util.post = self.post
+
+    def test_terms_slices(self):
+        es = _ES()
+        es_query = _query({
+            "_match": {"terms": {"field": "t", "include": KEYS}, "aggs": {"_match": {"range": {"field": "v", "ranges": [{"from": 0, "to": 1}]}}}},
+            "_missing": {"filter": {"missing": {"field": "t"}}}
+        })
+        result = aggs.sliced_post(Scheduler("test"), es, es_query, wrap({"limit": 10}), 3)
+
+        includes = sorted([q.aggs._filter.aggs._match.terms.include for q in es.queries], key=lambda i: i[0])
+        self.assertEqual(includes, [["a", "b"], ["c", "d", "e"], ["f", "g", "h"]])
+        self.assertEqual(len([q for q in es.queries if q.aggs._filter.aggs._missing]), 1)
+        self.assertEqual(es_query.aggs._filter.aggs._match.terms.include, KEYS)  # ORIGINAL IS NOT CHANGED
+
+        # THE BUCKETS ARE JOINED IN PARTITION ORDER, WITH ONE _missing
+        agg = result.aggregations._filter
+        self.assertEqual([b.key for b in agg._match.buckets], KEYS)
+        self.assertEqual([b.doc_count for b in agg._match.buckets], range(1, 9))
+        self.assertEqual(agg._match.buckets[5]._match.buckets[0].doc_count, 1)
+        self.assertEqual(agg._missing.doc_count, 7)
+        self.assertEqual(agg.doc_count, 50)
+
+    def test_range_slices(self):
+        es = _ES()
+        ranges = [{"from": i, "to": i + 1} for i in range(5)]
+        es_query = _query({"_match": {"range": {"field": "v", "ranges": ranges}}})
+        result = aggs.sliced_post(Scheduler("test"), es, es_query, wrap({"limit": 10}), 2)
+        self.assertEqual(len(es.queries), 2)
+        self.assertEqual([b["from"] for b in result.aggregations._filter._match.buckets], range(5))
+
+    def test_join_slices(self):
+        es = _ES()
+        es_query = _query({"_match": {"range": {"ranges": []}}})
+        es_query.aggs._filter.aggs = {"_join_" + unicode(i): {"filter": {"term": {"v": i}}} for i in range(12)}
+        result = aggs.sliced_post(Scheduler("test"), es, es_query, wrap({"limit": 10}), 4)
+        self.assertEqual(len(es.queries), 4)
+        self.assertEqual(
+            sorted(len(q.aggs._filter.aggs.keys()) for q in es.queries),
+            [3, 3, 3, 3]
+        )
+        self.assertEqual({k: v.doc_count for k, v in result.aggregations._filter.items() if k.startswith("_join_")}, {"_join_" + unicode(i): i for i in range(12)})
+
+    def test_not_sliceable(self):
+        es = _ES()
+        es_query = _query({"_match": {"terms": {"field": "t", "include": None}}})
+        self.assertEqual(len(aggs._slice_queries(es_query, 4)), 1)
+
+    def test_num_slices(self):
+        edges = wrap({"edges": [{}]})
+        self.assertEqual(aggs.get_num_slices(edges, _decoders(10, 10)), 1)
+        self.assertEqual(aggs.get_num_slices(edges, _decoders(100, 250)), 3)
+        self.assertEqual(aggs.get_num_slices(edges, _decoders(5, 1000, 1000)), 5)
+        self.assertEqual(aggs.get_num_slices(wrap({"groupby": [{}]}), _decoders(100, 300)), 1)
@@ -0,0 +1,69 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import moz_sql_parser
+from active_data.actions import sql
+from mo_logs import Log
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times.timer import Timer
+
+# REPRESENTATIVE OF WHAT IS SENT TO /sql
+STATEMENTS = [
+    "SELECT 1",
+    "select * from unittest where v>=3",
+    'select a as "a", count(1) as "count" from unittest group by a',
+    "select build.branch, count(1) from unittest where build.date > 1483228800 group by build.branch",
+    "SELECT run.suite, avg(result.duration) AS dur FROM unittest WHERE build.branch='mozilla-central' AND result.ok=0 GROUP BY run.suite ORDER BY dur DESC LIMIT 10",
+    "select result.test, sum(result.duration) from unittest where run.suite in ('mochitest', 'reftest', 'xpcshell') and build.date between 1483228800 and 1483833600 group by result.test limit 100",
+    "select a, b from t where a = 'it''s' or b <> 2.5 and c = \"d\"",
+    "select a from t where b = 0 and c = '' and d = -3 and e = 1.5e3 -- comment 4",
+    "select case when a > 10 then 'big' when a > 2 then 'small' else 'none' end as size from t",
+    "select count(1) from t where not (a is null) and b = null",
+    "select a from t1 join t2 on t1.x = t2.y where t2.z = 42 limit 0",
+    "select a from t union select b from u order by a limit 5",
+]
+
+
+class TestSQLParser(FuzzyTestCase):
+
+    def test_bind(self):
+        for statement in STATEMENTS:
+            template, literals = moz_sql_parser.parameterize(statement)
+            self.assertEqual(
+                moz_sql_parser.bind(moz_sql_parser.parse(template), literals),
+                moz_sql_parser.parse(statement),
+                "expecting same parse for " + statement
+            )
+
+    def test_template(self):
+        a, _ = moz_sql_parser.parameterize("select a from t where b = 'x' and c > 10 limit 10")
+        b, _ = moz_sql_parser.parameterize("select a from t where b = 'y' and c > 20.5 limit 1")
+        self.assertEqual(a, b)
+
+    def test_speed(self):
+        sql.parsed.clear()
+        with Timer("parse", silent=True) as slow:
+            expected = [moz_sql_parser.parse(s) for s in STATEMENTS]
+        with Timer("first parse_sql", silent=True) as first:
+            [sql.parse_sql(s) for s in STATEMENTS]
+        with Timer("cached parse_sql", silent=True) as fast:
+            result = [sql._parse(s) for s in STATEMENTS]
+        Log.note(
+            "{{num}} statements: parse {{slow}}, first parse_sql {{first}}, cached {{fast}}",
+            num=len(STATEMENTS),
+            slow=slow.duration.seconds,
+            first=first.duration.seconds,
+            fast=fast.duration.seconds
+        )
+        self.assertEqual(result, expected)
+        self.assertLess(fast.duration.seconds, slow.duration.seconds / 10)
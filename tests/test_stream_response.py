@@ -0,0 +1,88 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from types import GeneratorType
+
+from active_data.actions import jx as jx_action
+from jx_base.expressions import Variable
+from jx_elasticsearch.es14 import setop
+from mo_dots import wrap
+from mo_json import json2value
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times.timer import Timer
+
+NUM_HITS = 1000
+
+
+def _hits():
+    # WHAT ES RETURNS FOR {"fields": ["a", "b"]}
+    for i in range(NUM_HITS):
+        yield wrap({"_id": unicode(i), "fields": {"a": [i], "b": ["value " + unicode(i)]}})
+
+
+def _select():
+    return wrap([
+        {"name": "a", "value": Variable("a"), "pull": "fields.a", "put": {"name": "a", "index": 0, "child": "."}},
+        {"name": "b", "value": Variable("b"), "pull": "fields.b", "put": {"name": "b", "index": 1, "child": "."}}
+    ])
+
+
+class TestStreamResponse(FuzzyTestCase):
+
+    def setUp(self):
+        self.chunk_size = jx_action.STREAM_CHUNK_SIZE
+        jx_action.STREAM_CHUNK_SIZE = 1000
+
+    def tearDown(self):
+        jx_action.STREAM_CHUNK_SIZE = self.chunk_size
+
+    def test_list_is_streamed(self):
+        query = wrap({"select": [{"name": "a"}, {"name": "b"}], "format": "list", "stream": True})
+        result = setop.format_list(_hits(), _select(), query)
+        self.assertTrue(isinstance(result.data, GeneratorType))
+        result.meta.content_type = "application/json"
+
+        with Timer("query", silent=True) as timer:
+            chunks = list(jx_action._stream(result, timer))
+        self.assertGreater(len(chunks), 10)
+
+        response = json2value(b"".join(chunks).decode("utf8"))
+        self.assertEqual(len(response.data), NUM_HITS)
+        self.assertEqual(response.data[7], {"a": 7, "b": "value 7"})
+        self.assertEqual(response.meta.format, "list")
+        self.assertTrue(response.meta.timing.total >= 0)
+
+    def test_same_as_materialized(self):
+        query = wrap({"select": [{"name": "a"}, {"name": "b"}], "format": "table", "stream": True})
+        streamed = setop.format_table(_hits(), _select(), query)
+        with Timer("query", silent=True) as timer:
+            streamed = json2value(b"".join(jx_action._stream(streamed, timer)).decode("utf8"))
+
+        query.stream = False
+        expected = setop.format_table(list(_hits()), _select(), query)
+        self.assertEqual(streamed.header, expected.header)
+        self.assertEqual(streamed.data, expected.data)
+
+    def test_error_in_trailer(self):
+        def broken():
+            for i, h in enumerate(_hits()):
+                if i == 5:
+                    raise Exception("ES went away")
+                yield h
+
+        query = wrap({"select": [{"name": "a"}, {"name": "b"}], "format": "list", "stream": True})
+        result = setop.format_list(broken(), _select(), query)
+        with Timer("query", silent=True) as timer:
+            response = json2value(b"".join(jx_action._stream(result, timer)).decode("utf8"))
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(response.meta.error.template, "ES went away")
@@ -0,0 +1,51 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import ThreadPool, Till
+
+
+def double(value, please_stop):
+    Till(seconds=0.01).wait()
+    return value * 2
+
+
+def fail(please_stop):
+    raise Exception("expected failure")
+
+
+def wait_for_stop(please_stop):
+    (please_stop | Till(seconds=10)).wait()
+    return bool(please_stop)
+
+
+class TestThreadPool(FuzzyTestCase):
+
+    def test_results(self):
+        with ThreadPool("test", num_workers=3) as pool:
+            futures = [pool.submit("double", double, i) for i in range(10)]
+            failure = pool.submit("fail", fail)
+        self.assertEqual([f.wait() for f in futures], [i * 2 for i in range(10)])
+        self.assertRaises(Exception, failure.wait)
+        self.assertEqual(pool.stats, {"workers": 3, "queued": 0, "running": 0, "submitted": 11, "done": 11, "failed": 1})
+
+    def test_stop(self):
+        pool = ThreadPool("test", num_workers=2)
+        futures = [pool.submit("wait", wait_for_stop) for _ in range(4)]
+        Till(seconds=0.1).wait()
+        pool.stop()
+        pool.join()
+        self.assertEqual([f.wait() for f in futures[:2]], [True, True])
+        for f in futures[2:]:
+            self.assertRaises(Exception, f.wait)
+        self.assertRaises(Exception, pool.submit, "late", double, 1)
@@ -0,0 +1,73 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import gc
+import random
+from time import time, clock
+from weakref import ref
+
+from mo_logs import Log
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Till, Signal
+
+
+class TestTill(FuzzyTestCase):
+
+    def test_order(self):
+        fired = []
+        now = time()
+        timers = [(now + random.random() / 2, i) for i in range(100)]
+        for t, i in timers:
+            Till(till=t).on_go(lambda i=i: fired.append(i))
+        gc.collect()  # on_go() TARGETS MUST KEEP THE TIMERS ALIVE
+        Till(seconds=1).wait()
+        self.assertEqual(fired, [i for t, i in sorted(timers)])
+
+    def test_abandoned(self):
+        please_stop = Signal()
+        timeout = Till(seconds=600)
+        waiter = please_stop | timeout
+        timeout = ref(timeout)
+        please_stop.go()
+        waiter.wait()
+        del waiter
+        gc.collect()
+        self.assertEqual(timeout(), None)
+
+    def test_on_go_after_fired(self):
+        fired = []
+        t = Till(seconds=0.01)
+        t.wait()
+        t.on_go(lambda: fired.append(1))
+        self.assertEqual(fired, [1])
+        self.assertTrue(id(t) not in Till.pinned)
+
+    def test_remove_go_unpins(self):
+        t = Till(seconds=600)
+        f = lambda: None
+        t.on_go(f)
+        self.assertTrue(id(t) in Till.pinned)
+        t.remove_go(f)
+        self.assertTrue(id(t) not in Till.pinned)
+
+    def test_throughput(self):
+        pending = [Till(seconds=600 + random.random()) for _ in range(100000)]
+        Till(seconds=0.2).wait()  # daemon HAS SEEN THEM
+
+        start, cpu = time(), clock()
+        timers = [Till(seconds=random.random()) for _ in range(10000)]
+        for t in timers:
+            t.wait()
+        duration, cpu = time() - start, clock() - cpu
+        Log.note("10000 timers, with {{num}} pending, done in {{duration|round(places=3)}}sec ({{cpu|round(places=3)}}sec cpu)", num=len(pending), duration=duration, cpu=cpu)
+        self.assertLess(duration, 2)
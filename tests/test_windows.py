@@ -0,0 +1,57 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import division
+from __future__ import unicode_literals
+
+import random
+
+from jx_python.windows import Max, Min, Percentile
+from mo_collections.sorted_list import SortedList
+from mo_math import stats
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+WINDOW = 7
+
+
+class TestWindows(FuzzyTestCase):
+
+    def test_sorted_list(self):
+        values = [random.randint(0, 50) for _ in range(500)]
+        s = SortedList(block_size=4)
+        for v in values:
+            s.add(v)
+        self.assertEqual(list(s), sorted(values))
+        for v in values[::2]:
+            s.remove(v)
+        expected = sorted(values[1::2])
+        self.assertEqual(list(s), expected)
+        self.assertEqual(len(s), len(expected))
+        self.assertEqual(s[-1], expected[-1])
+        self.assertEqual(s[len(expected) // 2], expected[len(expected) // 2])
+        self.assertRaises(Exception, s.remove, 1000)
+
+    def test_sliding_min(self):
+        self._sliding(Min(), min)
+
+    def test_sliding_max(self):
+        self._sliding(Max(), max)
+
+    def test_sliding_percentile(self):
+        self._sliding(Percentile(0.9), lambda w: stats.percentile(w, 0.9))
+
+    def _sliding(self, acc, expected):
+        values = [random.randint(0, 20) for _ in range(200)]
+        for i, v in enumerate(values):
+            acc.add(v)
+            if i >= WINDOW:
+                acc.sub(values[i - WINDOW])
+            window = values[max(0, i - WINDOW + 1):i + 1]
+            self.assertAlmostEqual(acc.end(), expected(window), places=9)